@@ -0,0 +1,403 @@
+"""
+Load test: concurrent chat sessions driven through the real GGUFChatApp flows.
+
+    python benchmarks/load_test.py [--sessions 1,2,4,8] [--rounds 2] [--json results.json]
+    python benchmarks/load_test.py --model models/tiny.gguf   # a real model instead of the fake one
+
+Every concurrency level runs in a fresh interpreter inside an empty temporary
+data directory. Each simulated session gets its own page on one shared event
+loop (as in server mode) and, per round: sends two messages, edits one, saves
+the chat, deletes a message, saves a memory, opens the Chats and Memories views
+and starts a new chat. Unless --model is given, the model is a fake Llama that
+sleeps for the prefill and decode time it is told to simulate.
+
+Reported per level: UI handler and flush latency, storage read/write latency,
+engine queue wait and reply time, event-loop lag, and memory per session.
+Exits with status 1 if --max-handler-p95-ms is given and exceeded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from time import perf_counter, sleep
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_PREFIX = "LOAD_RESULT "
+WAIT_TIMEOUT = 120  # seconds a session waits for a reply or dialog before giving up
+REJECT_BACKOFF = 0.5
+
+
+class FakeLlama:
+    """Stands in for llama_cpp.Llama; generation time is simulated with sleeps, which release the GIL like llama.cpp does."""
+
+    prefill_tps = 2000.0
+    decode_tps = 200.0
+    reply_tokens = 40
+
+    def __init__(self, model_path=None, n_ctx=8192, **kwargs):
+        self.n_ctx = n_ctx
+        self.input_ids = [0] * n_ctx
+        self.n_tokens = 0
+
+    def tokenize(self, text: bytes, add_bos: bool = True) -> list:
+        return list(text)
+
+    def detokenize(self, tokens: list) -> bytes:
+        return bytes(tokens)
+
+    def create_chat_completion(self, messages, stream=False, max_tokens=256, **kwargs):
+        prompt = [hash(word) % 32000 for m in messages for word in m["content"].split()][:self.n_ctx]
+        cached = 0
+        while cached < min(len(prompt), self.n_tokens) and self.input_ids[cached] == prompt[cached]:
+            cached += 1
+        reply_tokens = min(self.reply_tokens, max_tokens)
+
+        def generate():
+            sleep((len(prompt) - cached) / self.prefill_tps)
+            for i in range(reply_tokens):
+                sleep(1 / self.decode_tps)
+                yield f"word{i} "
+            ids = (prompt + list(range(reply_tokens)))[:self.n_ctx]
+            self.input_ids[:len(ids)] = ids
+            self.n_tokens = len(ids)
+
+        if stream:
+            return ({"choices": [{"delta": {"content": token}}]} for token in generate())
+        return {"choices": [{"message": {"content": "".join(generate())}}]}
+
+
+def rss_bytes() -> int | None:
+    """Resident set size of this process, where the platform makes it cheap to read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Samples:
+    """Latency samples in ms by name, recorded from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {}
+
+    def add(self, name: str, ms: float):
+        with self._lock:
+            self.values.setdefault(name, []).append(ms)
+
+    def wrap(self, owner, attr: str, name: str):
+        original = getattr(owner, attr)
+
+        def timed(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.add(name, (perf_counter() - started) * 1000)
+
+        setattr(owner, attr, timed)
+
+
+def run_child(args):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from types import SimpleNamespace
+    import flet as ft
+    from flet.core.local_connection import LocalConnection
+    from flet.core.protocol import PageCommandResponsePayload, PageCommandsBatchResponsePayload
+    import modules.chatbot as chatbot
+    from modules.chats_view_ui import ChatsViewComponent
+    from modules.dialogs import get_dialogs
+    from modules.gguf_chat_ui import GGUFChatApp
+    from modules.inference_metrics import percentile
+    from modules.memories_view_ui import MemoriesViewComponent
+    from modules.persona_selector_ui import PersonaManager
+    from modules.repository import JsonRepository
+    from modules.scheduler import get_scheduler
+    from modules.ui_updates import UpdateBatcher, get_updater, user_action
+    from modules.watchdog import start_watchdog
+
+    class OfflineConnection(LocalConnection):
+        """Applies commands to the server-side control tree without a client."""
+
+        def send_command(self, session_id, command):
+            result, _ = self._process_command(command)
+            return PageCommandResponsePayload(result=result, error="")
+
+        def send_commands(self, session_id, commands):
+            results = []
+            for command in commands:
+                result, _ = self._process_command(command)
+                if command.name in ("add", "get"):
+                    results.append(result)
+            return PageCommandsBatchResponsePayload(results=results, error="")
+
+    if args.model:
+        chatbot.ChatBot.MODEL_PATH = args.model
+    else:
+        FakeLlama.prefill_tps = args.prefill_tps
+        FakeLlama.decode_tps = args.decode_tps
+        FakeLlama.reply_tokens = args.reply_tokens
+        chatbot.load_llama = lambda: FakeLlama
+
+    samples = Samples()
+    samples.wrap(JsonRepository, "read", "storage:read")
+    samples.wrap(JsonRepository, "write", "storage:write")
+    samples.wrap(UpdateBatcher, "_flush", "ui:flush")
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    executor = ThreadPoolExecutor()
+    watchdog = start_watchdog(loop)
+    PersonaManager().add_persona("Load test", "You are a friendly test persona.", None)
+    persona = PersonaManager().load_personas()[0]
+    chatbot.get_chat_engine(chatbot.ChatBot.MODEL_PATH).llm  # load the model before measuring memory
+
+    def wait_until(condition, what: str):
+        deadline = perf_counter() + WAIT_TIMEOUT
+        while not condition():
+            if perf_counter() > deadline:
+                raise TimeoutError(f"timed out waiting for {what}")
+            sleep(0.005)
+
+    class SimulatedSession:
+        def __init__(self, index: int):
+            self.index = index
+            self.page = ft.Page(OfflineConnection(), f"load-{index}", loop, executor)
+            self.page._set_attr("width", 1280)
+            self.page._set_attr("height", 800)
+            self.updates = get_updater(self.page)
+            self.dialogs = get_dialogs(self.page)
+            self.content = ft.Container(expand=True)
+            self.page.add(self.content)
+            self.app = GGUFChatApp(self.page, persona=persona)
+            self.chats = ChatsViewComponent(self.page, on_chat_select=lambda chat, message_id=None: None)
+            self.memories = MemoriesViewComponent(self.page, on_go_to_chat=lambda *a: None)
+            self.replies = []
+            self.rejected = 0
+            self.error = None
+
+        def timed(self, name: str, fn, *fn_args):
+            started = perf_counter()
+            fn(*fn_args)
+            samples.add(f"handler:{name}", (perf_counter() - started) * 1000)
+
+        def navigate(self, component, name: str):
+            @user_action("navigate")
+            def show(e=None):
+                self.content.content = component.view
+                if hasattr(component, "update_view"):
+                    component.update_view()
+                self.updates.mark(self.content)
+            self.timed(name, show)
+            # A user cannot click into a view before the flush has put it on screen
+            wait_until(lambda: component.view.page is not None, "the view to mount")
+
+        def open_dialog(self, titles: tuple):
+            def find():
+                return next(
+                    (d for d in self.dialogs._dialogs if d.open and getattr(d.title, "value", None) in titles),
+                    None,
+                )
+            wait_until(lambda: find() is not None, f"a dialog titled {titles}")
+            return find()
+
+        def dismiss(self, titles: tuple):
+            """Waits for a dialog, clicks its first button, and waits for any loading dialog to go away."""
+            dialog = self.open_dialog(titles)
+            dialog.actions[0].on_click(None)
+            wait_until(lambda: not any(d.open for d in self.dialogs._dialogs), "dialogs to close")
+
+        def ask(self, name: str, text: str):
+            """Sends (or submits an edit) and waits for the reply, retrying after a rejection."""
+            app = self.app
+            for _ in range(20):
+                app.user_input.value = text
+                self.timed(name, app._send_message, None)
+                wait_until(lambda: not app.user_input.disabled, "the reply")
+                last = app.current_chat_messages[-1] if app.current_chat_messages else None
+                if last and last.get("role") == "model":
+                    self.replies.append(last.get("metrics") or {})
+                    return
+                # Rejected by the scheduler: the question is back in the input
+                self.rejected += 1
+                self.dismiss(("Model Busy",))
+                app.editing_message_id = None
+                sleep(REJECT_BACKOFF)
+            raise RuntimeError("reply rejected 20 times in a row")
+
+        def run_round(self, r: int):
+            app = self.app
+            self.navigate(app, "open_chat")
+            self.ask("send_message", f"Session {self.index}, round {r}: what do you think about topic {r}?")
+            self.ask("send_message", f"And what else should I know about topic {r} before tomorrow?")
+
+            last_user = next(m for m in reversed(app.current_chat_messages) if m["role"] == "user")
+            self.timed("edit_message", app._start_editing_message, SimpleNamespace(control=SimpleNamespace(data=last_user["id"])))
+            self.ask("submit_edit", f"Actually, tell me about topic {r} in one sentence.")
+
+            self.timed("save_chat", app._save_chat_click, None)
+            self.dismiss(("Success", "Error"))
+
+            first_user = next(m for m in app.current_chat_messages if m["role"] == "user")
+            self.timed("delete_message", app._show_delete_confirmation, SimpleNamespace(control=SimpleNamespace(data=first_user["id"])))
+            confirm = self.open_dialog(("Confirm Deletion",))
+            self.timed("confirm_delete", confirm.actions[0].on_click, None)
+
+            self.timed("save_memory", app._save_memory_click, None)
+            self.dismiss(("Memory Saved Successfully", "Similar Memory Updated", "Error"))
+
+            self.navigate(self.chats, "open_chats")
+            self.navigate(self.memories, "open_memories")
+            self.timed("new_chat", app._new_chat_click, None)
+
+        def run(self, rounds: int, start: threading.Barrier):
+            try:
+                start.wait()
+                for r in range(rounds):
+                    self.run_round(r)
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+
+    rss_before = rss_bytes()
+    sessions = [SimulatedSession(i) for i in range(args.sessions)]
+    rss_after_setup = rss_bytes()
+    start = threading.Barrier(len(sessions))
+    threads = [threading.Thread(target=s.run, args=(args.rounds, start)) for s in sessions]
+    started = perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = perf_counter() - started
+    rss_after_run = rss_bytes()
+
+    def summary(values: list) -> dict:
+        values = sorted(values)
+        return {"n": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95), "max": values[-1] if values else None}
+
+    replies = [m for s in sessions for m in s.replies]
+    result = {
+        "sessions": args.sessions,
+        "rounds": args.rounds,
+        "elapsed_s": elapsed,
+        "replies": len(replies),
+        "rejected": sum(s.rejected for s in sessions),
+        "errors": [s.error for s in sessions if s.error],
+        "latency": {name: summary(values) for name, values in sorted(samples.values.items())},
+        "queue_wait": summary([m["queue_ms"] for m in replies if m.get("queue_ms") is not None]),
+        "reply_total": summary([m["total_ms"] for m in replies if m.get("total_ms") is not None]),
+        "loop": watchdog.stats() if watchdog else None,
+        "scheduler": {k: v for k, v in get_scheduler().snapshot().items() if k in ("served", "rejected", "max_waiting")},
+        "mb_per_session_setup": (rss_after_setup - rss_before) / args.sessions / 2**20 if rss_before else None,
+        "mb_per_session_run": (rss_after_run - rss_before) / args.sessions / 2**20 if rss_before else None,
+    }
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+    os._exit(0)  # skip waiting on idle timers, the watchdog and the executor
+
+
+def run_level(args, sessions: int) -> dict:
+    env = dict(os.environ, PERSONA_CHAT_PRELOAD="0", PERSONA_CHAT_PATCH_BYTES="0")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child",
+        "--sessions", str(sessions), "--rounds", str(args.rounds),
+        "--prefill-tps", str(args.prefill_tps), "--decode-tps", str(args.decode_tps),
+        "--reply-tokens", str(args.reply_tokens),
+    ]
+    if args.model:
+        command += ["--model", os.path.abspath(args.model)]
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.makedirs(os.path.join(data_dir, "assets"))
+        proc = subprocess.run(command, cwd=data_dir, env=env, capture_output=True, text=True, timeout=3600)
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    sys.exit(f"Load test with {sessions} sessions failed (exit {proc.returncode}):\n{proc.stdout[-4000:]}\n{proc.stderr[-4000:]}")
+
+
+def _ms(value) -> str:
+    return "–" if value is None else f"{value:.1f}"
+
+
+def print_level(result: dict):
+    latency = result["latency"]
+    handlers = [s for name, s in latency.items() if name.startswith("handler:")]
+    handler_p95 = max((s["p95"] for s in handlers), default=None)
+    loop = result["loop"] or {}
+    print(
+        f"\n{result['sessions']} sessions x {result['rounds']} rounds in {result['elapsed_s']:.1f} s: "
+        f"{result['replies']} replies, {result['rejected']} rejected and retried"
+        + (f", {len(result['errors'])} sessions failed" if result["errors"] else "")
+    )
+    print(
+        f"  engine queue wait p50 {_ms(result['queue_wait']['p50'])} / p95 {_ms(result['queue_wait']['p95'])} ms, "
+        f"reply p50 {_ms(result['reply_total']['p50'])} / p95 {_ms(result['reply_total']['p95'])} ms"
+    )
+    print(
+        f"  event loop lag p99 {_ms(loop.get('lag_p99_ms'))} ms, max {_ms(loop.get('max_lag_ms'))} ms, "
+        f"{loop.get('stalls', 0)} stalls; slowest handler p95 {_ms(handler_p95)} ms"
+    )
+    if result["mb_per_session_run"] is not None:
+        print(
+            f"  memory per session: {result['mb_per_session_setup']:.2f} MB after setup, "
+            f"{result['mb_per_session_run']:.2f} MB after the run"
+        )
+    print(f"  {'':32} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, s in latency.items():
+        print(f"  {name:32} {s['n']:6} {_ms(s['p50']):>9} {_ms(s['p95']):>9} {_ms(s['max']):>9}")
+    for error in result["errors"]:
+        print(f"  error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", default="1,2,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--rounds", type=int, default=2, help="scripted rounds per session")
+    parser.add_argument("--model", help="GGUF to load instead of the fake model")
+    parser.add_argument("--prefill-tps", type=float, default=2000.0, help="fake model prompt speed")
+    parser.add_argument("--decode-tps", type=float, default=200.0, help="fake model generation speed")
+    parser.add_argument("--reply-tokens", type=int, default=40, help="fake model tokens per reply")
+    parser.add_argument("--max-handler-p95-ms", type=float, help="fail if any handler's p95 is above this")
+    parser.add_argument("--json", help="write the raw results to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        args.sessions = int(args.sessions)
+        run_child(args)
+        return
+
+    results = []
+    for sessions in (int(n) for n in args.sessions.split(",")):
+        result = run_level(args, sessions)
+        results.append(result)
+        print_level(result)
+
+    failures = [f"{r['sessions']} sessions: {e}" for r in results for e in r["errors"]]
+    if args.max_handler_p95_ms is not None:
+        for r in results:
+            for name, s in r["latency"].items():
+                if name.startswith("handler:") and s["p95"] is not None and s["p95"] > args.max_handler_p95_ms:
+                    failures.append(f"{r['sessions']} sessions: {name} p95 {s['p95']:.0f} ms > {args.max_handler_p95_ms:.0f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "failures": failures}, f, indent=2)
+
+    if failures:
+        print("\nREGRESSION: " + "; ".join(failures))
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
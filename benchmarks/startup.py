@@ -0,0 +1,161 @@
+"""
+Startup benchmark: import time per module and time to the first frame.
+
+    python benchmarks/startup.py [--runs 5] [--max-first-frame-ms 1500] [--json results.json]
+
+Every run starts a fresh interpreter with `-X importtime`, imports main.py and
+renders main(page) against an in-process connection instead of a Flet client,
+inside an empty temporary data directory. Exits with status 1 if the median
+first frame is over the threshold, or if a module that should load lazily
+(the non-Home views, llama_cpp) was imported before the first frame.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_PREFIX = "STARTUP_RESULT "
+REPORTED_MODULES = ("main", "flet", "PIL", "llama_cpp")
+
+
+def run_child():
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from time import perf_counter
+
+    os.environ["PERSONA_CHAT_PRELOAD"] = "0"  # the preload is timed on its own below
+    started = perf_counter()
+    import main as app
+    import flet as ft
+    from flet.core.local_connection import LocalConnection
+    from flet.core.protocol import PageCommandResponsePayload, PageCommandsBatchResponsePayload
+
+    class OfflineConnection(LocalConnection):
+        """Applies commands to the server-side control tree without a client."""
+
+        def send_command(self, session_id, command):
+            result, _ = self._process_command(command)
+            return PageCommandResponsePayload(result=result, error="")
+
+        def send_commands(self, session_id, commands):
+            results = []
+            for command in commands:
+                result, _ = self._process_command(command)
+                if command.name in ("add", "get"):
+                    results.append(result)
+            return PageCommandsBatchResponsePayload(results=results, error="")
+
+    page = ft.Page(OfflineConnection(), "startup-benchmark", asyncio.new_event_loop(), ThreadPoolExecutor())
+    page._set_attr("width", 1280)
+    page._set_attr("height", 800)
+    imported = perf_counter()
+    # Keep main() from starting the maintenance thread; it would import views while the preload is timed
+    app._maintenance_claimed.acquire()
+    app.main(page)
+    rendered = perf_counter()
+    lazy_loaded = app.startup_stats["loaded_before_first_frame"]
+
+    app.preload_heavy_modules()
+    print(RESULT_PREFIX + json.dumps({
+        "import_main_ms": (imported - started) * 1000,
+        "main_ms": (rendered - imported) * 1000,
+        "first_frame_ms": (rendered - started) * 1000,
+        "loaded_before_first_frame": lazy_loaded,
+        "preload_views_ms": app.startup_stats.get("preload_views_ms"),
+        "preload_llama_ms": app.startup_stats.get("preload_llama_ms"),
+    }), flush=True)
+    os._exit(0)  # skip waiting on the maintenance thread and the executor
+
+
+def parse_importtime(stderr: str) -> dict:
+    """{module: cumulative microseconds} from `-X importtime` output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if cumulative.strip().isdigit():
+            times[name] = max(times.get(name, 0), int(cumulative))
+    return times
+
+
+def run_once() -> tuple[dict, dict]:
+    env = dict(os.environ, PERSONA_CHAT_PRELOAD="0", PERSONA_CHAT_PATCH_BYTES="0")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.makedirs(os.path.join(data_dir, "assets"))
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child"],
+            cwd=data_dir, env=env, capture_output=True, text=True, timeout=300,
+        )
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):]), parse_importtime(proc.stderr)
+    sys.exit(f"Benchmark run failed (exit {proc.returncode}):\n{proc.stdout}\n{proc.stderr[-4000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-first-frame-ms", type=float, default=1500.0)
+    parser.add_argument("--json", help="write the raw results to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child()
+        return
+
+    runs, import_times = [], []
+    for _ in range(args.runs):
+        result, times = run_once()
+        runs.append(result)
+        import_times.append(times)
+
+    modules = sorted(
+        {name for times in import_times for name in times
+         if name in REPORTED_MODULES or name.startswith("modules.")},
+        key=lambda name: -statistics.median(t.get(name, 0) for t in import_times),
+    )
+    print(f"Import time per module (cumulative, incl. the background preload; median of {args.runs} runs):")
+    for name in modules:
+        print(f"  {name:32} {statistics.median(t.get(name, 0) for t in import_times) / 1000:8.1f} ms")
+
+    summary = {
+        key: statistics.median(r[key] for r in runs)
+        for key in ("import_main_ms", "main_ms", "first_frame_ms")
+    }
+    print(
+        f"First frame: {summary['first_frame_ms']:.0f} ms "
+        f"(import main {summary['import_main_ms']:.0f} ms, main() {summary['main_ms']:.0f} ms)"
+    )
+    preload = runs[-1]
+    if preload["preload_views_ms"] is not None:
+        print(
+            f"Background preload: views {preload['preload_views_ms']:.0f} ms, "
+            f"llama_cpp {preload['preload_llama_ms']:.0f} ms"
+        )
+
+    failures = []
+    if summary["first_frame_ms"] > args.max_first_frame_ms:
+        failures.append(f"first frame {summary['first_frame_ms']:.0f} ms > {args.max_first_frame_ms:.0f} ms")
+    eager = sorted({name for r in runs for name in r["loaded_before_first_frame"]})
+    if eager:
+        failures.append(f"imported before the first frame: {', '.join(eager)}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "runs": runs, "failures": failures}, f, indent=2)
+
+    if failures:
+        print("REGRESSION: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Storage benchmark: HistoryManager, PersonaManager and PersonInfoManager on synthetic data.
+
+    python benchmarks/storage.py [--chats 10,1000,10000] [--messages 20] [--memories 2000]
+                                 [--reps 5] [--json results.json] [--baseline old.json]
+
+Every dataset size runs in a fresh interpreter inside an empty temporary data
+directory, filled through the bulk import APIs from a seeded generator, so two
+runs (or two storage backends) see identical data. Each scenario is timed over
+--reps repetitions after an untimed-for-p50 first call, which is reported on its
+own because it pays for lazily built caches, then once more under tracemalloc
+for its peak memory.
+"Bytes written" is the size of every file created or changed by the operation,
+including the search index save that the app otherwise defers by a few seconds.
+With --baseline, the p50 of every scenario is compared with an earlier --json run.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from time import perf_counter
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_PREFIX = "STORAGE_RESULT "
+DATA_DIR = "assets"
+WORDS = (
+    "здравей приятел днес утре време море планина книга филм музика работа почивка пътуване "
+    "кафе вечеря семейство спомен идея въпрос отговор hello weekend project travel coffee "
+    "movie music dinner family memory question answer plan trip city"
+).split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_chat(rng: random.Random, persona_id: str, messages: int, when: datetime) -> dict:
+    return {
+        "chat_id": f"{rng.getrandbits(128):032x}",
+        "persona_id": persona_id,
+        "timestamp": when.isoformat(),
+        "updated_at": when.isoformat(),
+        "title": sentence(rng, 4),
+        "messages": [
+            {
+                "id": f"{rng.getrandbits(128):032x}",
+                "role": "user" if i % 2 == 0 else "model",
+                "content": sentence(rng, rng.randint(5, 15) if i % 2 == 0 else rng.randint(20, 60)),
+            }
+            for i in range(messages)
+        ],
+    }
+
+
+def snapshot_files() -> dict:
+    files = {}
+    for root, _, names in os.walk(DATA_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            files[path] = (st.st_size, st.st_mtime_ns)
+    return files
+
+
+def bytes_written(before: dict, after: dict) -> int:
+    return sum(size for path, (size, mtime) in after.items() if before.get(path) != (size, mtime))
+
+
+def run_child(args):
+    import asyncio
+    import tracemalloc
+    from concurrent.futures import ThreadPoolExecutor
+    import flet as ft
+    from flet.core.local_connection import LocalConnection
+    from flet.core.protocol import PageCommandResponsePayload, PageCommandsBatchResponsePayload
+    from modules.chats_view_ui import ChatsViewComponent
+    from modules.history_manager import HistoryManager
+    from modules.inference_metrics import percentile
+    from modules.memories_view_ui import MemoriesViewComponent
+    from modules.person_view_ui import PersonInfoManager
+    from modules.persona_selector_ui import PersonaManager
+    from modules.repository import get_repository
+    from modules.search_index import get_search_index
+
+    class OfflineConnection(LocalConnection):
+        """Applies commands to the server-side control tree without a client, as in startup.py."""
+
+        def send_command(self, session_id, command):
+            result, _ = self._process_command(command)
+            return PageCommandResponsePayload(result=result, error="")
+
+        def send_commands(self, session_id, commands):
+            results = []
+            for command in commands:
+                result, _ = self._process_command(command)
+                if command.name in ("add", "get"):
+                    results.append(result)
+            return PageCommandsBatchResponsePayload(results=results, error="")
+
+    rng = random.Random(args.seed)
+    repository = get_repository()
+    started = perf_counter()
+
+    persona_manager = PersonaManager()
+    persona_manager.import_personas([
+        ({"id": f"persona-{i}", "name": f"Persona {i}", "prompt": sentence(rng, 40)}, None)
+        for i in range(args.personas)
+    ])
+    persona_ids = [p["id"] for p in persona_manager.load_personas()]
+    now = datetime.now()
+    info_manager = PersonInfoManager()
+    info_manager.import_info([
+        {"info_id": f"{rng.getrandbits(128):032x}", "content": sentence(rng, 12), "timestamp": now.isoformat()}
+        for _ in range(args.info)
+    ])
+
+    history_manager = HistoryManager()
+    # import_chats() archives old chats right away, so only --archive spreads them over a year
+    max_age_minutes = 365 * 24 * 60 if args.archive else (HistoryManager.ARCHIVE_AFTER_DAYS - 1) * 24 * 60
+    chats = [
+        make_chat(rng, rng.choice(persona_ids), args.messages, now - timedelta(minutes=rng.randint(0, max_age_minutes)))
+        for _ in range(args.chats)
+    ]
+    long_chat = make_chat(rng, persona_ids[0], args.long_messages, now)
+    history_manager.import_chats(chats + [long_chat])
+    history_manager.import_memories([
+        {
+            "memory_id": f"{rng.getrandbits(128):032x}",
+            "persona_id": rng.choice(persona_ids),
+            "chat_id": rng.choice(chats)["chat_id"] if chats else None,
+            "summary": sentence(rng, 25),
+            "timestamp": (now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))).isoformat(),
+        }
+        for _ in range(args.memories)
+    ])
+    history_manager.warm_memory_dedup_index()  # as main()'s background maintenance does
+    search_index = get_search_index()
+    search_index.flush()
+    chat_ids = [c["chat_id"] for c in chats]
+    del chats
+    setup_s = perf_counter() - started
+    dataset_bytes = sum(size for size, _ in snapshot_files().values())
+
+    page = ft.Page(OfflineConnection(), "storage-benchmark", asyncio.new_event_loop(), ThreadPoolExecutor())
+    chats_view = ChatsViewComponent(page, on_chat_select=lambda chat, message_id=None: None)
+    memories_view = MemoriesViewComponent(page, on_go_to_chat=lambda *a: None)
+    chats_view.update_view()
+    memories_view.update_view()
+
+    def new_messages(count: int) -> list:
+        return make_chat(rng, persona_ids[0], count, now)["messages"]
+
+    def existing_chat_id() -> str:
+        return rng.choice(chat_ids) if chat_ids else long_chat["chat_id"]
+
+    def extended(chat_id: str) -> list:
+        chat = history_manager.load_chat(chat_id)
+        return [dict(m) for m in chat["messages"]] + new_messages(2)
+
+    def delete_one():
+        chat_id = existing_chat_id()
+        if chat_id in chat_ids:
+            chat_ids.remove(chat_id)
+        return (history_manager.delete_chat, chat_id)
+
+    # name -> prepare() returning (fn, *args); preparation is not timed
+    scenarios = {
+        "load_chats (cold)": lambda: (repository.invalidate(), (history_manager.load_chats,))[1],
+        "load_chats (cached)": lambda: (history_manager.load_chats,),
+        "load_chat_index (cold)": lambda: (repository.invalidate(), (history_manager.load_chat_index,))[1],
+        "load_chat (cold)": lambda: (repository.invalidate(), (history_manager.load_chat, existing_chat_id()))[1],
+        "save_chat": lambda: (history_manager.save_chat, persona_ids[0], new_messages(args.messages), "Benchmark chat"),
+        "update_chat (+2 messages)": lambda: (history_manager.update_chat, *(lambda cid: (cid, extended(cid)))(existing_chat_id())),
+        "update_chat (long transcript)": lambda: (history_manager.update_chat, long_chat["chat_id"], extended(long_chat["chat_id"])),
+        "delete_chat": delete_one,
+        "save_memory": lambda: (history_manager.save_memory, rng.choice(persona_ids), None, sentence(rng, 25)),
+        "load_memories (cold)": lambda: (repository.invalidate(), (history_manager.load_memories,))[1],
+        "refresh Chats view": lambda: (
+            history_manager.save_chat(persona_ids[0], new_messages(4), "Refresh"),
+            (chats_view.update_view,),
+        )[1],
+        "refresh Memories view": lambda: (
+            history_manager.save_memory(rng.choice(persona_ids), None, sentence(rng, 25)),
+            (memories_view.update_view,),
+        )[1],
+        "update_persona": lambda: (persona_manager.update_persona, persona_ids[0], "Renamed", sentence(rng, 40), None),
+        "add_info": lambda: (info_manager.add_info, sentence(rng, 12)),
+    }
+
+    def flush_pending():
+        # Counts the search index save the app would do a few seconds later, and only when one is due
+        if search_index._save_timer is not None:
+            search_index.flush()
+
+    results = {}
+    for name, prepare in scenarios.items():
+        if args.only and name not in args.only:
+            continue
+        latencies, written = [], []
+        # Rep 0 is reported as "first" (lazily built caches), the last one runs under tracemalloc
+        for rep in range(args.reps + 2):
+            call = prepare()
+            traced = rep > args.reps
+            flush_pending()
+            before = snapshot_files()
+            if traced:
+                tracemalloc.start()
+                baseline = tracemalloc.get_traced_memory()[0]
+            t0 = perf_counter()
+            call[0](*call[1:])
+            elapsed = perf_counter() - t0
+            if traced:
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                tracemalloc.stop()
+            flush_pending()
+            if rep == 0:
+                first_ms = elapsed * 1000
+            elif not traced:
+                latencies.append(elapsed * 1000)
+                written.append(bytes_written(before, snapshot_files()))
+        latencies.sort()
+        results[name] = {
+            "first_ms": first_ms,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "max_ms": latencies[-1],
+            "bytes_written": statistics.median(written),
+            "peak_kib": peak / 1024,
+        }
+
+    print(RESULT_PREFIX + json.dumps({
+        "chats": args.chats,
+        "messages": args.messages,
+        "memories": args.memories,
+        "archived": args.archive,
+        "setup_s": setup_s,
+        "dataset_bytes": dataset_bytes,
+        "scenarios": results,
+    }), flush=True)
+    os._exit(0)  # skip waiting on the search index save timers
+
+
+def run_scale(args, chats: int) -> dict:
+    env = dict(os.environ, PERSONA_CHAT_PRELOAD="0", PERSONA_CHAT_PATCH_BYTES="0")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    env.pop("PERSONA_CHAT_EMBEDDING_MODEL", None)  # embedding is measured by its own index, not here
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", "--chats", str(chats),
+        "--messages", str(args.messages), "--long-messages", str(args.long_messages),
+        "--memories", str(args.memories), "--personas", str(args.personas), "--info", str(args.info),
+        "--reps", str(args.reps), "--seed", str(args.seed),
+    ]
+    if args.archive:
+        command.append("--archive")
+    for name in args.only or ():
+        command += ["--only", name]
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.makedirs(os.path.join(data_dir, DATA_DIR))
+        proc = subprocess.run(command, cwd=data_dir, env=env, capture_output=True, text=True, timeout=7200)
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    sys.exit(f"Storage benchmark with {chats} chats failed (exit {proc.returncode}):\n{proc.stdout[-4000:]}\n{proc.stderr[-4000:]}")
+
+
+def _size(n: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def print_scale(result: dict, baseline: dict | None):
+    print(
+        f"\n{result['chats']} chats x {result['messages']} messages, {result['memories']} memories"
+        f"{' (old chats archived)' if result['archived'] else ''}: "
+        f"{_size(result['dataset_bytes'])} on disk, generated in {result['setup_s']:.1f} s"
+    )
+    header = f"  {'':32} {'first ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'written':>10} {'peak mem':>10}"
+    print(header + ("  vs baseline p50" if baseline else ""))
+    for name, s in result["scenarios"].items():
+        line = (
+            f"  {name:32} {s['first_ms']:9.2f} {s['p50_ms']:9.2f} {s['p95_ms']:9.2f} {s['max_ms']:9.2f} "
+            f"{_size(s['bytes_written']):>10} {_size(s['peak_kib'] * 1024):>10}"
+        )
+        old = (baseline or {}).get(name)
+        if old and old["p50_ms"]:
+            line += f"  {s['p50_ms'] / old['p50_ms']:.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", default="10,1000,10000", help="comma-separated dataset sizes")
+    parser.add_argument("--messages", type=int, default=20, help="messages per generated chat")
+    parser.add_argument("--long-messages", type=int, default=2000, help="messages in the one long transcript")
+    parser.add_argument("--memories", type=int, default=2000)
+    parser.add_argument("--personas", type=int, default=20)
+    parser.add_argument("--info", type=int, default=100, help="personal info entries")
+    parser.add_argument("--reps", type=int, default=5, help="timed repetitions per scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--archive", action="store_true", help="spread chats over a year, so most are imported into the archive")
+    parser.add_argument("--only", action="append", help="run only this scenario (repeatable)")
+    parser.add_argument("--json", help="write the raw results to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        args.chats = int(args.chats)
+        run_child(args)
+        return
+
+    baselines = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = {(r["chats"], r["archived"]): r["scenarios"] for r in json.load(f)["results"]}
+
+    results = []
+    for chats in (int(n) for n in args.chats.split(",")):
+        result = run_scale(args, chats)
+        results.append(result)
+        print_scale(result, baselines.get((chats, args.archive)))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
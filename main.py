@@ -1,13 +1,57 @@
+from time import perf_counter
+PROCESS_STARTED = perf_counter()  # before the imports below, so they count towards startup
+
+import importlib
+import os
+import sys
+import threading
 import flet as ft
-from modules.gguf_chat_ui import GGUFChatApp
-from modules.persona_selector_ui import PersonaSelectorComponent, PersonaManager
-from modules.chats_view_ui import ChatsViewComponent
-from modules.memories_view_ui import MemoriesViewComponent
+from modules.dialogs import get_dialogs
 from modules.history_manager import HistoryManager
-from modules.person_view_ui import PersonViewComponent
+from modules.persona_selector_ui import PersonaSelectorComponent, PersonaManager
+from modules.scheduler import get_scheduler
+from modules.ui_updates import get_updater, user_action
+from modules.watchdog import start_watchdog
+
+# Views the Home screen does not need; imported on first visit, or by the preload after first paint.
+# The chat view pulls in the model wrapper, and llama_cpp itself is only loaded by preload/first reply.
+LAZY_VIEW_MODULES = (
+    "modules.gguf_chat_ui",
+    "modules.chats_view_ui",
+    "modules.memories_view_ui",
+    "modules.person_view_ui",
+    "modules.settings_view_ui",
+)
+startup_stats = {}
+# PERSONA_CHAT_SERVER=1 serves the app to browsers; every tab is a session sharing one model
+SERVER_MODE = os.environ.get("PERSONA_CHAT_SERVER", "0") == "1"
+_maintenance_claimed = threading.Lock()  # taken by the first session and never released
+
+
+def preload_heavy_modules():
+    if "preload_views_ms" in startup_stats:
+        return
+    started = perf_counter()
+    for name in LAZY_VIEW_MODULES:
+        importlib.import_module(name)
+    views_done = perf_counter()
+    try:
+        from modules.chatbot import load_llama
+        load_llama()
+    except ImportError as e:
+        print(f"Could not preload llama_cpp: {e}")
+    done = perf_counter()
+    startup_stats["preload_views_ms"] = (views_done - started) * 1000
+    startup_stats["preload_llama_ms"] = (done - views_done) * 1000
+    print(
+        f"Startup: preloaded views in {startup_stats['preload_views_ms']:.0f} ms, "
+        f"llama_cpp in {startup_stats['preload_llama_ms']:.0f} ms"
+    )
 
 
 def main(page: ft.Page):
+    main_started = perf_counter()
+    start_watchdog(page.loop)
     page.title = "GGUF ChatBot"
     page.theme_mode = ft.ThemeMode.LIGHT
     page.padding = 0
@@ -18,36 +62,33 @@ def main(page: ft.Page):
     memories_view_component = [None]
     persona_to_load_in_chat = [None]
     chat_to_load = [None]
+    message_to_focus = [None]
     menu_expanded = [False]
     person_view_component = [None]
+    settings_view_component = [None]
 
     content_area = ft.Container(expand=True)
+    updates = get_updater(page)
+    dialogs = get_dialogs(page)  # adds the shared FilePicker before the first page.update
     persona_manager = PersonaManager()
+    history_manager = HistoryManager()
 
     def _show_info_dialog(title: str, content: str):
-        dlg = ft.AlertDialog(
-            modal=True,
-            title=ft.Text(title),
-            content=ft.Text(content),
-            actions=[ft.TextButton("OK", on_click=lambda e: setattr(dlg, 'open', False) or page.update())]
-        )
-        page.overlay.append(dlg)
-        dlg.open = True
-        page.update()
+        dialogs.info(title, content)
 
     def on_go_to_chat(chat_id: str):
-        chats = HistoryManager().load_chats()
-        target_chat = next((c for c in chats if c.get('chat_id') == chat_id), None)
+        target_chat = history_manager.get_chat_meta(chat_id)
         if target_chat:
             on_chat_selected(target_chat)
         else:
             _show_info_dialog("Error", f"Could not find associated chat (ID: {chat_id[:8]}...). It may have been deleted.")
-            page.update()
 
 
-    def on_chat_selected(chat: dict):
-        """Called when a user clicks a saved chat."""
+    @user_action("open_chat")
+    def on_chat_selected(chat: dict, message_id: str | None = None):
+        """Called when a user clicks a saved chat (index entry, without messages) or a search hit."""
         chat_to_load[0] = chat
+        message_to_focus[0] = message_id
         persona_to_load_in_chat[0] = None
         
         navigation_rail.selected_index = 2
@@ -55,6 +96,7 @@ def main(page: ft.Page):
 
     def update_main_view():
         index = navigation_rail.selected_index
+        focus_message_id = None
 
         if index == 0: # Home
             content_area.content = ft.Text("Home View", size=30)
@@ -68,10 +110,12 @@ def main(page: ft.Page):
         elif index == 2: # Chat room
             persona_to_load = persona_to_load_in_chat[0]
             saved_chat_to_load = chat_to_load[0]
+            focus_message_id = message_to_focus[0]
             
             # Consume the state after reading it
             persona_to_load_in_chat[0] = None
             chat_to_load[0] = None
+            message_to_focus[0] = None
 
             persona_for_session = None
             if saved_chat_to_load:
@@ -86,6 +130,7 @@ def main(page: ft.Page):
 
             # Create chat component if it doesn't exist AND we have a persona to show
             if chat_app_component[0] is None and persona_for_session:
+                from modules.gguf_chat_ui import GGUFChatApp
                 chat_app_component[0] = GGUFChatApp(page, persona=persona_for_session)
             
             # Now, update the component if it exists
@@ -95,7 +140,9 @@ def main(page: ft.Page):
                 elif saved_chat_to_load and persona_for_session: # Loading a saved chat
                     # We need to switch the persona first, then load history
                     chat_app_component[0].start_new_chat(persona_for_session) 
-                    chat_app_component[0].load_chat_history(saved_chat_to_load)
+                    full_chat = history_manager.load_chat(saved_chat_to_load['chat_id'])
+                    if full_chat:
+                        chat_app_component[0].load_chat_history(full_chat)
 
                 content_area.content = chat_app_component[0].view
                 chat_app_component[0]._on_resize()
@@ -108,32 +155,44 @@ def main(page: ft.Page):
 
         elif index == 3: # Memories
             if memories_view_component[0] is None:
+                from modules.memories_view_ui import MemoriesViewComponent
                 memories_view_component[0] = MemoriesViewComponent(page, on_go_to_chat=on_go_to_chat)
             
             content_area.content = memories_view_component[0].view
             memories_view_component[0].update_view()
         elif index == 4: # Chats
             if chats_view_component[0] is None:
+                from modules.chats_view_ui import ChatsViewComponent
                 chats_view_component[0] = ChatsViewComponent(page, on_chat_select=on_chat_selected)
             
             content_area.content = chats_view_component[0].view
             chats_view_component[0].update_view()
         elif index == 5: # Person
             if person_view_component[0] is None:
+                from modules.person_view_ui import PersonViewComponent
                 person_view_component[0] = PersonViewComponent(page)
             content_area.content = person_view_component[0].view
             person_view_component[0].update_view()
         elif index == 6: # Settings
-            content_area.content = ft.Text("Settings", size=20)
-        
-        page.update()
+            if settings_view_component[0] is None:
+                from modules.settings_view_ui import SettingsViewComponent
+                settings_view_component[0] = SettingsViewComponent(page)
+            content_area.content = settings_view_component[0].view
+            settings_view_component[0].update_view()
 
+        updates.mark(navigation_rail, content_area)
+
+        if index == 2 and focus_message_id and chat_app_component[0]:
+            chat_app_component[0].scroll_to_message(focus_message_id)
+
+    @user_action("select_persona")
     def on_persona_selected(persona: dict):
         persona_to_load_in_chat[0] = persona
         chat_to_load[0] = None
         navigation_rail.selected_index = 2
         update_main_view()
 
+    @user_action("navigate")
     def handle_navigation_change(e: ft.ControlEvent):
         """Called ONLY when the user clicks on the navigation rail."""
         update_main_view()
@@ -141,7 +200,7 @@ def main(page: ft.Page):
     def toggle_menu(e):
         menu_expanded[0] = not menu_expanded[0]
         navigation_rail.extended = menu_expanded[0]
-        page.update()
+        updates.mark(navigation_rail)
 
 
     def rail_icon(icon_name: str, msg: str):
@@ -222,6 +281,17 @@ def main(page: ft.Page):
 
     content_area.content = ft.Text("Home", size=20)
     page.update()
+    if "first_frame_ms" not in startup_stats:  # first session only; later ones reuse the imports
+        startup_stats["launch_to_main_ms"] = (main_started - PROCESS_STARTED) * 1000
+        startup_stats["first_frame_ms"] = (perf_counter() - PROCESS_STARTED) * 1000
+        # Taken before the maintenance thread below can import anything
+        startup_stats["loaded_before_first_frame"] = [
+            name for name in LAZY_VIEW_MODULES + ("llama_cpp",) if name in sys.modules
+        ]
+        print(
+            f"Startup: first frame {startup_stats['first_frame_ms']:.0f} ms after launch "
+            f"({startup_stats['launch_to_main_ms']:.0f} ms until main() ran)"
+        )
 
     def handle_resize(e):
         menu_spacer.height = e.height - 48*8 - 10
@@ -229,9 +299,43 @@ def main(page: ft.Page):
 
         if chat_app_component[0] and navigation_rail.selected_index == 2:
             chat_app_component[0]._on_resize(e)
-            page.update()
 
     page.on_resized = handle_resize
     handle_resize(page)
 
-ft.app(target=main, assets_dir="assets")
+    def handle_close(e):
+        # Replies this session still had queued would otherwise hold up the other sessions
+        get_scheduler().drop_session(page.session_id)
+        if chat_app_component[0]:
+            chat_app_component[0]._idle_cancel.set()
+
+    page.on_close = handle_close
+
+    def background_maintenance():
+        # Load the views and the model library now that the first frame is out,
+        # so the first visit to the chat room does not pay for them
+        if os.environ.get("PERSONA_CHAT_PRELOAD", "1") != "0":
+            preload_heavy_modules()
+        # Move chats untouched for a while into the compressed archive and drop unreferenced images
+        history_manager.archive_old_chats()
+        persona_manager.collect_garbage()
+        # Hash memory summaries for near-duplicate detection before the first save_memory needs them
+        history_manager.warm_memory_dedup_index()
+        # Opens (or starts building) the embedding index when an embedding model is configured
+        history_manager.semantic_index()
+
+    # Once per process; in server mode later sessions find it done
+    if _maintenance_claimed.acquire(blocking=False):
+        threading.Thread(target=background_maintenance, daemon=True).start()
+
+if __name__ == "__main__":
+    if SERVER_MODE:
+        ft.app(
+            target=main,
+            assets_dir="assets",
+            view=None,
+            host=os.environ.get("PERSONA_CHAT_HOST"),
+            port=int(os.environ.get("PERSONA_CHAT_PORT", "8550")),
+        )
+    else:
+        ft.app(target=main, assets_dir="assets")
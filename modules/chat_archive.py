@@ -0,0 +1,123 @@
+import gzip
+import json
+import os
+from modules.profiling import profiled
+from modules.repository import get_repository, json_default
+
+
+class ChatArchive:
+    """
+    Cold storage for old chats. Each month is one segment file made of
+    independent gzip members (one per chat), so a single chat can be read by
+    seeking to its offset and decompressing only that member. A JSON manifest
+    next to each segment keeps the chats' index entries, which lets the hot
+    metadata index be rebuilt without touching the compressed data.
+    """
+
+    ARCHIVE_DIR = "assets/archive"
+    COMPRESS_LEVEL = 6
+    COMPACT_BELOW = 0.5  # rewrite a segment once its live chats fill less than this fraction of it
+
+    def __init__(self):
+        self.repository = get_repository()
+        os.makedirs(self.ARCHIVE_DIR, exist_ok=True)
+
+    def _segment_path(self, month: str) -> str:
+        return os.path.join(self.ARCHIVE_DIR, f"chats-{month}.jsonl.gz")
+
+    def _manifest_path(self, month: str) -> str:
+        return os.path.join(self.ARCHIVE_DIR, f"chats-{month}.manifest.json")
+
+    def months(self) -> list:
+        return sorted(
+            name[len("chats-"):-len(".manifest.json")]
+            for name in os.listdir(self.ARCHIVE_DIR)
+            if name.startswith("chats-") and name.endswith(".manifest.json")
+        )
+
+    def manifest_paths(self) -> list:
+        return [self._manifest_path(month) for month in self.months()]
+
+    def load_manifest(self, month: str) -> list:
+        return self.repository.read(self._manifest_path(month), default=[])
+
+    @profiled("storage:archive_append")
+    def append(self, month: str, chats: list, index_entries: dict) -> list:
+        """Appends chats to the month's segment and returns their updated index entries."""
+        segment = self._segment_path(month)
+        archived_entries = []
+        with open(segment, "ab") as f:
+            for chat in chats:
+                payload = json.dumps(chat, ensure_ascii=False, default=json_default).encode("utf8")
+                offset = f.tell()
+                f.write(gzip.compress(payload, compresslevel=self.COMPRESS_LEVEL))
+                archived_entries.append({
+                    **index_entries[chat["chat_id"]],
+                    "archive": {"month": month, "offset": offset, "length": f.tell() - offset},
+                })
+
+        manifest = list(self.load_manifest(month)) + archived_entries
+        self.repository.write(self._manifest_path(month), manifest)
+        return archived_entries
+
+    @profiled("storage:archive_read")
+    def read(self, ref: dict) -> dict:
+        with open(self._segment_path(ref["month"]), "rb") as f:
+            f.seek(ref["offset"])
+            data = f.read(ref["length"])
+        return json.loads(gzip.decompress(data))
+
+    def remove(self, month: str, chat_id: str):
+        """Drops a chat from the month's manifest; the segment goes away with its last chat."""
+        manifest = [e for e in self.load_manifest(month) if e.get("chat_id") != chat_id]
+        if manifest:
+            self.repository.write(self._manifest_path(month), manifest)
+            return
+        for path in (self._segment_path(month), self._manifest_path(month)):
+            if os.path.isfile(path):
+                os.remove(path)
+        self.repository.invalidate(self._manifest_path(month))
+
+    def sparse_months(self, min_live_fraction: float | None = None) -> list:
+        """Months whose segment is mostly chats that were removed since they were appended."""
+        threshold = self.COMPACT_BELOW if min_live_fraction is None else min_live_fraction
+        months = []
+        for month in self.months():
+            segment = self._segment_path(month)
+            if not os.path.isfile(segment):
+                continue
+            live_bytes = sum(e["archive"]["length"] for e in self.load_manifest(month))
+            if live_bytes < os.path.getsize(segment) * threshold:
+                months.append(month)
+        return months
+
+    @profiled("storage:archive_compact")
+    def compact(self, month: str) -> list:
+        """
+        Rewrites the month's segment with only the chats still in its manifest
+        and returns their index entries with the new offsets. Members are copied
+        as they are, without recompressing.
+        """
+        segment = self._segment_path(month)
+        temp_path = f"{segment}.tmp"
+        compacted_entries = []
+        with open(segment, "rb") as src, open(temp_path, "wb") as dst:
+            for entry in self.load_manifest(month):
+                ref = entry["archive"]
+                src.seek(ref["offset"])
+                offset = dst.tell()
+                dst.write(src.read(ref["length"]))
+                compacted_entries.append({**entry, "archive": {**ref, "offset": offset}})
+        os.replace(temp_path, segment)
+        self.repository.write(self._manifest_path(month), compacted_entries)
+        return compacted_entries
+
+    def iter_entries(self):
+        for month in self.months():
+            yield from self.load_manifest(month)
+
+    def size_on_disk(self) -> int:
+        return sum(
+            os.path.getsize(os.path.join(self.ARCHIVE_DIR, name))
+            for name in os.listdir(self.ARCHIVE_DIR)
+        )
@@ -1,9 +1,147 @@
-from llama_cpp import Llama
+import os
+import threading
+from contextlib import nullcontext
+from time import perf_counter
 from modules.person_view_ui import PersonInfoManager
+from modules.profiling import profiled
+from modules.scheduler import SchedulerRejected, get_scheduler
+
+
+def load_llama():
+    """
+    Imports llama_cpp on first use; loading its native library is the slowest part
+    of startup, so it must not happen at module import time.
+    """
+    from llama_cpp import Llama
+    return Llama
+
+
+class Engine:
+    """A GGUF model, loaded on first use, and the lock that runs its generations one at a time."""
+
+    def __init__(self, model_path: str, **llama_kwargs):
+        self.model_path = model_path
+        self.name = os.path.basename(model_path.replace("\\", "/"))
+        self.n_ctx = llama_kwargs.get("n_ctx", 512)
+        self.lock = threading.Lock()
+        self._llama_kwargs = llama_kwargs
+        self._llm = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._load_lock:
+                if self._llm is None:
+                    self._llm = self._load()
+        return self._llm
+
+    @profiled("engine:load")
+    def _load(self):
+        Llama = load_llama()
+        return Llama(model_path=self.model_path, verbose=False, **self._llama_kwargs)
+
+    def fit_to_context(self, text: str, reserved_tokens: int) -> str:
+        """Keeps the end of `text` so that it plus `reserved_tokens` (prompt and answer) fits n_ctx."""
+        budget = self.n_ctx - reserved_tokens
+        tokens = self.llm.tokenize(text.encode("utf8"), add_bos=False)
+        if len(tokens) <= budget:
+            return text
+        if budget <= 0:
+            return ""
+        return self.llm.detokenize(tokens[-budget:]).decode("utf8", errors="ignore")
+
+
+# Tasks that may run on the utility model instead of the persona chat model
+UTILITY_TASKS = {"title", "summary"}
+
+_utility_engine = None
+_utility_engine_lock = threading.Lock()
+
+
+def get_utility_engine() -> Engine | None:
+    """
+    The shared small model for utility tasks, configured with PERSONA_CHAT_UTILITY_MODEL
+    (path to a GGUF) and optionally PERSONA_CHAT_UTILITY_CTX / PERSONA_CHAT_UTILITY_THREADS.
+    None when not configured; utility tasks then use the chat model.
+    """
+    global _utility_engine
+    model_path = os.environ.get("PERSONA_CHAT_UTILITY_MODEL")
+    if not model_path:
+        return None
+    with _utility_engine_lock:
+        if _utility_engine is None:
+            _utility_engine = Engine(
+                model_path,
+                n_ctx=int(os.environ.get("PERSONA_CHAT_UTILITY_CTX", "2048")),
+                n_threads=int(os.environ.get("PERSONA_CHAT_UTILITY_THREADS", "2")),
+                n_gpu_layers=-1,
+                n_batch=256,
+            )
+        return _utility_engine
+
+
+_chat_engines = {}
+_chat_engines_lock = threading.Lock()
+
+
+def get_chat_engine(model_path: str) -> Engine:
+    """The persona chat model, loaded once and shared by every ChatBot and session."""
+    with _chat_engines_lock:
+        engine = _chat_engines.get(model_path)
+        if engine is None:
+            engine = _chat_engines[model_path] = Engine(
+                model_path,
+                n_ctx=8192,
+                # n_ctx=32768,
+                n_threads=6,
+                n_gpu_layers=-1,
+                n_batch=512,
+                chat_format="gemma",
+                # seed=1337,
+            )
+        return engine
+
+
+_embedding_engine = None
+_embedding_engine_lock = threading.Lock()
+
+
+def embedding_model_configured() -> bool:
+    return bool(os.environ.get("PERSONA_CHAT_EMBEDDING_MODEL"))
+
+
+def get_embedding_engine() -> Engine | None:
+    """
+    The shared embedding model for semantic search, configured with PERSONA_CHAT_EMBEDDING_MODEL
+    (path to a GGUF with a pooling layer) and optionally PERSONA_CHAT_EMBEDDING_CTX / _THREADS.
+    None when not configured.
+    """
+    global _embedding_engine
+    if not embedding_model_configured():
+        return None
+    with _embedding_engine_lock:
+        if _embedding_engine is None:
+            _embedding_engine = Engine(
+                os.environ["PERSONA_CHAT_EMBEDDING_MODEL"],
+                embedding=True,
+                n_ctx=int(os.environ.get("PERSONA_CHAT_EMBEDDING_CTX", "512")),
+                n_threads=int(os.environ.get("PERSONA_CHAT_EMBEDDING_THREADS", "2")),
+                n_gpu_layers=-1,
+                n_batch=512,
+            )
+        return _embedding_engine
 
 
 class ChatBot:
-    def __init__(self, system_prompt: str):
+    MODEL_PATH = r"models\gemma-3-1B-it-QAT-Q4_0.gguf"
+    # Instructions and chat template around the conversation in a title/summary prompt
+    PROMPT_OVERHEAD_TOKENS = 200
+
+    def __init__(self, system_prompt: str, session_id=None):
+        # Replies queue up on this engine's lock; titles and summaries too unless a utility model is set
+        self.engine = get_chat_engine(self.MODEL_PATH)
+        self.session_id = session_id  # whose turn utility work on the chat model takes in the scheduler
         self.person_info_manager = PersonInfoManager()
         person_info = self.person_info_manager.load_info()
         person_info_text = "\n".join([info["content"] for info in person_info]) if person_info else "No personal info provided."
@@ -30,45 +168,122 @@ class ChatBot:
         - Не задавай въпроси към приятеля, освен ако той изрично не поиска диалог с въпроси или обратна връзка.
         """
 
-        self.llm = Llama(
-            model_path=r"models\gemma-3-1B-it-QAT-Q4_0.gguf",
-            n_ctx=8192,
-            # n_ctx=32768,
-            n_threads=6,
-            n_gpu_layers=-1,
-            n_batch=512,
-            verbose=False,
-            chat_format="gemma",
-            # seed=1337,
-        )
+        self.llm = self.engine.llm
 
+    def _engine_for(self, task: str) -> Engine:
+        if task in UTILITY_TASKS:
+            utility = get_utility_engine()
+            if utility is not None:
+                return utility
+        return self.engine
 
     def ask(self, user_input: str, history: list) -> str:
+        return self.ask_with_metrics(user_input, history)[0]
 
+    def ask_with_metrics(self, user_input: str, history: list, requested_at: float | None = None) -> tuple[str, dict]:
+        """
+        Returns (answer, metrics). `requested_at` is the perf_counter() time the user
+        asked, so the queue wait and time to first token include waiting for the model.
+        """
         messages_for_llm = []
 
         if not history:
             full_user_input = f"{self.system_prompt}\n\nВъпрос:\n\n{user_input}"
             messages_for_llm.append({"role": "user", "content": full_user_input})
         else:
+            # Only the text goes into the prompt; ids and reply metrics would waste context and break the cached prefix
+            history = [{"role": msg["role"], "content": msg["content"]} for msg in history]
             full_user_input = f"{self.system_prompt}\n\nИстория на разговора:\n{history}\n\nВъпрос: {user_input}\n\n\nОтговор:"
             messages_for_llm.append({"role": "user", "content": full_user_input})
 
-        response = self.llm.create_chat_completion(
-            messages=messages_for_llm,
-            max_tokens=2048,
-            temperature=1,
+        answer, metrics = self._generate_streamed(
+            messages_for_llm, requested_at, max_tokens=2048, temperature=1,
         )
+        return answer.strip(), metrics
+
+    @profiled("engine:reply")
+    def _generate_streamed(self, messages: list, requested_at: float | None, **kwargs) -> tuple[str, dict]:
+        requested_at = requested_at or perf_counter()
+        with self.engine.lock:
+            started = perf_counter()
+            # llama.cpp keeps the longest common prefix of the previous context instead of re-evaluating it
+            previous_tokens = list(self.llm.input_ids[:self.llm.n_tokens])
+            parts = []
+            first_token_at = None
+            finish_reason = None
+            for chunk in self.llm.create_chat_completion(messages=messages, stream=True, **kwargs):
+                choice = chunk["choices"][0]
+                delta = choice["delta"].get("content")
+                if delta:
+                    if first_token_at is None:
+                        first_token_at = perf_counter()
+                    parts.append(delta)
+                finish_reason = choice.get("finish_reason") or finish_reason
+            finished = perf_counter()
+            context_tokens = list(self.llm.input_ids[:self.llm.n_tokens])
+            answer = "".join(parts)
+            # A chunk can hold several tokens (e.g. multi-byte Cyrillic text), so count by tokenizing
+            decode_tokens = len(self.llm.tokenize(answer.encode("utf8"), add_bos=False)) if answer else 0
 
-        response_text = response["choices"][0]["message"]["content"].strip()
-        return response_text
+        first_token_at = first_token_at or finished
+        # The context holds the prompt and every generated token but the last one when max_tokens cut it off
+        evaluated_tokens = decode_tokens - 1 if finish_reason == "length" and decode_tokens else decode_tokens
+        prompt_tokens = max(0, len(context_tokens) - evaluated_tokens)
+        cached_tokens = 0
+        for old, new in zip(previous_tokens, context_tokens[:prompt_tokens]):
+            if old != new:
+                break
+            cached_tokens += 1
+        decode_seconds = finished - first_token_at
+        metrics = {
+            "model": self.engine.name,
+            "queue_ms": round((started - requested_at) * 1000, 1),
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "prefill_ms": round((first_token_at - started) * 1000, 1),
+            "ttft_ms": round((first_token_at - requested_at) * 1000, 1),
+            "decode_tokens": decode_tokens,
+            "decode_tps": round((decode_tokens - 1) / decode_seconds, 2) if decode_tokens > 1 and decode_seconds > 0 else None,
+            "total_tokens": prompt_tokens + decode_tokens,
+            "total_ms": round((finished - requested_at) * 1000, 1),
+        }
+        return answer, metrics
     
 
-    def summarize_title(self, messages: list) -> str:
+    def _complete(self, engine: Engine, messages: list, cancel: threading.Event | None = None, **kwargs) -> str | None:
+        """
+        Runs a utility completion. On the chat model it takes a scheduler turn like a reply.
+        With `cancel` it is background work: skipped (None) while the engine is busy or a
+        reply is waiting, and stopped at the next token once `cancel` is set (None).
+        """
+        if cancel is None:
+            turn = get_scheduler().slot(self.session_id) if engine is self.engine else nullcontext()
+            with turn, engine.lock:
+                response = engine.llm.create_chat_completion(messages=messages, **kwargs)
+            return response["choices"][0]["message"]["content"]
+
+        turn = get_scheduler().background(cancel) if engine is self.engine else nullcontext(True)
+        with turn as granted:
+            if not granted or not engine.lock.acquire(blocking=False):
+                return None
+            try:
+                parts = []
+                for chunk in engine.llm.create_chat_completion(messages=messages, stream=True, **kwargs):
+                    if cancel.is_set():
+                        return None
+                    parts.append(chunk["choices"][0]["delta"].get("content") or "")
+                return "".join(parts)
+            finally:
+                engine.lock.release()
+
+    @profiled("engine:title")
+    def summarize_title(self, messages: list, cancel: threading.Event | None = None) -> str | None:
         if not messages:
             return "Нов чат"
         
+        engine = self._engine_for("title")
         conversation_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+        conversation_text = engine.fit_to_context(conversation_text, reserved_tokens=50 + self.PROMPT_OVERHEAD_TOKENS)
         # summarization_prompt = f"""
         # ### Инструкции:
         # 1. Прочети разговора по-долу.
@@ -88,23 +303,26 @@ class ChatBot:
         ]
 
         try:
-            response = self.llm.create_chat_completion(
-                messages=summarization_messages,
-                max_tokens=50,
-                temperature=0.2,
-            )
-            summary = response["choices"][0]["message"]["content"].strip().replace('"', '')
+            text = self._complete(engine, summarization_messages, cancel, max_tokens=50, temperature=0.2)
+            if text is None:
+                return None
+            summary = text.strip().replace('"', '')
             return summary if summary else "Резюме на разговора"
+        except SchedulerRejected:
+            raise  # shown to the user by the save dialog
         except Exception as e:
             print(f"Error in summarize_title: {e}")
-            return "Заглавие неуспешно."
+            return None if cancel is not None else "Заглавие неуспешно."
     
 
-    def summarize(self, messages: list) -> str:
+    @profiled("engine:summary")
+    def summarize(self, messages: list, cancel: threading.Event | None = None) -> str | None:
         if not messages:
             return "Няма съдържание за обобщаване."
         
+        engine = self._engine_for("summary")
         conversation_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+        conversation_text = engine.fit_to_context(conversation_text, reserved_tokens=500 + self.PROMPT_OVERHEAD_TOKENS)
         
         # summarization_prompt = f"""
         # ### Инструкции:
@@ -126,14 +344,14 @@ class ChatBot:
         ]
         
         try:
-            response = self.llm.create_chat_completion(
-                messages=summarization_messages,
-                max_tokens=500,
-                temperature=0.3,
-            )
-            summary = response["choices"][0]["message"]["content"].strip().replace('"', '')
+            text = self._complete(engine, summarization_messages, cancel, max_tokens=500, temperature=0.3)
+            if text is None:
+                return None
+            summary = text.strip().replace('"', '')
             return summary
+        except SchedulerRejected:
+            raise  # shown to the user by the save dialog
         except Exception as e:
             print(f"Error in summarize: {e}")
-            return "Обобщение неуспешно."
+            return None if cancel is not None else "Обобщение неуспешно."
 
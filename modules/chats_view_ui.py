@@ -1,34 +1,107 @@
+import threading
 import flet as ft
+from modules.chatbot import embedding_model_configured
+from modules.dialogs import get_dialogs
 from modules.history_manager import HistoryManager
+from modules.keyed_list import KeyedList
 from modules.persona_selector_ui import PersonaManager
+from modules.thumbnails import thumbnail_path
+from modules.search_index import get_search_index
+from modules.ui_updates import get_updater, user_action
 from datetime import datetime
 
 
 class ChatsViewComponent:
+    SEARCH_RESULTS_LIMIT = 50
+    SEMANTIC_RESULTS_LIMIT = 20
+    KEYWORD_HINT = "Search chats, memories and personal info"
+    SEMANTIC_HINT = "Describe a conversation and press Enter"
+    # Day panels: only the newest days start expanded, and headers are added a page at a time
+    EXPANDED_DAYS = 2
+    DAYS_PAGE = 30
+    SCROLL_EDGE_PX = 200
+    SEARCH_ICONS = {
+        "message": ft.Icons.CHAT_BUBBLE_OUTLINE,
+        "chat": ft.Icons.TITLE,
+        "memory": ft.Icons.WEB_STORIES_OUTLINED,
+        "info": ft.Icons.ACCOUNT_CIRCLE_OUTLINED,
+    }
+
     def __init__(self, page: ft.Page, on_chat_select: callable):
         self.page = page
+        self.updates = get_updater(page)
+        self.dialogs = get_dialogs(page)
         self.on_chat_select = on_chat_select
         self.history_manager = HistoryManager()
         self.persona_manager = PersonaManager()
 
         self.chats_by_date = {}
+        self._days = []
+        self._days_shown = 0
+        self._personas = {}
+        self._more_days_row = ft.Row(
+            [ft.TextButton("Show older days", icon=ft.Icons.EXPAND_MORE, on_click=self._show_more_days)],
+            alignment=ft.MainAxisAlignment.CENTER,
+        )
         self.chats_list_container = ft.Column(
                 expand=True, 
                 spacing=15, 
             )
+        self._data_version = None
+        self._personas_version = None
+        self._empty_placeholder = ft.Text(
+            "No chats saved yet. Start a conversation and save it!",
+            text_align=ft.TextAlign.CENTER,
+            size=16,
+            color=ft.Colors.OUTLINE,
+        )
+        self._day_panels = KeyedList(
+            self.chats_list_container,
+            key=lambda day: day[0],
+            build=self._build_day_panel,
+            update=self._update_day_panel,
+            fingerprint=self._day_fingerprint,
+        )
+        self._day_tiles = {}  # date -> KeyedList of chat tiles, only for days that were expanded
+        self.search_results = ft.Column(spacing=5, visible=False)
+        self._search_generation = 0
+        self.search_field = ft.TextField(
+            hint_text=self.KEYWORD_HINT,
+            prefix_icon=ft.Icons.SEARCH,
+            on_change=self._on_search_change,
+            on_submit=self._on_search_submit,
+            border_radius=10,
+            dense=True,
+            width=380,
+        )
+        self.semantic_button = ft.IconButton(
+            icon=ft.Icons.PSYCHOLOGY_OUTLINED,
+            selected_icon=ft.Icons.PSYCHOLOGY,
+            selected=False,
+            tooltip="Search by meaning",
+            on_click=self._toggle_semantic_search,
+            visible=embedding_model_configured(),
+        )
 
         self._root = ft.Column(
             [
                 ft.Container(
                     content=ft.Row(
                         [
-                            ft.Icon(ft.Icons.HISTORY, size=28),
-                            ft.Text(
-                                "Saved Chats",
-                                theme_style=ft.TextThemeStyle.HEADLINE_SMALL,
+                            ft.Row(
+                                [
+                                    ft.Icon(ft.Icons.HISTORY, size=28),
+                                    ft.Text(
+                                        "Saved Chats",
+                                        theme_style=ft.TextThemeStyle.HEADLINE_SMALL,
+                                    ),
+                                ],
+                                spacing=10,
+                                vertical_alignment=ft.CrossAxisAlignment.CENTER,
                             ),
+                            ft.Row([self.search_field, self.semantic_button], spacing=5),
                         ],
-                        alignment=ft.MainAxisAlignment.START,
+                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
                         vertical_alignment=ft.CrossAxisAlignment.CENTER,
                         spacing=10,
                     ),
@@ -43,8 +116,14 @@ class ChatsViewComponent:
                                 content=self.chats_list_container,
                                 padding=ft.padding.only(right=20),
                             ),
+                            ft.Container(
+                                content=self.search_results,
+                                padding=ft.padding.only(right=20),
+                            ),
                         ],
                         scroll=ft.ScrollMode.ALWAYS,
+                        on_scroll=self._on_list_scroll,
+                        on_scroll_interval=200,
                     ),
                     padding=ft.padding.only(left=10, right=10, top=0, bottom=10),
                     expand=True,
@@ -58,105 +137,232 @@ class ChatsViewComponent:
     def view(self) -> ft.Control:
         return self._root
 
+    @user_action("delete_chat")
     def _show_delete_confirmation(self, chat_id: str, title: str):
+        @user_action("delete_chat")
         def confirm_delete(e):
             self.history_manager.delete_chat(chat_id)
             self.update_view()
-            dlg.open = False
-            self.page.update()
-
-        dlg = ft.AlertDialog(
-            modal=True,
-            title=ft.Text("Confirm Deletion"),
-            content=ft.Text(f"Are you sure you want to delete '{title}'?"),
-            actions=[
-                ft.TextButton(
-                    "Delete",
-                    on_click=confirm_delete,
-                    style=ft.ButtonStyle(color=ft.Colors.RED),
-                ),
-                ft.TextButton(
-                    "Cancel",
-                    on_click=lambda e: setattr(dlg, "open", False)
-                    or self.page.update(),
-                ),
-            ],
-            actions_alignment=ft.MainAxisAlignment.END,
-        )
-        self.page.overlay.append(dlg)
-        dlg.open = True
-        self.page.update()
+            self.updates.mark(self.chats_list_container)
+
+        self.dialogs.confirm("Confirm Deletion", f"Are you sure you want to delete '{title}'?", confirm_delete)
 
     def update_view(self):
-        self.chats_list_container.controls.clear()
-        all_chats = self.history_manager.load_chats()
-        all_personas = {p["id"]: p for p in self.persona_manager.load_personas()}
+        version = (self.history_manager.chat_index_version(), self.persona_manager.data_version())
+        if self._day_panels.is_current(version):
+            return
+
+        all_chats = self.history_manager.load_chat_index()
+        self._personas = {p["id"]: p for p in self.persona_manager.load_personas()}
+        self._data_version = version
+        self._personas_version = version[1]
 
+        # ISO timestamps sort and group as plain strings; no need to parse every one
         self.chats_by_date = {}
         for chat in sorted(all_chats, key=lambda x: x["timestamp"], reverse=True):
-            chat_date_str = datetime.fromisoformat(chat["timestamp"]).strftime("%Y-%m-%d")
-            if chat_date_str not in self.chats_by_date:
-                self.chats_by_date[chat_date_str] = []
-            self.chats_by_date[chat_date_str].append(chat)
-
-        if not self.chats_by_date:
-            self.chats_list_container.controls.append(
-                ft.Text(
-                    "No chats saved yet. Start a conversation and save it!",
-                    text_align=ft.TextAlign.CENTER,
-                    size=16,
-                    color=ft.Colors.OUTLINE,
-                )
-            )
-        else:
-            for date, chats_on_date in self.chats_by_date.items():
-                chat_items = []
-                for chat in chats_on_date:
-                    persona_info = all_personas.get(chat["persona_id"], {})
-                    chat_items.append(
-                        ft.ListTile(
-                            leading=ft.Image(
-                                src=persona_info.get("image_path"),
-                                fit=ft.ImageFit.COVER,
-                                width=40,
-                                height=40,
-                                border_radius=20,
-                                error_content=ft.Icon(ft.Icons.PERSON),
-                            ),
-                            title=ft.Text(chat.get("title", "Untitled Chat")),
-                            subtitle=ft.Text(
-                                f"{len(chat['messages'])} messages with {persona_info.get('name', 'Unknown Persona')}"
-                            ),
-                            on_click=lambda _, c=chat: self.on_chat_select(c),
-                            trailing=ft.IconButton(
-                                ft.Icons.DELETE_OUTLINE,
-                                icon_color=ft.Colors.RED_ACCENT,
-                                on_click=lambda _,
-                                c=chat: self._show_delete_confirmation(c["chat_id"], c.get("title", "...")),
-                            ),
-                            data=chat,
-                        )
-                    )
+            self.chats_by_date.setdefault(chat["timestamp"][:10], []).append(chat)
+        self._days = list(self.chats_by_date)
+        self._days_shown = min(len(self._days), max(self._days_shown, self.DAYS_PAGE))
 
-                panel = ft.ExpansionPanel(
-                    header=ft.ListTile(
-                        title=ft.Text(self._format_date(date), weight=ft.FontWeight.BOLD),
-                    ),
-                    bgcolor=ft.Colors.BLUE_50,
-                    content=ft.Column(controls=chat_items, spacing=5),
-                    expanded=True,
-                    can_tap_header=True,
-                )
+        self._sync_day_panels(version)
+
+    def _sync_day_panels(self, version=None):
+        days = [(date, self.chats_by_date[date]) for date in self._days[:self._days_shown]]
+        leading = [self._empty_placeholder] if not days else []
+        trailing = [self._more_days_row] if self._days_shown < len(self._days) else []
+        self._day_panels.sync(days, version=version, leading=leading, trailing=trailing)
+
+        shown = set(self._days[:self._days_shown])
+        for date in [d for d in self._day_tiles if d not in shown]:
+            del self._day_tiles[date]
+
+    def _day_fingerprint(self, day: tuple) -> tuple:
+        date, chats_on_date = day
+        return tuple(repr(chat) for chat in chats_on_date), self._personas_version
+
+    def _day_subtitle(self, chats_on_date: list) -> str:
+        return f"{len(chats_on_date)} chats" if len(chats_on_date) != 1 else "1 chat"
 
-                panel_list = ft.ExpansionPanelList(
-                    controls=[panel], 
-                    spacing=5,
-                    expanded_header_padding=5,
-                    elevation=3,
-                    divider_color=ft.Colors.GREY,
+    def _build_day_panel(self, day: tuple) -> ft.ExpansionPanelList:
+        """Only the header is built for collapsed days; their tiles are made on first expand."""
+        date, chats_on_date = day
+        expanded = date in self._days[:self.EXPANDED_DAYS]
+        panel = ft.ExpansionPanel(
+            header=ft.ListTile(
+                title=ft.Text(self._format_date(date), weight=ft.FontWeight.BOLD),
+                subtitle=ft.Text(self._day_subtitle(chats_on_date)),
+            ),
+            bgcolor=ft.Colors.BLUE_50,
+            content=ft.Column(spacing=5),
+            expanded=expanded,
+            can_tap_header=True,
+        )
+        if expanded:
+            self._materialize_day(panel, date)
+
+        return ft.ExpansionPanelList(
+            controls=[panel], 
+            spacing=5,
+            expanded_header_padding=5,
+            elevation=3,
+            divider_color=ft.Colors.GREY,
+            on_change=self._on_day_toggle,
+            data=date,
+        )
+
+    def _update_day_panel(self, panel_list: ft.ExpansionPanelList, day: tuple):
+        date, chats_on_date = day
+        panel = panel_list.controls[0]
+        panel.header.subtitle.value = self._day_subtitle(chats_on_date)
+        tiles = self._day_tiles.get(date)
+        if tiles is not None:
+            tiles.sync(chats_on_date)
+        return panel_list
+
+    def _materialize_day(self, panel: ft.ExpansionPanel, date: str):
+        tiles = KeyedList(
+            panel.content,
+            "chat_id",
+            self._build_chat_tile,
+            fingerprint=lambda chat: (repr(chat), self._personas_version),
+        )
+        tiles.sync(self.chats_by_date.get(date, []))
+        self._day_tiles[date] = tiles
+
+    def _build_chat_tile(self, chat: dict) -> ft.ListTile:
+        persona_info = self._personas.get(chat["persona_id"], {})
+        return ft.ListTile(
+            leading=ft.Image(
+                src=thumbnail_path(persona_info.get("image_path")),
+                fit=ft.ImageFit.COVER,
+                width=40,
+                height=40,
+                border_radius=20,
+                error_content=ft.Icon(ft.Icons.PERSON),
+            ),
+            title=ft.Text(chat.get("title", "Untitled Chat")),
+            subtitle=ft.Text(
+                f"{chat.get('message_count', 0)} messages with {persona_info.get('name', 'Unknown Persona')}"
+            ),
+            on_click=lambda _, c=chat: self.on_chat_select(c),
+            trailing=ft.IconButton(
+                ft.Icons.DELETE_OUTLINE,
+                icon_color=ft.Colors.RED_ACCENT,
+                on_click=lambda _,
+                c=chat: self._show_delete_confirmation(c["chat_id"], c.get("title", "...")),
+            ),
+            data=chat,
+        )
+
+    @user_action("expand_day")
+    def _on_day_toggle(self, e: ft.ControlEvent):
+        if e.control.data not in self._day_tiles:
+            panel = e.control.controls[0]
+            self._materialize_day(panel, e.control.data)
+            self.updates.mark(panel)
+
+    @user_action("more_days")
+    def _show_more_days(self, e=None):
+        if self._days_shown >= len(self._days):
+            return
+        self._days_shown = min(len(self._days), self._days_shown + self.DAYS_PAGE)
+        self._day_panels.invalidate()
+        self._sync_day_panels(self._data_version)
+        self.updates.mark(self.chats_list_container)
+
+    def _on_list_scroll(self, e: ft.OnScrollEvent):
+        if not self.chats_list_container.visible or e.pixels is None:
+            return
+        if e.pixels >= e.max_scroll_extent - self.SCROLL_EDGE_PX:
+            self._show_more_days()
+
+    @user_action("toggle_semantic_search")
+    def _toggle_semantic_search(self, e):
+        self.semantic_button.selected = not self.semantic_button.selected
+        self.search_field.hint_text = self.SEMANTIC_HINT if self.semantic_button.selected else self.KEYWORD_HINT
+        self.updates.mark(self.semantic_button, self.search_field)
+        self._on_search_change(e)
+
+    @user_action("search")
+    def _on_search_change(self, e):
+        self._search_generation += 1
+        query = self.search_field.value.strip()
+
+        if not query:
+            self.search_results.controls.clear()
+            self.search_results.visible = False
+            self.chats_list_container.visible = True
+            self.updates.mark(self.search_results, self.chats_list_container)
+            return
+        if self.semantic_button.selected:
+            return  # embedding the query is too slow for every keystroke; it runs on Enter
+
+        results = get_search_index().search(self.search_field.value, limit=self.SEARCH_RESULTS_LIMIT)
+        self._show_search_results(query, results)
+
+    @user_action("semantic_search")
+    def _on_search_submit(self, e):
+        query = self.search_field.value.strip()
+        if not query or not self.semantic_button.selected:
+            return
+        semantic_index = self.history_manager.semantic_index()
+        if semantic_index is None:
+            return
+        self._search_generation += 1
+        generation = self._search_generation
+        self.search_results.controls = [ft.Row([ft.ProgressRing(width=16, height=16, stroke_width=2), ft.Text("Searching...")])]
+        self.search_results.visible = True
+        self.chats_list_container.visible = False
+        self.updates.mark(self.search_results, self.chats_list_container)
+
+        def search():
+            try:
+                results = semantic_index.search(query, limit=self.SEMANTIC_RESULTS_LIMIT)
+            except Exception as ex:
+                print(f"Semantic search failed: {ex}")
+                results = []
+            with self.updates.lock:
+                if generation == self._search_generation:
+                    self._show_search_results(query, results)
+
+        threading.Thread(target=search, daemon=True).start()
+
+    def _show_search_results(self, query: str, results: list):
+        chats_meta = {c["chat_id"]: c for c in self.history_manager.load_chat_index()}
+        self.search_results.controls.clear()
+
+        for result in results:
+            chat = chats_meta.get(result.get("chat_id"))
+            if result["kind"] == "info":
+                title = "Personal info"
+            elif result["kind"] == "memory":
+                title = f"Memory: {chat.get('title', 'Untitled Chat')}" if chat else "Memory"
+            else:
+                if not chat:
+                    continue
+                title = chat.get("title", "Untitled Chat")
+
+            on_click = None
+            if chat:
+                on_click = lambda _, c=chat, mid=result.get("message_id"): self.on_chat_select(c, mid)
+
+            self.search_results.controls.append(
+                ft.ListTile(
+                    leading=ft.Icon(self.SEARCH_ICONS.get(result["kind"], ft.Icons.SEARCH)),
+                    title=ft.Text(title),
+                    subtitle=ft.Text(result["snippet"], max_lines=2, overflow=ft.TextOverflow.ELLIPSIS),
+                    on_click=on_click,
                 )
+            )
+
+        if not self.search_results.controls:
+            self.search_results.controls.append(
+                ft.Text(f"No results for '{query}'.", size=16, color=ft.Colors.OUTLINE)
+            )
 
-                self.chats_list_container.controls.append(panel_list)
+        self.search_results.visible = True
+        self.chats_list_container.visible = False
+        self.updates.mark(self.search_results, self.chats_list_container)
 
     def _format_date(self, date_str: str) -> str:
         date_obj = datetime.strptime(date_str, "%Y-%m-%d")
@@ -0,0 +1,140 @@
+import threading
+import weakref
+import flet as ft
+from modules.ui_updates import get_updater
+
+
+class DialogPool:
+    """
+    Reuses a handful of AlertDialogs and one FilePicker per page instead of
+    appending a new control to page.overlay for every prompt. The pool only grows
+    while several dialogs are open at once; extra idle dialogs are removed again.
+    """
+
+    MAX_IDLE = 2
+
+    def __init__(self, page: ft.Page):
+        self._page = weakref.ref(page)
+        self.updates = get_updater(page)
+        self._lock = threading.Lock()
+        self._dialogs = []
+        self._busy = {}  # id(dialog) -> token of the show() that holds it
+
+        self._pick_callback = None
+        self.file_picker = ft.FilePicker(on_result=self._on_pick_result)
+        page.overlay.append(self.file_picker)  # sent with the next page update
+
+    @property
+    def page(self):
+        return self._page()
+
+    @property
+    def size(self) -> int:
+        return len(self._dialogs)
+
+    def _acquire(self) -> tuple[ft.AlertDialog, object]:
+        with self._lock:
+            for dialog in self._dialogs:
+                if id(dialog) not in self._busy:
+                    break
+            else:
+                dialog = ft.AlertDialog()
+                self._dialogs.append(dialog)
+            token = object()
+            self._busy[id(dialog)] = token
+            return dialog, token
+
+    def show(
+        self,
+        title,
+        content: ft.Control | str | None = None,
+        actions: list | None = None,
+        modal: bool = True,
+        actions_alignment: ft.MainAxisAlignment = ft.MainAxisAlignment.END,
+    ) -> ft.AlertDialog:
+        dialog, token = self._acquire()
+        dialog.modal = modal
+        dialog.title = ft.Text(title) if isinstance(title, str) else title
+        dialog.content = ft.Text(content) if isinstance(content, str) else content
+        dialog.actions = actions or []
+        dialog.actions_alignment = actions_alignment
+        # A late dismiss event from an earlier use must not free the dialog again
+        dialog.on_dismiss = lambda e: self._release(dialog, token)
+
+        if dialog.page is None:
+            # First use: page.open adds it to the overlay with a scoped update
+            with self.updates.lock:
+                self.page.open(dialog)
+        else:
+            dialog.open = True
+            self.updates.mark(dialog)
+        return dialog
+
+    def close(self, dialog: ft.AlertDialog):
+        dialog.open = False
+        self.updates.mark(dialog)
+        self._release(dialog)
+
+    def _release(self, dialog: ft.AlertDialog, token=None):
+        with self._lock:
+            if token is not None and self._busy.get(id(dialog)) is not token:
+                return
+            self._busy.pop(id(dialog), None)
+            idle = [d for d in self._dialogs if id(d) not in self._busy]
+            surplus = idle[:max(0, len(idle) - self.MAX_IDLE)]
+            for extra in surplus:
+                self._dialogs.remove(extra)
+        for extra in surplus:
+            offstage = extra.parent  # the overlay container page.open put it in
+            if offstage is not None and extra in offstage.controls:
+                with self.updates.lock:
+                    offstage.controls.remove(extra)
+                self.updates.mark(offstage)
+
+    def confirm(self, title: str, content, on_confirm: callable, confirm_text: str = "Delete") -> ft.AlertDialog:
+        def confirmed(e):
+            on_confirm(e)
+            self.close(dialog)
+
+        dialog = self.show(
+            title,
+            content,
+            actions=[
+                ft.TextButton(confirm_text, on_click=confirmed, style=ft.ButtonStyle(color=ft.Colors.RED)),
+                ft.TextButton("Cancel", on_click=lambda e: self.close(dialog)),
+            ],
+        )
+        return dialog
+
+    def info(self, title: str, content) -> ft.AlertDialog:
+        dialog = self.show(title, content, actions=[ft.TextButton("OK", on_click=lambda e: self.close(dialog))])
+        return dialog
+
+    def loading(self, title: str, text: str) -> ft.AlertDialog:
+        return self.show(title, ft.Row([ft.ProgressRing(), ft.Text(text)], spacing=20))
+
+    def pick_files(self, on_result: callable, **kwargs):
+        """Opens the shared FilePicker; `on_result` gets the FilePickerResultEvent."""
+        self._pick_callback = on_result
+        if self.file_picker.page is None:
+            self.page.update()
+        self.file_picker.pick_files(**kwargs)
+
+    def _on_pick_result(self, e: ft.FilePickerResultEvent):
+        callback, self._pick_callback = self._pick_callback, None
+        if callback:
+            callback(e)
+
+
+_pools = weakref.WeakKeyDictionary()
+_pools_lock = threading.Lock()
+
+
+def get_dialogs(page: ft.Page) -> DialogPool:
+    """One pool per page (session)."""
+    with _pools_lock:
+        pool = _pools.get(page)
+        if pool is None:
+            pool = DialogPool(page)
+            _pools[page] = pool
+        return pool
@@ -1,19 +1,51 @@
 import asyncio
+import re
 import threading
-from time import time
+from collections import OrderedDict
+from time import perf_counter
 import uuid
 import flet as ft
 from modules.chatbot import ChatBot
+from modules.dialogs import get_dialogs
 from modules.history_manager import HistoryManager
+from modules.scheduler import SchedulerRejected, get_scheduler
+from modules.thumbnails import thumbnail_path
+from modules.ui_updates import get_updater, user_action
+
+
+# Anything Markdown would render differently from plain text: emphasis, code, headings,
+# quotes, tables, links, lists, rules and bare URLs (GitHub-flavored autolinks)
+MARKDOWN_RE = re.compile(
+    r"[*_`~#>|\[\]\\<]|https?://|www\.|^\s*(?:[-+]|\d+[.)])\s|^\s*(?:={3,}|-{3,})\s*$",
+    re.MULTILINE,
+)
+
+
+def has_markdown(text: str) -> bool:
+    return bool(text) and MARKDOWN_RE.search(text) is not None
 
 
 class GGUFChatApp:
 
-    BUBBLE_RATIO = 0.7
+    # Bubbles take 7/10 of the row through flex ratios, so the client reflows them on resize
+    BUBBLE_FLEX = 7
+    GUTTER_FLEX = 3
+    RESIZE_DEBOUNCE = 0.15
     LOADING_BUBBLE_WIDTH = 80
+    # Transcript virtualization: only a window of messages is turned into controls
+    INITIAL_WINDOW = 30
+    PAGE_SIZE = 20
+    MAX_WINDOW = 80
+    SCROLL_EDGE_PX = 80
+    # Built bubble rows kept across windows and chat reloads, keyed by message id + content
+    BUBBLE_CACHE_SIZE = 400
+    # Seconds without typing before the title and summary are precomputed
+    IDLE_SECONDS = 4
 
     def __init__(self, page: ft.Page, persona: dict):
         self.page = page
+        self.updates = get_updater(page)
+        self.dialogs = get_dialogs(page)
         self.current_persona = persona
         self._bot = {"instance": None}
         self.history_manager = HistoryManager()
@@ -24,10 +56,23 @@ class GGUFChatApp:
         self.active_bot_bubble = None
         self.active_bot_wrapper = None
         self.active_loading_row = None
+        self.active_queue_text = None
+        self._rows = {}  # message id -> materialized Row, only for messages inside the window
+        self._bubble_cache = OrderedDict()  # (id, role, hash(content), avatar) -> Row, LRU
+        self.bubble_cache_stats = {"hits": 0, "misses": 0}
+        self._window_start = 0
+        self._window_end = 0
+        self._paging_lock = threading.Lock()
+        self._resize_timer = None
+        self._resize_lock = threading.Lock()
+        self.resize_stats = {"events": 0, "event_ms": 0.0, "applies": 0, "apply_ms": 0.0}
+        self._idle_timer = None
+        self._idle_cancel = threading.Event()
+        self._precomputed = {}  # "title" / "summary" -> (messages fingerprint, text)
 
         self.persona_avatar = ft.Container(
             content=ft.Image(
-                src=self.current_persona.get("image_path"),
+                src=thumbnail_path(self.current_persona.get("image_path")),
                 fit=ft.ImageFit.COVER,
                 error_content=ft.Icon(ft.Icons.PERSON)
             ),
@@ -67,7 +112,8 @@ class GGUFChatApp:
 
         self.user_input = ft.TextField(
             label="Enter your message", expand=True,
-            on_submit=self._send_message, border_radius=10
+            on_submit=self._send_message, border_radius=10,
+            on_change=self._on_user_activity,
         )
 
         self.send_btn = ft.IconButton(
@@ -86,6 +132,17 @@ class GGUFChatApp:
             spacing=10, 
             scroll=ft.ScrollMode.ALWAYS,
             auto_scroll=False,
+            on_scroll=self._on_transcript_scroll,
+            on_scroll_interval=150,
+        )
+
+        self._load_older_row = ft.Row(
+            [ft.TextButton("Show earlier messages", icon=ft.Icons.EXPAND_LESS, on_click=lambda _: self._page_in_older())],
+            alignment=ft.MainAxisAlignment.CENTER,
+        )
+        self._load_newer_row = ft.Row(
+            [ft.TextButton("Show newer messages", icon=ft.Icons.EXPAND_MORE, on_click=lambda _: self._page_in_newer())],
+            alignment=ft.MainAxisAlignment.CENTER,
         )
 
         self.chat_container = ft.Container(
@@ -127,24 +184,19 @@ class GGUFChatApp:
     def view(self):
         return self._root
     
+    @user_action("delete_message")
     def _show_delete_confirmation(self, e):
         message_id = e.control.data
+
+        @user_action("delete_message")
         def confirm_delete(event):
             self._delete_message(message_id)
-            dialog.open = False
-            self.page.update()
-
-        dialog = ft.AlertDialog(
-            modal=True, title=ft.Text("Confirm Deletion"),
-            content=ft.Text("Are you sure you want to delete this message? This action cannot be undone."),
-            actions=[
-                ft.TextButton("Delete", on_click=confirm_delete, style=ft.ButtonStyle(color=ft.Colors.RED)),
-                ft.TextButton("Cancel", on_click=lambda _: setattr(dialog, 'open', False) or self.page.update())
-            ]
+
+        self.dialogs.confirm(
+            "Confirm Deletion",
+            "Are you sure you want to delete this message? This action cannot be undone.",
+            confirm_delete,
         )
-        self.page.overlay.append(dialog)
-        dialog.open = True
-        self.page.update()
 
     def _delete_message(self, message_id_to_delete: str):
         indices_to_remove = []
@@ -162,14 +214,22 @@ class GGUFChatApp:
         
         for i in sorted(indices_to_remove, reverse=True):
             del self.current_chat_messages[i]
+            if i < self._window_start:
+                self._window_start -= 1
+            if i < self._window_end:
+                self._window_end -= 1
         
-        self.chat_column.controls = [c for c in self.chat_column.controls if c.data not in ids_to_remove]
+        for message_id in ids_to_remove:
+            self._rows.pop(message_id, None)
+        for key in [k for k in self._bubble_cache if k[0] in ids_to_remove]:
+            del self._bubble_cache[key]
+        self._render_window()
         
         if self.current_chat_id:
             self.history_manager.update_chat(self.current_chat_id, self.current_chat_messages)
             print(f"Chat {self.current_chat_id} updated after deletion.")
             # self._bot["instance"].load_history(self.current_chat_messages)
-        self.page.update()
+        self.updates.mark(self.chat_column)
     
     def _create_delete_icon(self, message_id):
         icon = ft.Icon(
@@ -217,6 +277,7 @@ class GGUFChatApp:
             alignment=ft.alignment.center
         )
     
+    @user_action("edit_message")
     def _start_editing_message(self, e):
         message_id = e.control.data
         self.editing_message_id = message_id
@@ -233,7 +294,7 @@ class GGUFChatApp:
         self.send_btn.tooltip = "Confirm Edit"
         self.user_input.focus()
         self.cancel_btn.visible = True
-        self.page.update()
+        self.updates.mark(self.input_container)
 
     def _exit_editing_mode(self):
         self.editing_message_id = None
@@ -242,112 +303,165 @@ class GGUFChatApp:
         self.send_btn.icon = ft.Icons.SEND_ROUNDED
         self.send_btn.tooltip = "Send Message"
         self.cancel_btn.visible = False
-        self.page.update()
+        self.updates.mark(self.input_container)
 
+    @user_action("cancel_edit")
     def _cancel_edit(self, e):
         self._exit_editing_mode()
 
     def _show_info_dialog(self, title: str, content):
-        content_control = content if isinstance(content, ft.Control) else ft.Text(content)
-        
-        dlg = ft.AlertDialog(
-            modal=True,
-            title=ft.Text(title),
-            content=content_control,
-            actions=[ft.TextButton("OK", on_click=lambda e: setattr(dlg, 'open', False) or self.page.update())],
-            actions_alignment=ft.MainAxisAlignment.END
-        )
-        self.page.overlay.append(dlg)
-        dlg.open = True
-        self.page.update()
+        self.dialogs.info(title, content)
     
+    @user_action("save_chat")
     def _save_chat_click(self, e):
         if not self.current_chat_messages:
-            self._show_info_dialog("Cannot save an empty chat!")
+            self._show_info_dialog("Nothing to Save", "Cannot save an empty chat!")
             return
         
         if self.current_chat_id:
             self._show_info_dialog("Already Saved", "This chat is already saved and will auto-update.")
             return
 
-        loading_dialog = ft.AlertDialog(modal=True, title=ft.Text("Saving Chat..."), content=ft.Row([ft.ProgressRing(), ft.Text("Generating title...")]))
-        
+        title = self._fresh_precomputed("title")
+        if title is not None:
+            # Generated while the user was idle and the chat has not changed since
+            self._store_chat(title)
+            return
+
         def do_summarize_and_save_chat():
             try:
                 if self._bot["instance"] is None: 
-                    self._bot["instance"] = ChatBot(system_prompt=self.current_persona.get("prompt", "..."))
+                    self._bot["instance"] = ChatBot(system_prompt=self.current_persona.get("prompt", "..."), session_id=self.page.session_id)
 
                 title = self._bot["instance"].summarize_title(self.current_chat_messages)
-                new_id = self.history_manager.save_chat(self.current_persona['id'], self.current_chat_messages, title)
-                self.current_chat_id = new_id
-                self._show_info_dialog("Success", f"Chat saved with title: '{title}'")
+                self._store_chat(title)
             except Exception as ex:
                 self._show_info_dialog("Error", f"Could not save chat: {ex}")
             finally:
-                loading_dialog.open = False
-                self.page.update()
+                self.dialogs.close(loading_dialog)
 
-        self.page.overlay.append(loading_dialog)
-        loading_dialog.open = True
-        self.page.update()
+        loading_dialog = self.dialogs.loading("Saving Chat...", "Generating title...")
         threading.Thread(target=do_summarize_and_save_chat).start()
 
+    def _store_chat(self, title: str):
+        try:
+            new_id = self.history_manager.save_chat(self.current_persona['id'], self.current_chat_messages, title)
+            self.current_chat_id = new_id
+            self._show_info_dialog("Success", f"Chat saved with title: '{title}'")
+        except Exception as ex:
+            self._show_info_dialog("Error", f"Could not save chat: {ex}")
+
+    @user_action("save_memory")
     def _save_memory_click(self, e):
         if not self.current_chat_messages: 
             return
-        
-        loading_dialog = ft.AlertDialog(
-            modal=True,
-            title=ft.Text("Creating Memory..."),
-            content=ft.Row([ft.ProgressRing(), ft.Text("The AI is summarizing...")], spacing=20),
-        )
 
+        summary = self._fresh_precomputed("summary")
+        if summary is not None:
+            self._store_memory(summary)
+            return
+        
         def do_summarize_and_save():
             """This function will run in a separate thread."""
             try:
                 if self._bot["instance"] is None:
-                    self._bot["instance"] = ChatBot(system_prompt=self.current_persona.get("prompt", "..."))
+                    self._bot["instance"] = ChatBot(system_prompt=self.current_persona.get("prompt", "..."), session_id=self.page.session_id)
                 
                 summary = self._bot["instance"].summarize(self.current_chat_messages)
-                self.history_manager.save_memory(self.current_persona['id'], self.current_chat_id, summary)
-                
-                summary_control = ft.Container(
-                    content=ft.Markdown(f"*{summary}*", selectable=True, extension_set="git-hub-flavored"),
-                )
-                self._show_info_dialog("Memory Saved Successfully", summary_control)
-
+                self._store_memory(summary)
             except Exception as ex:
                 self._show_info_dialog("Error", f"Could not create memory: {ex}")
             finally:
-                loading_dialog.open = False
-                self.page.update()
+                self.dialogs.close(loading_dialog)
+
+        loading_dialog = self.dialogs.loading("Creating Memory...", "The AI is summarizing...")
 
-        self.page.overlay.append(loading_dialog)
-        loading_dialog.open = True
-        self.page.update()
-        
         thread = threading.Thread(target=do_summarize_and_save)
         thread.start()
 
+    def _store_memory(self, summary: str):
+        try:
+            _, merged = self.history_manager.save_memory(self.current_persona['id'], self.current_chat_id, summary)
+
+            summary_control = ft.Container(
+                content=ft.Markdown(f"*{summary}*", selectable=True, extension_set="git-hub-flavored"),
+            )
+            title = "Similar Memory Updated" if merged else "Memory Saved Successfully"
+            self._show_info_dialog(title, summary_control)
+        except Exception as ex:
+            self._show_info_dialog("Error", f"Could not create memory: {ex}")
+
+    @staticmethod
+    def _messages_fingerprint(messages: list) -> int:
+        return hash(tuple((m.get("id"), m.get("content")) for m in messages))
+
+    def _fresh_precomputed(self, kind: str) -> str | None:
+        """The idle-time title/summary, if the conversation has not changed since it was made."""
+        entry = self._precomputed.get(kind)
+        if entry and entry[0] == self._messages_fingerprint(self.current_chat_messages):
+            return entry[1]
+        return None
+
+    def _on_user_activity(self, e=None):
+        """Typing stops any idle precomputation at once and restarts the idle countdown."""
+        self._idle_cancel.set()
+        self._schedule_idle_work()
+
+    def _schedule_idle_work(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        self._idle_timer = threading.Timer(self.IDLE_SECONDS, self._run_idle_work)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _run_idle_work(self):
+        """Runs on the idle timer; uses the model only while it is free, at token granularity."""
+        bot = self._bot["instance"]
+        if bot is None or not self.current_chat_messages or self.active_loading_row is not None:
+            return
+        cancel = threading.Event()
+        self._idle_cancel = cancel
+        messages = list(self.current_chat_messages)
+        fingerprint = self._messages_fingerprint(messages)
+
+        tasks = [("summary", bot.summarize)]
+        if not self.current_chat_id:  # saved chats already have a title
+            tasks.insert(0, ("title", bot.summarize_title))
+        for kind, task in tasks:
+            if cancel.is_set():
+                return
+            if self._precomputed.get(kind, (None,))[0] == fingerprint:
+                continue
+            result = task(messages, cancel=cancel)
+            if result is None:
+                return  # the user typed or the model was busy; retried at the next idle period
+            self._precomputed[kind] = (fingerprint, result)
+
+    @user_action("new_chat")
     def _new_chat_click(self, e):
         print("New Chat clicked")
         self.start_new_chat(self.current_persona)
-        self.page.update()
+        self.updates.mark(self.header_container, self.chat_column)
     
     def start_new_chat(self, persona: dict):
         self.current_persona = persona
         # self._bot["instance"] = None
         self.current_chat_id = None
         self.editing_message_id = None
-        self.persona_avatar.content = ft.Image(src=self.current_persona.get("image_path"), fit=ft.ImageFit.COVER, error_content=ft.Icon(ft.Icons.PERSON))
+        self._idle_cancel.set()
+        self._precomputed.clear()
+        self.persona_avatar.content = ft.Image(src=thumbnail_path(self.current_persona.get("image_path")), fit=ft.ImageFit.COVER, error_content=ft.Icon(ft.Icons.PERSON))
         self.persona_name.value = self.current_persona.get("name", "Unknown")
         self.chat_column.controls.clear()
         self.current_chat_messages.clear()
+        self._rows.clear()
+        self._window_start = 0
+        self._window_end = 0
 
     def load_chat_history(self, chat: dict):
         self.start_new_chat(self.current_persona)
         self.current_chat_id = chat.get('chat_id')
-        messages = chat.get('messages', [])
+        messages = [dict(msg) for msg in chat.get('messages', [])]
         for msg in messages: 
             msg.setdefault('id', str(uuid.uuid4()))
         
@@ -355,46 +469,51 @@ class GGUFChatApp:
 
         if self._bot["instance"] is None:
             prompt = self.current_persona.get("prompt", "You are a helpful assistant.")
-            self._bot["instance"] = ChatBot(system_prompt=prompt)
+            self._bot["instance"] = ChatBot(system_prompt=prompt, session_id=self.page.session_id)
         # self._bot["instance"].load_history(messages)
         
-        for message in self.current_chat_messages:
-            if message.get("role") == "user":
-                self._add_user_bubble(message.get("content"), message_id=message.get("id"), record_message=False)
-            elif message.get("role") == "model":
-                self._add_bot_bubble(message.get("content"), elapsed=0, message_id=message.get("id"), record_message=False)
+        self._show_tail(keep_start=False)
         
         # self._bot["instance"] = None
-        self.page.update()
+        self.updates.mark(self.header_container, self.chat_column)
+        self._schedule_idle_work()
         
     def _on_resize(self, e=None):
-        if not self._root.page:
+        """
+        Bubble widths are relative, so only the transcript height depends on the
+        window size. Resize events are coalesced and applied once the drag settles;
+        a call without an event applies immediately and leaves the update to the caller.
+        """
+        if e is None:
+            self._apply_size()
             return
 
-        page_height = self.page.height
-        page_width = self.page.width
-        
-        self.chat_container.height = page_height - (self.header_container.height + self.input_container.height + 40)
-
-        max_width = page_width * self.BUBBLE_RATIO
-        
-        for row in self.chat_column.controls:
-            if not isinstance(row, ft.Row) or not row.data: 
-                continue
-
-            wrapper = None
-            if isinstance(row, ft.Row) and len(row.controls) > 0:
-                if row.alignment == ft.MainAxisAlignment.START: # Bot message
-                    if len(row.controls) > 1: 
-                        wrapper = row.controls[1]
-                elif row.alignment == ft.MainAxisAlignment.END: # User message
-                    wrapper = row.controls[0]
+        start = perf_counter()
+        with self._resize_lock:
+            if self._resize_timer is not None:
+                self._resize_timer.cancel()
+            self._resize_timer = threading.Timer(self.RESIZE_DEBOUNCE, self._apply_size, kwargs={"update": True})
+            self._resize_timer.daemon = True
+            self._resize_timer.start()
+            self.resize_stats["events"] += 1
+            self.resize_stats["event_ms"] += (perf_counter() - start) * 1000
+
+    def _apply_size(self, update: bool = False):
+        if not self._root.page:
+            return
 
-            if isinstance(wrapper, ft.Container) and wrapper is not self.active_bot_wrapper:
-                wrapper.width = max_width
+        start = perf_counter()
+        self.chat_container.height = self.page.height - (self.header_container.height + self.input_container.height + 40)
+        if update:
+            self.updates.mark(self.chat_container)
 
-        self.page.update()
+        with self._resize_lock:
+            self._resize_timer = None
+            stats = self.resize_stats
+            stats["applies"] += 1
+            stats["apply_ms"] += (perf_counter() - start) * 1000
         
+    @user_action("send_message")
     def _send_message(self, e):
         if self.editing_message_id:
             self._submit_edit()
@@ -410,7 +529,7 @@ class GGUFChatApp:
         self._add_user_bubble(question)
         self.user_input.value = ""
         self.user_input.focus()
-        self.page.update()
+        self.updates.mark(self.chat_column, self.input_container)
 
         self._get_bot_response(question)
 
@@ -432,57 +551,12 @@ class GGUFChatApp:
         self.current_chat_messages[user_msg_index]['content'] = edited_text
         self.current_chat_messages = self.current_chat_messages[:user_msg_index + 1]
 
-        row_to_update = None
-        for control in self.chat_column.controls:
-            if control.data == self.editing_message_id:
-                row_to_update = control
-                break
-        
-        if row_to_update:
-            new_bubble = ft.Container(
-                content=ft.Markdown(
-                    edited_text,
-                    selectable=True,
-                    extension_set="git-hub-flavored",
-                    code_theme="atom-one-dark"
-                ),
-                padding=10,
-                bgcolor=ft.Colors.PRIMARY_CONTAINER,
-                border_radius=10,
-                border=ft.border.all(0.3, ft.Colors.OUTLINE),
-            )
-
-            edit_icon = self._create_edit_icon(self.editing_message_id)
-            delete_icon = self._create_delete_icon(self.editing_message_id)
-
-            new_bubble_with_icon = ft.Stack(
-                [
-                    ft.Container(
-                        content=new_bubble,
-                        margin=ft.margin.only(bottom=27),
-                    ),
-                    ft.Container(
-                        content=ft.Row([edit_icon, delete_icon], spacing=0, alignment=ft.MainAxisAlignment.END),
-                        right=0,
-                        bottom=0,
-                    ),
-                ],
-                clip_behavior=ft.ClipBehavior.NONE,
-            )
-
-            new_wrapper = ft.Container(
-                content=new_bubble_with_icon,
-                width=self.page.width * self.BUBBLE_RATIO,
-                alignment=ft.alignment.center_right,
-                margin=ft.margin.only(right=20),
-            )
-
-            row_to_update.controls[0] = new_wrapper
-            
-            self.chat_column.controls = self.chat_column.controls[:self.chat_column.controls.index(row_to_update) + 1]
+        self._rows.pop(self.editing_message_id, None)
+        self._window_start = min(self._window_start, user_msg_index)
+        self._show_tail()
         
         self._exit_editing_mode()
-        self.page.update()
+        self.updates.mark(self.chat_column)
 
         self._get_bot_response(edited_text)
 
@@ -490,68 +564,46 @@ class GGUFChatApp:
     def _get_bot_response(self, question: str):
         if self._bot["instance"] is None:
             prompt = self.current_persona.get("prompt", "You are a helpful assistant.")
-            self._bot["instance"] = ChatBot(system_prompt=prompt)
+            self._bot["instance"] = ChatBot(system_prompt=prompt, session_id=self.page.session_id)
 
+        requested_at = perf_counter()
         self.user_input.disabled = True
         self.send_btn.disabled = True
         self.cancel_btn.visible = False
         self._add_bot_loading_bubble()
-        self.page.update()
-        self._scroll_to_bottom()
+        self.updates.mark(self.chat_column, self.input_container, then=self._scroll_to_bottom)
 
+        @user_action("bot_reply", watch=False)
         def get_bot_response_thread():
-
-            start_time = time()
             history = self.current_chat_messages[:-1]
-            answer = self._bot["instance"].ask(question, history)
-            elapsed = time() - start_time
+            try:
+                # Sessions take turns on the shared model; this waits for ours
+                with get_scheduler().slot(self.page.session_id, on_wait=self._show_queue_position):
+                    answer, metrics = self._bot["instance"].ask_with_metrics(question, history, requested_at)
+            except SchedulerRejected as ex:
+                self._reject_reply(question, str(ex))
+                return
 
             new_message_id = str(uuid.uuid4())
-            self.current_chat_messages.append({"id": new_message_id, "role": "model", "content": answer})
+            self.current_chat_messages.append(
+                {"id": new_message_id, "role": "model", "content": answer, "metrics": metrics}
+            )
             
-            if self.active_bot_bubble and self.active_bot_wrapper and self.active_loading_row:
-                final_content_md = f"{answer}\n\n*Response time: {elapsed:.2f} s*"
-
-                bubble = ft.Container(
-                    content=ft.Markdown(
-                        final_content_md, selectable=True, extension_set="git-hub-flavored", code_theme="atom-one-dark"
-                    ),
-                    padding=10, 
-                    bgcolor=ft.Colors.with_opacity(0.8, ft.Colors.GREY_200),
-                    border_radius=10, 
-                    border=ft.border.all(0.3, ft.Colors.OUTLINE),
-                )
-                
-                icons_row = ft.Row(
-                    [
-                        self._create_delete_icon(new_message_id),
-
-                    ], 
-                    alignment=ft.MainAxisAlignment.END,
-                    vertical_alignment=ft.CrossAxisAlignment.END,
-                )
-
-                message_stack = ft.Stack(
-                    [bubble, ft.Container(
-                        content=icons_row,
-                        bottom=0,
-                        right=0,
-                    ),], 
-                    clip_behavior=ft.ClipBehavior.NONE,
-                )
-
-                wrapper = ft.Container(
-                    content=message_stack,
-                    width=self.page.width * self.BUBBLE_RATIO,
-                    alignment=ft.alignment.center_left,
-                )
-
-                self.active_loading_row.controls[1] = wrapper
-                self.active_loading_row.data = new_message_id
-                
-                self.active_bot_bubble = None 
-                self.active_bot_wrapper = None
-                self.active_loading_row = None
+            with self.updates.lock:
+                if self.active_bot_bubble and self.active_bot_wrapper and self.active_loading_row:
+                    self.active_loading_row.controls[1] = self._build_bot_wrapper(answer, new_message_id, metrics)
+                    self.active_loading_row.controls.append(ft.Container(expand=self.GUTTER_FLEX))
+                    self.active_loading_row.data = new_message_id
+                    self.active_loading_row.key = new_message_id
+                    self._rows[new_message_id] = self.active_loading_row
+                    self._cache_bubble(self.current_chat_messages[-1], self.active_loading_row)
+                    
+                    self.active_bot_bubble = None 
+                    self.active_bot_wrapper = None
+                    self.active_loading_row = None
+                    self.active_queue_text = None
+
+                self._show_tail(keep_start=self._window_end == len(self.current_chat_messages) - 1)
 
             if self.current_chat_id:
                 try:
@@ -566,27 +618,165 @@ class GGUFChatApp:
             async def set_focus_async():
                 await asyncio.sleep(0.1)
                 self.user_input.focus()
-                self.page.update()
 
             asyncio.run_coroutine_threadsafe(set_focus_async(), self.page.loop)
 
-            self.page.update()
-            self._scroll_to_bottom()
+            self.updates.mark(self.chat_column, self.input_container, then=self._scroll_to_bottom)
+            self._schedule_idle_work()
 
+        self._idle_cancel.set()
         threading.Thread(target=get_bot_response_thread).start()
 
+    def _show_queue_position(self, position: int):
+        """Shows how many replies are ahead of ours in the loading bubble while it waits."""
+        with self.updates.lock:
+            if self.active_bot_wrapper is None:
+                return
+            waiting = position > 0
+            self.active_queue_text.value = f"{position} ahead of you"
+            self.active_queue_text.visible = waiting
+            self.active_bot_wrapper.width = None if waiting else self.LOADING_BUBBLE_WIDTH
+        self.updates.mark(self.active_bot_wrapper)
+        self.updates.schedule()  # the reply's user action is still running; show this now
+
+    def _reject_reply(self, question: str, reason: str):
+        """Takes the unanswered question back into the input, so it can be sent again later."""
+        with self.updates.lock:
+            self.active_bot_bubble = None
+            self.active_bot_wrapper = None
+            self.active_loading_row = None
+            self.active_queue_text = None
+            if self.current_chat_messages and self.current_chat_messages[-1].get("role") == "user":
+                self.current_chat_messages.pop()
+            self._show_tail()
+            self.user_input.value = question
+            self.user_input.disabled = False
+            self.send_btn.disabled = False
+        self.updates.mark(self.chat_column, self.input_container)
+        self.dialogs.info("Model Busy", reason)
+
+    def scroll_to_message(self, message_id: str):
+        """Scrolls the transcript to a message, e.g. when opened from a search result."""
+        index = next((i for i, m in enumerate(self.current_chat_messages) if m.get('id') == message_id), None)
+        if index is None:
+            return
+        if not self._window_start <= index < self._window_end:
+            self._window_start = max(0, index - self.PAGE_SIZE // 2)
+            self._window_end = min(len(self.current_chat_messages), self._window_start + self.INITIAL_WINDOW)
+            self._render_window()
+        self.updates.mark(self.chat_column, then=lambda: self.chat_column.scroll_to(key=message_id, duration=300))
+
     def _scroll_to_bottom(self):
         self.chat_column.scroll_to(offset=-1, duration=300)
 
-    def _add_user_bubble(self, text: str, message_id: str = None, record_message: bool = True):
-        if record_message:
-            message_id = str(uuid.uuid4())
-            self.current_chat_messages.append({"id": message_id, "role": "user", "content": text})
-        elif not message_id:
-            message_id = str(uuid.uuid4())
+    # --- windowed transcript ---
+
+    def _bubble_key(self, message: dict) -> tuple:
+        # Bot rows include the persona avatar, so it is part of their key
+        avatar = self.current_persona.get("image_path") if message.get("role") != "user" else None
+        return message["id"], message.get("role"), hash(message.get("content", "")), avatar
+
+    def _cache_bubble(self, message: dict, row: ft.Row):
+        self._bubble_cache[self._bubble_key(message)] = row
+        self._bubble_cache.move_to_end(self._bubble_key(message))
+        while len(self._bubble_cache) > self.BUBBLE_CACHE_SIZE:
+            self._bubble_cache.popitem(last=False)
+
+    def _row_for(self, message: dict) -> ft.Row:
+        row = self._rows.get(message["id"])
+        if row is None:
+            row = self._bubble_cache.get(self._bubble_key(message))
+            if row is None:
+                self.bubble_cache_stats["misses"] += 1
+                row = self._build_message_row(message)
+            else:
+                self.bubble_cache_stats["hits"] += 1
+            self._cache_bubble(message, row)
+            self._rows[message["id"]] = row
+        return row
+
+    def _message_content(self, text: str) -> ft.Control:
+        """Plain messages skip the Markdown renderer and syntax highlighter."""
+        if has_markdown(text):
+            return ft.Markdown(text, selectable=True, extension_set="git-hub-flavored", code_theme="atom-one-dark")
+        return ft.Text(text, selectable=True)
+
+    def _render_window(self):
+        """Materializes only the messages inside [window_start, window_end)."""
+        messages = self.current_chat_messages[self._window_start:self._window_end]
+        controls = []
+        if self._window_start > 0:
+            controls.append(self._load_older_row)
+        controls.extend(self._row_for(m) for m in messages)
+        if self._window_end < len(self.current_chat_messages):
+            controls.append(self._load_newer_row)
+        if self.active_loading_row is not None:
+            controls.append(self.active_loading_row)
+        self.chat_column.controls = controls
+
+        visible_ids = {m["id"] for m in messages}
+        for message_id in [mid for mid in self._rows if mid not in visible_ids]:
+            del self._rows[message_id]
+
+    def _show_tail(self, keep_start: bool = True):
+        """Moves the window to the newest messages, dropping the oldest beyond MAX_WINDOW."""
+        total = len(self.current_chat_messages)
+        if not keep_start:
+            self._window_start = max(0, total - self.INITIAL_WINDOW)
+        self._window_end = total
+        self._window_start = min(max(self._window_start, total - self.MAX_WINDOW), total)
+        self._render_window()
+
+    @user_action("page_transcript")
+    def _page_in_older(self):
+        if self._window_start == 0 or not self._paging_lock.acquire(blocking=False):
+            return
+        try:
+            anchor_id = self.current_chat_messages[self._window_start]["id"]
+            self._window_start = max(0, self._window_start - self.PAGE_SIZE)
+            self._window_end = min(self._window_end, self._window_start + self.MAX_WINDOW)
+            self._render_window()
+            self.updates.mark(self.chat_column, then=lambda: self.chat_column.scroll_to(key=anchor_id))
+        finally:
+            self._paging_lock.release()
+
+    @user_action("page_transcript")
+    def _page_in_newer(self):
+        total = len(self.current_chat_messages)
+        if self._window_end >= total or not self._paging_lock.acquire(blocking=False):
+            return
+        try:
+            anchor_id = self.current_chat_messages[self._window_end - 1]["id"]
+            self._window_end = min(total, self._window_end + self.PAGE_SIZE)
+            self._window_start = max(self._window_start, self._window_end - self.MAX_WINDOW)
+            self._render_window()
+            self.updates.mark(self.chat_column, then=lambda: self.chat_column.scroll_to(key=anchor_id))
+        finally:
+            self._paging_lock.release()
+
+    def _on_transcript_scroll(self, e: ft.OnScrollEvent):
+        if e.pixels is None or e.event_type not in ("update", "end"):
+            return
+        if e.pixels <= e.min_scroll_extent + self.SCROLL_EDGE_PX:
+            self._page_in_older()
+        elif e.pixels >= e.max_scroll_extent - self.SCROLL_EDGE_PX:
+            self._page_in_newer()
+
+    # --- bubbles ---
+
+    def _add_user_bubble(self, text: str):
+        at_tail = self._window_end == len(self.current_chat_messages)
+        self.current_chat_messages.append({"id": str(uuid.uuid4()), "role": "user", "content": text})
+        self._show_tail(keep_start=at_tail)
 
+    def _build_message_row(self, message: dict) -> ft.Row:
+        if message.get("role") == "user":
+            return self._build_user_row(message.get("content", ""), message["id"])
+        return self._build_bot_row(message.get("content", ""), message["id"], message.get("metrics"))
+
+    def _build_user_row(self, text: str, message_id: str) -> ft.Row:
         bubble = ft.Container(
-            content=ft.Markdown(text, selectable=True, extension_set="git-hub-flavored", code_theme="atom-one-dark"),
+            content=self._message_content(text),
             padding=10,
             bgcolor=ft.Colors.PRIMARY_CONTAINER,
             border_radius=10,
@@ -614,22 +804,96 @@ class GGUFChatApp:
 
         wrapper = ft.Container(
             content=bubble_with_icon,
-            width=self.page.width * self.BUBBLE_RATIO,
+            expand=self.BUBBLE_FLEX,
             alignment=ft.alignment.center_right,
             margin=ft.margin.only(right=20),
         )
 
-        self.chat_column.controls.append(
-            ft.Row(
-                [wrapper], 
-                alignment=ft.MainAxisAlignment.END, 
-                data=message_id
+        return ft.Row(
+            [ft.Container(expand=self.GUTTER_FLEX), wrapper], 
+            alignment=ft.MainAxisAlignment.END, 
+            data=message_id,
+            key=message_id,
+        )
+
+    def _build_avatar(self) -> ft.Container:
+        return ft.Container(
+            content=ft.Image(
+                src=thumbnail_path(self.current_persona.get("image_path")), 
+                fit=ft.ImageFit.COVER, 
+                error_content=ft.Icon(ft.Icons.PERSON)
+            ),
+            width=40, 
+            height=40, 
+            border_radius=20, 
+            clip_behavior=ft.ClipBehavior.ANTI_ALIAS,
+        )
+
+    def _build_bot_wrapper(self, answer: str, message_id: str, metrics: dict | None = None) -> ft.Container:
+        content = self._message_content(answer)
+        if metrics:
+            details = f"Response time: {metrics['total_ms'] / 1000:.2f} s · first token {metrics['ttft_ms'] / 1000:.2f} s"
+            if metrics.get("decode_tps"):
+                details += f" · {metrics['decode_tps']:.1f} tok/s"
+            content = ft.Column(
+                [content, ft.Text(details, italic=True)],
+                spacing=10,
             )
+
+        bubble = ft.Container(
+            content=content,
+            padding=10, 
+            bgcolor=ft.Colors.with_opacity(0.8, ft.Colors.GREY_200),
+            border_radius=10, 
+            border=ft.border.all(0.3, ft.Colors.OUTLINE),
+        )
+        
+        icons_row = ft.Row(
+            [
+                self._create_delete_icon(message_id),
+
+            ], 
+            alignment=ft.MainAxisAlignment.END,
+            vertical_alignment=ft.CrossAxisAlignment.END,
+        )
+
+        message_stack = ft.Stack(
+            [bubble, ft.Container(
+                content=icons_row,
+                bottom=0,
+                right=0,
+            ),], 
+            clip_behavior=ft.ClipBehavior.NONE,
+        )
+
+        return ft.Container(
+            content=message_stack,
+            expand=self.BUBBLE_FLEX,
+            alignment=ft.alignment.center_left,
+        )
+
+    def _build_bot_row(self, answer: str, message_id: str, metrics: dict | None = None) -> ft.Row:
+        return ft.Row(
+            [
+                self._build_avatar(),
+                self._build_bot_wrapper(answer, message_id, metrics),
+                ft.Container(expand=self.GUTTER_FLEX),
+            ], 
+            alignment=ft.MainAxisAlignment.START, 
+            vertical_alignment=ft.CrossAxisAlignment.START, 
+            spacing=10,
+            data=message_id,
+            key=message_id,
         )
 
     def _add_bot_loading_bubble(self):
+        self.active_queue_text = ft.Text(size=12, color=ft.Colors.OUTLINE, visible=False)
         loading_bubble = ft.Container(
-            content=ft.ProgressRing(width=20, height=20, stroke_width=2.5),
+            content=ft.Row(
+                [ft.ProgressRing(width=20, height=20, stroke_width=2.5), self.active_queue_text],
+                tight=True,
+                spacing=8,
+            ),
             padding=12, bgcolor=ft.Colors.with_opacity(0.8, ft.Colors.GREY_200),
             border_radius=10, border=ft.border.all(0.3, ft.Colors.OUTLINE),
         )
@@ -644,15 +908,7 @@ class GGUFChatApp:
 
         row = ft.Row(
             [
-                ft.Container(
-                    content=ft.Image(
-                        src=self.current_persona.get("image_path"), 
-                        fit=ft.ImageFit.COVER, 
-                        error_content=ft.Icon(ft.Icons.PERSON)
-                    ),
-                    width=40, height=40, border_radius=20, 
-                    clip_behavior=ft.ClipBehavior.ANTI_ALIAS,
-                ),
+                self._build_avatar(),
                 self.active_bot_wrapper
             ], 
             alignment=ft.MainAxisAlignment.START, 
@@ -663,57 +919,3 @@ class GGUFChatApp:
 
         self.active_loading_row = row
         self.chat_column.controls.append(self.active_loading_row)
-
-    def _add_bot_bubble(self, answer: str, elapsed: float, message_id: str = None, record_message: bool = True):
-        if record_message:
-            if not message_id:
-                message_id = str(uuid.uuid4())
-            self.current_chat_messages.append({"id": message_id, "role": "model", "content": answer})
-        elif not message_id:
-            message_id = str(uuid.uuid4())
-
-        content = f"{answer}"
-        if elapsed > 0:
-            content = f"{answer}\n\n*Response time: {elapsed:.2f} s*"
-
-        bubble = ft.Container(
-            content=ft.Markdown(
-                content, 
-                selectable=True, 
-                extension_set="git-hub-flavored", 
-                code_theme="atom-one-dark"
-            ),
-            padding=10,
-            bgcolor=ft.Colors.with_opacity(0.8, ft.Colors.GREY_200),
-            border_radius=10,
-            border=ft.border.all(0.3, ft.Colors.OUTLINE),
-        )
-
-        wrapper = ft.Container(
-            content=bubble,
-            width=self.page.width * self.BUBBLE_RATIO,
-            alignment=ft.alignment.center_left,
-        )
-
-        self.chat_column.controls.append(
-            ft.Row(
-                [
-                    ft.Container(
-                        content=ft.Image(
-                            src=self.current_persona.get("image_path"), 
-                            fit=ft.ImageFit.COVER, 
-                            error_content=ft.Icon(ft.Icons.PERSON)
-                        ),
-                        width=40, 
-                        height=40, 
-                        border_radius=20, 
-                        clip_behavior=ft.ClipBehavior.ANTI_ALIAS,
-                    ),
-                    wrapper
-                ], 
-                alignment=ft.MainAxisAlignment.START, 
-                vertical_alignment=ft.CrossAxisAlignment.START, 
-                spacing=10,
-                data=message_id
-            )
-        )
\ No newline at end of file
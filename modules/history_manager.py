@@ -1,56 +1,175 @@
+import hashlib
 import json
 import os
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 import uuid
+from modules.chat_archive import ChatArchive
+from modules.memory_dedup import MinHashIndex
+from modules.repository import file_versions, get_repository, json_default, thaw
+from modules.search_index import get_search_index
 
 class HistoryManager:
     CHATS_FILE = "assets/saved_chats.json"
+    CHATS_INDEX_FILE = "assets/saved_chats_index.json"
     MEMORIES_FILE = "assets/saved_memories.json"
+    MEMORY_SIGNATURES_FILE = "assets/memory_signatures.json"
+    ARCHIVE_AFTER_DAYS = 30
+    MEMORY_DEDUP_THRESHOLD = 0.7
+
+    _migrated_files = set()
+    _lock = threading.RLock()
+    _dedup_state = None  # [memories file version, MinHashIndex]
+    _dedup_lock = threading.Lock()
+    _signatures = None  # summary digest -> MinHash signature, kept across rebuilds and in MEMORY_SIGNATURES_FILE
 
     def __init__(self):
+        self.repository = get_repository()
+
         if not os.path.isfile(self.CHATS_FILE):
             self._write_json(self.CHATS_FILE, [])
 
         if not os.path.isfile(self.MEMORIES_FILE):
             self._write_json(self.MEMORIES_FILE, [])
 
+        if self.CHATS_FILE not in self._migrated_files:
+            self._migrate_bot_roles()
+            self._migrated_files.add(self.CHATS_FILE)
+
+        with self._lock:
+            if not self._chat_index_current():
+                self._rebuild_chat_index()
+
+    @staticmethod
+    def semantic_index():
+        """The embedding index, or None without an embedding model (numpy is only imported with one)."""
+        from modules.chatbot import embedding_model_configured
+        if not embedding_model_configured():
+            return None
+        from modules.semantic_index import get_semantic_index
+        return get_semantic_index()
+
     def _write_json(self, file_path, data):
-        """Helper to write data to a JSON file."""
-        with open(file_path, "w", encoding="utf8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """Helper to write data to a JSON file (through the shared repository cache)."""
+        self.repository.write(file_path, data)
+
+    def _migrate_bot_roles(self):
+        """Old chats stored the 'bot' role; rewrite them once instead of patching on every load."""
+        chats = self.repository.read(self.CHATS_FILE)
+        if not any(msg.get('role') == 'bot' for chat in chats for msg in chat.get('messages', ())):
+            return
+        self._write_json(self.CHATS_FILE, [
+            {**chat, "messages": [
+                {**msg, "role": "model" if msg["role"] == "bot" else msg["role"]}
+                for msg in chat.get('messages', ())
+            ]}
+            for chat in chats
+        ])
+
+    @staticmethod
+    def _stored_message(msg: dict) -> dict:
+        stored = {"id": msg["id"], "role": "model" if msg["role"] == "bot" else msg["role"], "content": msg["content"]}
+        if msg.get("metrics"):
+            stored["metrics"] = msg["metrics"]  # inference timings of a model reply
+        return stored
+
+    def _chat_index_entry(self, chat: dict) -> dict:
+        """Builds the metadata entry used by list views instead of the full chat."""
+        return {
+            "chat_id": chat.get("chat_id"),
+            "persona_id": chat.get("persona_id"),
+            "timestamp": chat.get("timestamp"),
+            "updated_at": chat.get("updated_at", chat.get("timestamp")),
+            "title": chat.get("title", "Untitled Chat"),
+            "message_count": len(chat.get("messages", [])),
+            "size": len(json.dumps(chat, ensure_ascii=False, default=json_default).encode("utf8")),
+        }
+
+    def _chat_index_sources(self) -> dict:
+        return file_versions([self.CHATS_FILE, *ChatArchive().manifest_paths()])
+
+    def _chat_index_current(self) -> bool:
+        """
+        The index is trusted only while the chat store and archive manifests are the
+        ones it was written after; a crash between the writes or a copied store rebuilds it.
+        """
+        if not os.path.isfile(self.CHATS_INDEX_FILE):
+            return False
+        data = self.repository.read(self.CHATS_INDEX_FILE)
+        return not isinstance(data, tuple) and thaw(data.get("sources")) == self._chat_index_sources()
+
+    def _write_chat_index(self, entries):
+        self._write_json(self.CHATS_INDEX_FILE, {"sources": self._chat_index_sources(), "chats": list(entries)})
+
+    def _rebuild_chat_index(self):
+        chats = self.repository.read(self.CHATS_FILE)
+        entries = [self._chat_index_entry(c) for c in chats]
+        entries.extend(ChatArchive().iter_entries())
+        self._write_chat_index(entries)
+
+    def load_chat_index(self) -> list:
+        """Loads the compact metadata of all saved chats (no message bodies). Read-only."""
+        return self.repository.read(self.CHATS_INDEX_FILE)["chats"]
+
+    def chat_index_version(self) -> int:
+        return self.repository.version(self.CHATS_INDEX_FILE)
+
+    def memories_version(self) -> int:
+        return self.repository.version(self.MEMORIES_FILE)
+
+    def get_chat_meta(self, chat_id: str) -> dict | None:
+        return next((c for c in self.load_chat_index() if c.get('chat_id') == chat_id), None)
 
     def load_chats(self) -> list:
-        """Loads all saved chat sessions."""
-        with open(self.CHATS_FILE, "r", encoding="utf8") as f:
-            chats = json.load(f)
+        """Loads the chat sessions in the hot store (archived chats are not included). Read-only."""
+        return self.repository.read(self.CHATS_FILE)
 
-        for chat in chats:
-            for msg in chat.get('messages', []):
-                if msg['role'] == 'bot':
-                    msg['role'] = 'model'
-        return chats
+    def iter_all_chats(self):
+        """Yields every chat, decompressing archived ones one at a time."""
+        yield from self.load_chats()
+        archive = None
+        for entry in self.load_chat_index():
+            if entry.get("archive"):
+                archive = archive or ChatArchive()
+                yield archive.read(entry["archive"])
+
+    def load_chat(self, chat_id: str) -> dict | None:
+        """Loads a single chat including its messages, from the hot store or its archive segment."""
+        meta = self.get_chat_meta(chat_id)
+        if meta and meta.get("archive"):
+            return ChatArchive().read(meta["archive"])
+        return next((c for c in self.load_chats() if c.get('chat_id') == chat_id), None)
 
     def save_chat(self, persona_id: str, messages: list, title: str) -> str:
         if not messages:
             return # Don't save empty chats
         
-        messages = [
-            {"id": msg["id"], "role": "model" if msg["role"] == "bot" else msg["role"], "content": msg["content"]}
-            for msg in messages
-        ]
+        messages = [self._stored_message(msg) for msg in messages]
+        search_index = get_search_index()
 
-        chats = self.load_chats()
-        
-        new_chat = {
-            "chat_id": uuid.uuid4().hex,
-            "persona_id": persona_id,
-            "timestamp": datetime.now().isoformat(),
-            "messages": messages,
-            "title": title
-        }
-        
-        chats.append(new_chat)
-        self._write_json(self.CHATS_FILE, chats)
+        with self._lock:
+            chats = list(self.load_chats())
+
+            now = datetime.now().isoformat()
+            new_chat = {
+                "chat_id": uuid.uuid4().hex,
+                "persona_id": persona_id,
+                "timestamp": now,
+                "updated_at": now,
+                "messages": messages,
+                "title": title
+            }
+
+            chats.append(new_chat)
+            self._write_json(self.CHATS_FILE, chats)
+
+            index = list(self.load_chat_index())
+            index.append(self._chat_index_entry(new_chat))
+            self._write_chat_index(index)
+        search_index.index_chat(new_chat)
+        semantic_index = self.semantic_index()
+        if semantic_index:
+            semantic_index.index_chat(new_chat)
         print(f"Chat {new_chat['chat_id']} saved.")
         return new_chat['chat_id']
     
@@ -58,49 +177,391 @@ class HistoryManager:
         if not chat_id: 
             return
         
-        messages = [
-            {"id": msg["id"], "role": "model" if msg["role"] == "bot" else msg["role"], "content": msg["content"]}
-            for msg in messages
-        ]
+        messages = [self._stored_message(msg) for msg in messages]
+        search_index = get_search_index()
         
-        chats = self.load_chats()
-        chat_found = False
-        for i, chat in enumerate(chats):
-            if chat.get('chat_id') == chat_id:
-                chats[i]['messages'] = messages
-                chat_found = True
-                break
-            
-        if chat_found:
+        with self._lock:
+            chats = list(self.load_chats())
+            updated_chat = None
+            for i, chat in enumerate(chats):
+                if chat.get('chat_id') == chat_id:
+                    updated_chat = {**chat, 'messages': messages, 'updated_at': datetime.now().isoformat()}
+                    chats[i] = updated_chat
+                    break
+
+            if updated_chat is None:
+                # Writing to an archived chat moves it back into the hot store
+                meta = self.get_chat_meta(chat_id)
+                if not meta or not meta.get("archive"):
+                    return
+                archive = ChatArchive()
+                updated_chat = {**archive.read(meta["archive"]), 'messages': messages, 'updated_at': datetime.now().isoformat()}
+                chats.append(updated_chat)
+                archive.remove(meta["archive"]["month"], chat_id)
+
             self._write_json(self.CHATS_FILE, chats)
+
+            index = list(self.load_chat_index())
+            for i, entry in enumerate(index):
+                if entry.get('chat_id') == chat_id:
+                    index[i] = self._chat_index_entry(updated_chat)
+                    break
+            self._write_chat_index(index)
+        search_index.index_chat(updated_chat)
+        semantic_index = self.semantic_index()
+        if semantic_index:
+            semantic_index.index_chat(updated_chat)
     
     def delete_chat(self, chat_id: str):
-        chats = self.load_chats()
-        updated_chats = [chat for chat in chats if chat.get('chat_id') != chat_id]
-        self._write_json(self.CHATS_FILE, updated_chats)
+        search_index = get_search_index()
+        with self._lock:
+            meta = self.get_chat_meta(chat_id)
+            if meta and meta.get("archive"):
+                ChatArchive().remove(meta["archive"]["month"], chat_id)
+            else:
+                chats = self.load_chats()
+                updated_chats = [chat for chat in chats if chat.get('chat_id') != chat_id]
+                self._write_json(self.CHATS_FILE, updated_chats)
+
+            index = self.load_chat_index()
+            self._write_chat_index([c for c in index if c.get('chat_id') != chat_id])
+        search_index.remove_chat(chat_id)
+        semantic_index = self.semantic_index()
+        if semantic_index:
+            semantic_index.remove_chat(chat_id)
         print(f"Chat {chat_id} deleted.")
 
-    def save_memory(self, persona_id: str, chat_id: str | None, summary: str):
-        memories = self.load_memories()
-        
-        new_memory = {
-            "memory_id": uuid.uuid4().hex,
-            "persona_id": persona_id,
-            "chat_id": chat_id,
-            "summary": summary,
-            "timestamp": datetime.now().isoformat()
+    def known_chat_ids(self) -> set:
+        """IDs in the chat index and in the archive manifests (which an interrupted import may have written)."""
+        known_ids = {e.get("chat_id") for e in self.load_chat_index()}
+        known_ids.update(e.get("chat_id") for e in ChatArchive().iter_entries())
+        return known_ids
+
+    @staticmethod
+    def _imported_chat(chat: dict) -> dict:
+        return {
+            **chat,
+            "messages": [
+                {**msg, "role": "model" if msg["role"] == "bot" else msg["role"]}
+                for msg in chat.get("messages", [])
+            ],
         }
-        
-        memories.append(new_memory)
-        self._write_json(self.MEMORIES_FILE, memories)
-        print(f"Memory {new_memory['memory_id']} saved.")
+
+    def archive_cutoff(self, max_age_days: int | None = None) -> str:
+        max_age_days = self.ARCHIVE_AFTER_DAYS if max_age_days is None else max_age_days
+        return (datetime.now() - timedelta(days=max_age_days)).isoformat()
+
+    def is_archivable(self, chat: dict, cutoff: str | None = None) -> bool:
+        return chat.get("updated_at", chat.get("timestamp", "")) < (cutoff or self.archive_cutoff())
+
+    def archive_imported_chats(self, chats: list) -> list:
+        """
+        Writes imported chats straight into their monthly archive segments and
+        returns their index entries. The chat index is not updated; callers
+        write it themselves or rebuild it once they are done.
+        """
+        chats = [self._imported_chat(c) for c in chats]
+        by_month = {}
+        for chat in chats:
+            by_month.setdefault(chat.get("timestamp", "")[:7] or "unknown", []).append(chat)
+        archive = ChatArchive()
+        entries = []
+        with self._lock:
+            for month, month_chats in by_month.items():
+                index_entries = {c["chat_id"]: self._chat_index_entry(c) for c in month_chats}
+                entries.extend(archive.append(month, month_chats, index_entries))
+        self._index_new_chats(chats)
+        return entries
+
+    def _index_new_chats(self, chats):
+        search_index = get_search_index()
+        semantic_index = self.semantic_index()
+        for chat in chats:
+            search_index.index_chat(chat)
+            if semantic_index:
+                semantic_index.index_chat(chat)
+
+    def import_chats(self, chats: list) -> int:
+        """
+        Bulk-inserts chats (e.g. from an export), skipping IDs that already exist.
+        Chats old enough to be archived go straight into the archive segments,
+        so only recent ones are merged into the hot store.
+        """
+        get_search_index()  # checked against the data files before the import rewrites them
+        with self._lock:
+            known_ids = self.known_chat_ids()
+            new_chats = []
+            for chat in chats:
+                if not chat.get("chat_id") or chat["chat_id"] in known_ids:
+                    continue
+                known_ids.add(chat["chat_id"])
+                new_chats.append(chat)
+            if not new_chats:
+                return 0
+
+            cutoff = self.archive_cutoff()
+            recent_chats = [self._imported_chat(c) for c in new_chats if not self.is_archivable(c, cutoff)]
+            index = list(self.load_chat_index())
+            index.extend(self.archive_imported_chats([c for c in new_chats if self.is_archivable(c, cutoff)]))
+            if recent_chats:
+                self._write_json(self.CHATS_FILE, list(self.load_chats()) + recent_chats)
+                index.extend(self._chat_index_entry(c) for c in recent_chats)
+            self._write_chat_index(index)
+
+        self._index_new_chats(recent_chats)
+        return len(new_chats)
+
+    def merge_imported_chats(self, chats) -> int:
+        """
+        Appends chats to the hot store with a single write and rebuilds the chat
+        index, which also picks up the chats archive_imported_chats() wrote.
+        """
+        with self._lock:
+            hot_chats = list(self.load_chats())
+            hot_ids = {c.get("chat_id") for c in hot_chats}
+            recent_chats = [self._imported_chat(c) for c in chats if c.get("chat_id") not in hot_ids]
+            if recent_chats:
+                self._write_json(self.CHATS_FILE, hot_chats + recent_chats)
+            self._rebuild_chat_index()
+        self._index_new_chats(recent_chats)
+        return len(recent_chats)
+
+    def archive_old_chats(self, max_age_days: int | None = None) -> dict:
+        """
+        Moves chats untouched for `max_age_days` into compressed per-month
+        archive segments, keeping only their metadata in the hot index. Segments
+        left mostly dead by chats moved back to the hot store are compacted.
+        """
+        cutoff = self.archive_cutoff(max_age_days)
+
+        with self._lock:
+            hot_bytes_before = os.path.getsize(self.CHATS_FILE)
+            chats = self.load_chats()
+            old_chats = [c for c in chats if self.is_archivable(c, cutoff)]
+            archive = ChatArchive()
+            sparse_months = archive.sparse_months()
+            if not old_chats and not sparse_months:
+                return {"archived": 0, "hot_bytes_before": hot_bytes_before, "hot_bytes_after": hot_bytes_before}
+
+            search_index = get_search_index()
+            archive_bytes_before = archive.size_on_disk()
+            index_entries = {e["chat_id"]: e for e in self.load_chat_index()}
+            for month in sparse_months:
+                for entry in archive.compact(month):
+                    index_entries[entry["chat_id"]] = entry
+            archive_bytes_compacted = archive.size_on_disk()
+
+            for chat in old_chats:
+                index_entries.setdefault(chat["chat_id"], self._chat_index_entry(chat))
+
+            by_month = {}
+            for chat in old_chats:
+                by_month.setdefault(chat.get("timestamp", "")[:7] or "unknown", []).append(chat)
+            for month, month_chats in by_month.items():
+                for entry in archive.append(month, month_chats, index_entries):
+                    index_entries[entry["chat_id"]] = entry
+
+            if old_chats:
+                archived_ids = {c["chat_id"] for c in old_chats}
+                self._write_json(self.CHATS_FILE, [c for c in chats if c.get("chat_id") not in archived_ids])
+            self._write_chat_index(index_entries.values())
+            search_index.sources_changed()
+
+            report = {
+                "archived": len(old_chats),
+                "hot_bytes_before": hot_bytes_before,
+                "hot_bytes_after": os.path.getsize(self.CHATS_FILE),
+                "archive_bytes_added": archive.size_on_disk() - archive_bytes_compacted,
+                "archive_bytes_reclaimed": archive_bytes_before - archive_bytes_compacted,
+                "compacted_segments": len(sparse_months),
+            }
+        print(
+            f"Archived {report['archived']} chats: hot store {report['hot_bytes_before']} -> "
+            f"{report['hot_bytes_after']} bytes, archive +{report['archive_bytes_added']} bytes"
+            f" ({report['compacted_segments']} segments compacted, -{report['archive_bytes_reclaimed']} bytes)."
+        )
+        return report
+
+    def _load_signatures(self):
+        if HistoryManager._signatures is not None:
+            return
+        signatures = {}
+        if os.path.isfile(self.MEMORY_SIGNATURES_FILE):
+            try:
+                with open(self.MEMORY_SIGNATURES_FILE, "r", encoding="utf8") as f:
+                    signatures = {digest: tuple(sig) for digest, sig in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                print(f"Memory signatures unreadable, recomputing: {e}")
+        HistoryManager._signatures = signatures
+
+    def _save_signatures(self):
+        tmp_path = self.MEMORY_SIGNATURES_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(HistoryManager._signatures, f)
+        os.replace(tmp_path, self.MEMORY_SIGNATURES_FILE)
+
+    def _summary_signature(self, index: MinHashIndex, summary: str) -> tuple:
+        """MinHash signature of a summary, computed only once per distinct text."""
+        self._load_signatures()
+        digest = hashlib.sha1(summary.encode("utf8")).hexdigest()
+        signature = HistoryManager._signatures.get(digest)
+        if signature is None:
+            signature = HistoryManager._signatures[digest] = index.signature(summary)
+        return signature
+
+    def _memory_dedup_index(self) -> MinHashIndex:
+        """
+        Process-wide MinHash index over saved memories, rebuilt only when the file changed
+        under us. Rebuilds reuse the stored signatures, so only new summaries are hashed.
+        """
+        with HistoryManager._dedup_lock:
+            version = self.repository.version(self.MEMORIES_FILE)
+            index_state = HistoryManager._dedup_state
+            if index_state is None or index_state[0] != version:
+                self._load_signatures()
+                known = len(HistoryManager._signatures)
+                index = MinHashIndex()
+                used = {}
+                for memory in self.load_memories():
+                    summary = memory.get("summary", "")
+                    signature = self._summary_signature(index, summary)
+                    used[hashlib.sha1(summary.encode("utf8")).hexdigest()] = signature
+                    index.add(memory["memory_id"], memory.get("persona_id"), signature)
+                changed = len(HistoryManager._signatures) != known or len(used) != known
+                HistoryManager._signatures = used  # drops signatures of deleted or edited memories
+                if changed:
+                    self._save_signatures()
+                HistoryManager._dedup_state = index_state = [version, index]
+            return index_state[1]
+
+    def warm_memory_dedup_index(self):
+        """Builds the dedup index ahead of the first save_memory (called from background maintenance)."""
+        self._memory_dedup_index()
+
+    def _mark_dedup_index_current(self):
+        if HistoryManager._dedup_state is not None:
+            HistoryManager._dedup_state[0] = self.repository.version(self.MEMORIES_FILE)
+
+    def save_memory(self, persona_id: str, chat_id: str | None, summary: str) -> tuple:
+        """
+        Saves a memory, or merges it into an existing near-duplicate of the same
+        persona. Returns (memory_id, merged).
+        """
+        search_index = get_search_index()
+        with self._lock:
+            dedup_index = self._memory_dedup_index()
+            signature = self._summary_signature(dedup_index, summary)
+            memories = list(self.load_memories())
+            duplicates = dedup_index.query(persona_id, signature, self.MEMORY_DEDUP_THRESHOLD)
+
+            saved_memory = None
+            if duplicates:
+                duplicate_id = duplicates[0][0]
+                for i, memory in enumerate(memories):
+                    if memory.get("memory_id") == duplicate_id:
+                        saved_memory = {
+                            **memory,
+                            "chat_id": chat_id or memory.get("chat_id"),
+                            "summary": summary,
+                            "timestamp": datetime.now().isoformat(),
+                        }
+                        memories[i] = saved_memory
+                        break
+                else:
+                    # The index outlived its memory; save as new instead
+                    dedup_index.remove(duplicate_id)
+                    duplicates = []
+            if saved_memory is None:
+                saved_memory = {
+                    "memory_id": uuid.uuid4().hex,
+                    "persona_id": persona_id,
+                    "chat_id": chat_id,
+                    "summary": summary,
+                    "timestamp": datetime.now().isoformat()
+                }
+                memories.append(saved_memory)
+
+            self._write_json(self.MEMORIES_FILE, memories)
+            dedup_index.add(saved_memory["memory_id"], persona_id, signature)
+            self._mark_dedup_index_current()
+
+        search_index.index_memory(saved_memory)
+        if duplicates:
+            print(f"Memory {saved_memory['memory_id']} merged with a near-duplicate ({duplicates[0][1]:.0%} similar).")
+        else:
+            print(f"Memory {saved_memory['memory_id']} saved.")
+        return saved_memory["memory_id"], bool(duplicates)
+
+    def deduplicate_memories(self, threshold: float | None = None) -> dict:
+        """
+        Batch pass over existing memories: near-duplicates of the same persona are
+        merged into one entry that keeps the newest summary.
+        """
+        threshold = self.MEMORY_DEDUP_THRESHOLD if threshold is None else threshold
+        search_index = get_search_index()
+        with self._lock:
+            index = MinHashIndex()
+            kept = {}
+            removed_ids = []
+            for memory in sorted(self.load_memories(), key=lambda m: m.get("timestamp", "")):
+                signature = self._summary_signature(index, memory.get("summary", ""))
+                duplicates = index.query(memory.get("persona_id"), signature, threshold)
+                if duplicates:
+                    target_id = duplicates[0][0]
+                    kept[target_id] = {
+                        **kept[target_id],
+                        "summary": memory.get("summary", ""),
+                        "chat_id": memory.get("chat_id") or kept[target_id].get("chat_id"),
+                        "timestamp": memory.get("timestamp"),
+                    }
+                    index.add(target_id, memory.get("persona_id"), signature)
+                    removed_ids.append(memory["memory_id"])
+                else:
+                    kept[memory["memory_id"]] = memory
+                    index.add(memory["memory_id"], memory.get("persona_id"), signature)
+
+            if removed_ids:
+                self._write_json(self.MEMORIES_FILE, list(kept.values()))
+                HistoryManager._dedup_state = [self.repository.version(self.MEMORIES_FILE), index]
+
+        for memory_id in removed_ids:
+            search_index.remove_memory(memory_id)
+        for memory in kept.values():
+            search_index.index_memory(memory)
+        print(f"Memory deduplication removed {len(removed_ids)} of {len(kept) + len(removed_ids)} memories.")
+        return {"removed": len(removed_ids), "remaining": len(kept)}
+
+    def import_memories(self, memories: list) -> int:
+        """Bulk-inserts memories, skipping IDs that already exist."""
+        search_index = get_search_index()
+        with self._lock:
+            existing = list(self.load_memories())
+            known_ids = {m.get("memory_id") for m in existing}
+            new_memories = []
+            for memory in memories:
+                if not memory.get("memory_id") or memory["memory_id"] in known_ids:
+                    continue
+                known_ids.add(memory["memory_id"])
+                new_memories.append(memory)
+            if not new_memories:
+                return 0
+            self._write_json(self.MEMORIES_FILE, existing + new_memories)
+
+        for memory in new_memories:
+            search_index.index_memory(memory)
+        return len(new_memories)
 
     def load_memories(self) -> list:
-        with open(self.MEMORIES_FILE, "r", encoding="utf8") as f:
-            return json.load(f)
+        return self.repository.read(self.MEMORIES_FILE)
         
     def delete_memory(self, memory_id: str):
-        memories = self.load_memories()
-        updated_memories = [m for m in memories if m.get('memory_id') != memory_id]
-        self._write_json(self.MEMORIES_FILE, updated_memories)
-        print(f"Memory {memory_id} deleted.")
\ No newline at end of file
+        search_index = get_search_index()
+        with self._lock:
+            memories = self.load_memories()
+            updated_memories = [m for m in memories if m.get('memory_id') != memory_id]
+            self._write_json(self.MEMORIES_FILE, updated_memories)
+            if HistoryManager._dedup_state is not None:
+                HistoryManager._dedup_state[1].remove(memory_id)
+                self._mark_dedup_index_current()
+        search_index.remove_memory(memory_id)
+        print(f"Memory {memory_id} deleted.")
@@ -0,0 +1,50 @@
+import math
+from modules.history_manager import HistoryManager
+
+# (key in a reply's "metrics", label, unit)
+METRICS = [
+    ("queue_ms", "Queue wait", "ms"),
+    ("ttft_ms", "Time to first token", "ms"),
+    ("prefill_ms", "Prefill", "ms"),
+    ("decode_tps", "Decode speed", "tok/s"),
+    ("prompt_tokens", "Prompt tokens", "tok"),
+    ("cached_tokens", "Cached prompt tokens", "tok"),
+    ("total_tokens", "Total tokens", "tok"),
+    ("total_ms", "Total time", "ms"),
+]
+
+
+def percentile(values: list, pct: float) -> float | None:
+    """Nearest-rank percentile of already sorted values."""
+    if not values:
+        return None
+    rank = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(samples: list) -> dict:
+    """{metric key: {"p50", "p95", "n"}} over a list of metrics dicts."""
+    summary = {}
+    for key, _, _ in METRICS:
+        values = sorted(s[key] for s in samples if s.get(key) is not None)
+        summary[key] = {"p50": percentile(values, 50), "p95": percentile(values, 95), "n": len(values)}
+    return summary
+
+
+def aggregate_reply_metrics(history_manager: HistoryManager) -> dict:
+    """Aggregates the metrics stored with model replies, overall, per persona and per model."""
+    overall, by_persona, by_model = [], {}, {}
+    for chat in history_manager.iter_all_chats():
+        for msg in chat.get("messages", ()):
+            metrics = msg.get("metrics")
+            if not metrics:
+                continue
+            overall.append(metrics)
+            by_persona.setdefault(chat.get("persona_id"), []).append(metrics)
+            by_model.setdefault(metrics.get("model", "unknown"), []).append(metrics)
+    return {
+        "replies": len(overall),
+        "overall": summarize(overall),
+        "personas": {key: (len(samples), summarize(samples)) for key, samples in by_persona.items()},
+        "models": {key: (len(samples), summarize(samples)) for key, samples in by_model.items()},
+    }
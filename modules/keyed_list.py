@@ -0,0 +1,69 @@
+class KeyedList:
+    """
+    Keeps a container's controls in step with a list of records, matched by ID.
+    Unchanged records keep their existing control, so Flet's diff only sends the
+    inserts, updates and removals; when the data version is unchanged the whole
+    pass is skipped.
+    """
+
+    def __init__(self, owner, key, build: callable, update: callable = None, fingerprint: callable = repr):
+        """
+        owner: control with a `controls` list (Column, ListView, GridView, ...)
+        key: record field holding the ID, or a callable returning it
+        build(record) -> control; update(control, record) changes a control in place
+        fingerprint(record) -> value that changes whenever the control must change
+        """
+        self.owner = owner
+        self._key = (lambda record: record[key]) if isinstance(key, str) else key
+        self.build = build
+        self.update = update
+        self.fingerprint = fingerprint
+        self._entries = {}  # key -> (fingerprint, control)
+        self._version = None
+        self.stats = {"skipped": 0, "reused": 0, "updated": 0, "built": 0, "removed": 0}
+
+    def sync(self, records, version=None, leading=(), trailing=()) -> bool:
+        """Reconciles the controls with `records`; returns False if nothing had to be done."""
+        if self.is_current(version):
+            self.stats["skipped"] += 1
+            return False
+
+        entries = {}
+        controls = list(leading)
+        for record in records:
+            key = self._key(record)
+            fingerprint = self.fingerprint(record)
+            previous = self._entries.get(key)
+            if previous is None:
+                control = self.build(record)
+                self.stats["built"] += 1
+            elif previous[0] == fingerprint:
+                control = previous[1]
+                self.stats["reused"] += 1
+            elif self.update is not None:
+                control = self.update(previous[1], record) or previous[1]
+                self.stats["updated"] += 1
+            else:
+                control = self.build(record)
+                self.stats["built"] += 1
+            entries[key] = (fingerprint, control)
+            controls.append(control)
+        controls.extend(trailing)
+
+        self.stats["removed"] += sum(1 for key in self._entries if key not in entries)
+        self._entries = entries
+        self._version = version
+        self.owner.controls = controls
+        return True
+
+    def is_current(self, version) -> bool:
+        """True if the controls were last synced from this data version; lets callers skip loading."""
+        return version is not None and version == self._version
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def invalidate(self):
+        """Forces the next sync to run even if the version is unchanged."""
+        self._version = None
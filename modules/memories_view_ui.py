@@ -1,12 +1,18 @@
 import flet as ft
+from modules.dialogs import get_dialogs
 from modules.history_manager import HistoryManager
+from modules.keyed_list import KeyedList
 from modules.persona_selector_ui import PersonaManager
+from modules.thumbnails import thumbnail_path
+from modules.ui_updates import get_updater, user_action
 from datetime import datetime
 
 
 class MemoriesViewComponent:
     def __init__(self, page: ft.Page, on_go_to_chat: callable):
         self.page = page
+        self.updates = get_updater(page)
+        self.dialogs = get_dialogs(page)
         self.on_go_to_chat = on_go_to_chat
         self.history_manager = HistoryManager()
         self.persona_manager = PersonaManager()
@@ -16,16 +22,38 @@ class MemoriesViewComponent:
             spacing=15, 
             padding=0,
         )
+        self._personas = {}
+        self._saved_chat_ids = set()
+        self._empty_placeholder = ft.Text(
+            "No memories saved yet.",
+            text_align=ft.TextAlign.CENTER,
+            size=16,
+            color=ft.Colors.OUTLINE,
+        )
+        self._cards = KeyedList(
+            self.memories_list, "memory_id", self._build_memory_card, fingerprint=self._memory_fingerprint
+        )
 
         self._root = ft.Column(
             [
                 ft.Container(
                     content=ft.Row(
                         [
-                            ft.Icon(ft.Icons.FOLDER_SPECIAL, size=28),
-                            ft.Text("Memories", theme_style=ft.TextThemeStyle.HEADLINE_SMALL),
+                            ft.Row(
+                                [
+                                    ft.Icon(ft.Icons.FOLDER_SPECIAL, size=28),
+                                    ft.Text("Memories", theme_style=ft.TextThemeStyle.HEADLINE_SMALL),
+                                ],
+                                spacing=10,
+                                vertical_alignment=ft.CrossAxisAlignment.CENTER,
+                            ),
+                            ft.IconButton(
+                                ft.Icons.CLEANING_SERVICES_OUTLINED,
+                                tooltip="Merge duplicate memories",
+                                on_click=self._merge_duplicates_click,
+                            ),
                         ],
-                        alignment=ft.MainAxisAlignment.START,
+                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
                         vertical_alignment=ft.CrossAxisAlignment.CENTER,
                         spacing=10,
                     ),
@@ -54,109 +82,101 @@ class MemoriesViewComponent:
     def view(self) -> ft.Control:
         return self._root
 
+    @user_action("delete_memory")
     def _show_delete_confirmation(self, memory_id: str):
+        @user_action("delete_memory")
         def confirm_delete(e):
             self.history_manager.delete_memory(memory_id)
             self.update_view()
-            dlg.open = False
-            self.page.update()
-
-        dlg = ft.AlertDialog(
-            modal=True,
-            title=ft.Text("Confirm Deletion"),
-            content=ft.Text("Delete this memory?"),
-            actions=[
-                ft.TextButton(
-                    "Delete",
-                    on_click=confirm_delete,
-                    style=ft.ButtonStyle(color=ft.Colors.RED),
-                ),
-                ft.TextButton(
-                    "Cancel",
-                    on_click=lambda e: setattr(dlg, "open", False)
-                    or self.page.update(),
-                ),
-            ],
+
+        self.dialogs.confirm("Confirm Deletion", "Delete this memory?", confirm_delete)
+
+    @user_action("merge_memories")
+    def _merge_duplicates_click(self, e):
+        result = self.history_manager.deduplicate_memories()
+        self.update_view()
+
+        self.dialogs.info(
+            "Duplicates Merged",
+            f"Merged {result['removed']} near-duplicate memories. {result['remaining']} memories remain.",
         )
-        self.page.overlay.append(dlg)
-        dlg.open = True
-        self.page.update()
 
     def update_view(self):
-        self.memories_list.controls.clear()
+        version = (
+            self.history_manager.memories_version(),
+            self.history_manager.chat_index_version(),
+            self.persona_manager.data_version(),
+        )
+        if self._cards.is_current(version):
+            return
+
         all_memories = self.history_manager.load_memories()
-        all_personas = {p["id"]: p for p in self.persona_manager.load_personas()}
-
-        all_chats = self.history_manager.load_chats()
-        saved_chat_ids = {c.get("chat_id") for c in all_chats}
-
-        if not all_memories:
-            self.memories_list.controls.append(
-                ft.Text(
-                    "No memories saved yet.",
-                    text_align=ft.TextAlign.CENTER,
-                    size=16,
-                    color=ft.Colors.OUTLINE,
+        self._personas = {p["id"]: p for p in self.persona_manager.load_personas()}
+        self._saved_chat_ids = {c.get("chat_id") for c in self.history_manager.load_chat_index()}
+
+        leading = [self._empty_placeholder] if not all_memories else []
+        memories = sorted(all_memories, key=lambda x: x["timestamp"], reverse=True)
+        self._cards.sync(memories, version=version, leading=leading)
+        self.updates.mark(self.memories_list)
+
+    def _memory_fingerprint(self, memory: dict) -> tuple:
+        # A card also shows its persona and whether the source chat still exists
+        persona = self._personas.get(memory["persona_id"])
+        return repr(memory), repr(persona), memory.get("chat_id") in self._saved_chat_ids
+
+    def _build_memory_card(self, memory: dict) -> ft.Card:
+        persona_info = self._personas.get(memory["persona_id"], {})
+
+        actions_row = ft.Row(alignment=ft.MainAxisAlignment.END)
+
+        chat_id_from_memory = memory.get("chat_id")
+        if chat_id_from_memory and chat_id_from_memory in self._saved_chat_ids:
+            actions_row.controls.append(
+                ft.TextButton(
+                    "Go to Chat",
+                    icon=ft.Icons.ARROW_FORWARD,
+                    on_click=lambda _,
+                    cid=chat_id_from_memory: self.on_go_to_chat(cid),
                 )
             )
-        else:
-            for memory in sorted(all_memories, key=lambda x: x["timestamp"], reverse=True):
-                persona_info = all_personas.get(memory["persona_id"], {})
-
-                actions_row = ft.Row(alignment=ft.MainAxisAlignment.END)
-
-                chat_id_from_memory = memory.get("chat_id")
-                if chat_id_from_memory and chat_id_from_memory in saved_chat_ids:
-                    actions_row.controls.append(
-                        ft.TextButton(
-                            "Go to Chat",
-                            icon=ft.Icons.ARROW_FORWARD,
-                            on_click=lambda _,
-                            cid=chat_id_from_memory: self.on_go_to_chat(cid),
-                        )
-                    )
-
-                actions_row.controls.append(
-                    ft.IconButton(
-                        ft.Icons.DELETE_OUTLINE,
-                        icon_color=ft.Colors.RED_ACCENT,
-                        on_click=lambda _, m=memory: self._show_delete_confirmation(m["memory_id"]),
-                    )
-                )
 
-                memory_card = ft.Card(
-                    content=ft.Container(
-                        padding=15,
-                        content=ft.Column(
-                            [
-                                ft.ListTile(
-                                    leading=ft.Image(
-                                        src=persona_info.get("image_path"),
-                                        width=40,
-                                        height=40,
-                                        fit=ft.ImageFit.COVER,
-                                        border_radius=20,
-                                    ),
-                                    title=ft.Text(
-                                        f"Memory with {persona_info.get('name', 'Unknown')}"
-                                    ),
-                                    subtitle=ft.Text(
-                                        datetime.fromisoformat(
-                                            memory["timestamp"]
-                                        ).strftime("%Y-%m-%d %H:%M")
-                                    ),
-                                ),
-                                ft.Container(
-                                    content=ft.Text(
-                                        f'"{memory["summary"]}"', italic=True
-                                    ),
-                                ),
-                                actions_row,
-                            ]
-                        ),
-                    )
-                )
-                self.memories_list.controls.append(memory_card)
+        actions_row.controls.append(
+            ft.IconButton(
+                ft.Icons.DELETE_OUTLINE,
+                icon_color=ft.Colors.RED_ACCENT,
+                on_click=lambda _, m=memory: self._show_delete_confirmation(m["memory_id"]),
+            )
+        )
 
-        if self.page:
-            self.page.update()
+        return ft.Card(
+            content=ft.Container(
+                padding=15,
+                content=ft.Column(
+                    [
+                        ft.ListTile(
+                            leading=ft.Image(
+                                src=thumbnail_path(persona_info.get("image_path")),
+                                width=40,
+                                height=40,
+                                fit=ft.ImageFit.COVER,
+                                border_radius=20,
+                            ),
+                            title=ft.Text(
+                                f"Memory with {persona_info.get('name', 'Unknown')}"
+                            ),
+                            subtitle=ft.Text(
+                                datetime.fromisoformat(
+                                    memory["timestamp"]
+                                ).strftime("%Y-%m-%d %H:%M")
+                            ),
+                        ),
+                        ft.Container(
+                            content=ft.Text(
+                                f'"{memory["summary"]}"', italic=True
+                            ),
+                        ),
+                        actions_row,
+                    ]
+                ),
+            )
+        )
@@ -0,0 +1,82 @@
+import hashlib
+import random
+from modules.search_index import normalize_text, tokenize
+
+
+class MinHashIndex:
+    """
+    MinHash signatures over character shingles, bucketed with LSH banding so a
+    lookup only compares against memories that share at least one band.
+    Keys are grouped by scope (the persona), and only memories within the
+    same scope are ever considered duplicates.
+    """
+
+    NUM_PERM = 64
+    BANDS = 16
+    SHINGLE_SIZE = 4
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self):
+        rng = random.Random(1337)
+        self._perms = [(rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME)) for _ in range(self.NUM_PERM)]
+        self._rows = self.NUM_PERM // self.BANDS
+        self._signatures = {}  # key -> (scope, signature)
+        self._buckets = {}     # (scope, band, band hash) -> set(key)
+
+    def _shingles(self, text: str) -> set:
+        joined = " ".join(tokenize(text)) or normalize_text(text or "").strip()
+        if len(joined) <= self.SHINGLE_SIZE:
+            return {joined}
+        return {joined[i:i + self.SHINGLE_SIZE] for i in range(len(joined) - self.SHINGLE_SIZE + 1)}
+
+    def signature(self, text: str) -> tuple:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf8"), digest_size=8).digest(), "little")
+            for s in self._shingles(text)
+        ]
+        return tuple(
+            min((a * h + b) % self._PRIME for h in hashes)
+            for a, b in self._perms
+        )
+
+    def _band_keys(self, scope, signature: tuple):
+        for band in range(self.BANDS):
+            start = band * self._rows
+            yield (scope, band, hash(signature[start:start + self._rows]))
+
+    @staticmethod
+    def similarity(sig_a: tuple, sig_b: tuple) -> float:
+        """Estimated Jaccard similarity of the shingle sets."""
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+    def add(self, key: str, scope, signature: tuple):
+        self.remove(key)
+        self._signatures[key] = (scope, signature)
+        for band_key in self._band_keys(scope, signature):
+            self._buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str):
+        entry = self._signatures.pop(key, None)
+        if entry is None:
+            return
+        for band_key in self._band_keys(*entry):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def query(self, scope, signature: tuple, threshold: float) -> list:
+        """Returns [(key, similarity)] above the threshold, best first."""
+        candidates = set()
+        for band_key in self._band_keys(scope, signature):
+            candidates.update(self._buckets.get(band_key, ()))
+        matches = []
+        for key in candidates:
+            similarity = self.similarity(signature, self._signatures[key][1])
+            if similarity >= threshold:
+                matches.append((key, similarity))
+        return sorted(matches, key=lambda x: x[1], reverse=True)
+
+    def __len__(self):
+        return len(self._signatures)
@@ -1,55 +1,87 @@
 import flet as ft
 from datetime import datetime
-import json
 import os
+import threading
 import uuid
+from modules.dialogs import get_dialogs
+from modules.keyed_list import KeyedList
+from modules.repository import get_repository
+from modules.search_index import get_search_index
+from modules.ui_updates import get_updater, user_action
 
 class PersonInfoManager:
-    def __init__(self, file_path="person_info.json"):
-        self.file_path = f"assets/{file_path}"
+    INFO_FILE = "assets/person_info.json"
+
+    # Sessions share the file; each read-modify-write runs under this lock so none loses another's edit
+    _lock = threading.RLock()
+
+    def __init__(self, file_path: str | None = None):
+        self.file_path = file_path or self.INFO_FILE
+        self.repository = get_repository()
         if not os.path.isfile(self.file_path):
             self._write_json([])
 
     def _write_json(self, data):
-        with open(self.file_path, "w", encoding="utf8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        self.repository.write(self.file_path, data)
 
     def load_info(self) -> list:
-        if os.path.isfile(self.file_path):
-            with open(self.file_path, "r", encoding="utf8") as f:
-                return json.load(f)
-        return []
+        return self.repository.read(self.file_path, default=[])
+
+    def data_version(self) -> int:
+        return self.repository.version(self.file_path)
 
     def add_info(self, content: str):
-        info_list = self.load_info()
+        search_index = get_search_index()
         new_info = {
             "info_id": uuid.uuid4().hex,
             "content": content,
             "timestamp": datetime.now().isoformat()
         }
-        info_list.append(new_info)
-        self._write_json(info_list)
+        with self._lock:
+            self._write_json(list(self.load_info()) + [new_info])
+        search_index.index_info(new_info)
         print(f"Info {new_info['info_id']} saved.")
 
+    def import_info(self, infos: list) -> int:
+        """Bulk-inserts info entries, skipping IDs that already exist."""
+        search_index = get_search_index()
+        with self._lock:
+            info_list = list(self.load_info())
+            known_ids = {info["info_id"] for info in info_list}
+            new_infos = [i for i in infos if i.get("info_id") and i["info_id"] not in known_ids]
+            if not new_infos:
+                return 0
+            self._write_json(info_list + new_infos)
+        for info in new_infos:
+            search_index.index_info(info)
+        return len(new_infos)
+
     def update_info(self, info_id: str, content: str):
-        info_list = self.load_info()
-        for i, info in enumerate(info_list):
-            if info["info_id"] == info_id:
-                info_list[i]["content"] = content
-                info_list[i]["timestamp"] = datetime.now().isoformat()
-                break
-        self._write_json(info_list)
+        search_index = get_search_index()
+        updated_info = None
+        with self._lock:
+            info_list = list(self.load_info())
+            for i, info in enumerate(info_list):
+                if info["info_id"] == info_id:
+                    updated_info = info_list[i] = {**info, "content": content, "timestamp": datetime.now().isoformat()}
+                    break
+            self._write_json(info_list)
+        if updated_info is not None:
+            search_index.index_info(updated_info)
         print(f"Info {info_id} updated.")
 
     def delete_info(self, info_id: str):
-        info_list = self.load_info()
-        updated_list = [info for info in info_list if info["info_id"] != info_id]
-        self._write_json(updated_list)
+        search_index = get_search_index()
+        with self._lock:
+            self._write_json([info for info in self.load_info() if info["info_id"] != info_id])
+        search_index.remove_info(info_id)
         print(f"Info {info_id} deleted.")
 
 class PersonViewComponent:
     def __init__(self, page: ft.Page):
         self.page = page
+        self.updates = get_updater(page)
+        self.dialogs = get_dialogs(page)
         self.manager = PersonInfoManager()
 
         self.info_list = ft.ListView(
@@ -57,14 +89,20 @@ class PersonViewComponent:
             spacing=5,
         )
 
-        self.add_info_field = ft.TextField(
-            label="Enter personal info",
-            multiline=True,
-            min_lines=2,
-            max_lines=5
+
+        self._empty_placeholder = ft.Container(
+            content=ft.Text(
+                "No personal info saved yet. Add info with the (+) button.",
+                size=16,
+                italic=True,
+                text_align=ft.TextAlign.CENTER,
+                color=ft.Colors.OUTLINE
+            ),
+            padding=20,
+            alignment=ft.alignment.center,
+            expand=True
         )
-        self.add_dialog = self._create_add_dialog()
-        self.page.overlay.append(self.add_dialog)
+        self._tiles = KeyedList(self.info_list, "info_id", self._build_info_list_tile)
 
         self._root = ft.Column(
             [
@@ -124,12 +162,11 @@ class PersonViewComponent:
         if e.ctrl and e.key.lower() == "n":
             self._show_add_dialog(None)
 
-    def _create_add_dialog(self):
-        return ft.AlertDialog(
-            modal=True,
-            title=ft.Text("Add Personal Info"),
-            content=ft.Column(
-                [self.add_info_field],
+    def _show_info_form(self, title: str, field: ft.TextField, on_save: callable) -> ft.AlertDialog:
+        dialog = self.dialogs.show(
+            title,
+            ft.Column(
+                [field],
                 tight=True,
                 width=500,
                 scroll=ft.ScrollMode.ADAPTIVE
@@ -137,7 +174,7 @@ class PersonViewComponent:
             actions=[
                 ft.TextButton(
                     "Save",
-                    on_click=self._save_new_info,
+                    on_click=on_save,
                     style=ft.ButtonStyle(
                         padding=15,
                         text_style=ft.TextStyle(size=17, weight=ft.FontWeight.W_500)
@@ -145,25 +182,33 @@ class PersonViewComponent:
                 ),
                 ft.TextButton(
                     "Cancel",
-                    on_click=lambda e: self._close_dialog(self.add_dialog)
+                    on_click=lambda e: self.dialogs.close(dialog)
                 )
             ],
-            actions_alignment=ft.MainAxisAlignment.END
         )
+        return dialog
 
+    @user_action("add_info")
     def _show_add_dialog(self, e):
-        self.add_info_field.value = ""
-        self.add_dialog.open = True
-        self.page.update()
+        add_info_field = ft.TextField(
+            label="Enter personal info",
+            multiline=True,
+            min_lines=2,
+            max_lines=5
+        )
 
-    def _save_new_info(self, e):
-        content = self.add_info_field.value.strip()
-        if not content:
-            return
-        self.manager.add_info(content)
-        self._close_dialog(self.add_dialog)
-        self.update_view()
+        @user_action("add_info")
+        def save_new_info(e):
+            content = add_info_field.value.strip()
+            if not content:
+                return
+            self.manager.add_info(content)
+            self.dialogs.close(add_dialog)
+            self.update_view()
+
+        add_dialog = self._show_info_form("Add Personal Info", add_info_field, save_new_info)
 
+    @user_action("edit_info")
     def _show_edit_dialog(self, info: dict):
         edit_info_field = ft.TextField(
             label="Edit personal info",
@@ -173,74 +218,25 @@ class PersonViewComponent:
             max_lines=5
         )
 
+        @user_action("edit_info")
         def save_changes(e):
             content = edit_info_field.value.strip()
             if not content:
                 return
             self.manager.update_info(info["info_id"], content)
-            self._close_dialog(edit_dialog)
+            self.dialogs.close(edit_dialog)
             self.update_view()
 
-        edit_dialog = ft.AlertDialog(
-            modal=True,
-            title=ft.Text("Edit Personal Info"),
-            content=ft.Column(
-                [edit_info_field],
-                tight=True,
-                width=500,
-                scroll=ft.ScrollMode.ADAPTIVE
-            ),
-            actions=[
-                ft.TextButton(
-                    "Save",
-                    on_click=save_changes,
-                    style=ft.ButtonStyle(
-                        padding=15,
-                        text_style=ft.TextStyle(size=17, weight=ft.FontWeight.W_500)
-                    )
-                ),
-                ft.TextButton(
-                    "Cancel",
-                    on_click=lambda e: self._close_dialog(edit_dialog)
-                )
-            ],
-            actions_alignment=ft.MainAxisAlignment.END
-        )
-        self.page.overlay.append(edit_dialog)
-        edit_dialog.open = True
-        self.page.update()
+        edit_dialog = self._show_info_form("Edit Personal Info", edit_info_field, save_changes)
 
+    @user_action("delete_info")
     def _show_delete_confirmation(self, info_id: str):
+        @user_action("delete_info")
         def confirm_delete(e):
             self.manager.delete_info(info_id)
             self.update_view()
-            dlg.open = False
-            self.page.update()
 
-        dlg = ft.AlertDialog(
-            modal=True,
-            title=ft.Text("Confirm Deletion"),
-            content=ft.Text("Delete this personal info?"),
-            actions=[
-                ft.TextButton(
-                    "Delete",
-                    on_click=confirm_delete,
-                    style=ft.ButtonStyle(color=ft.Colors.RED)
-                ),
-                ft.TextButton(
-                    "Cancel",
-                    on_click=lambda e: setattr(dlg, "open", False) or self.page.update()
-                )
-            ],
-            actions_alignment=ft.MainAxisAlignment.END
-        )
-        self.page.overlay.append(dlg)
-        dlg.open = True
-        self.page.update()
-
-    def _close_dialog(self, dialog: ft.AlertDialog):
-        dialog.open = False
-        self.page.update()
+        self.dialogs.confirm("Confirm Deletion", "Delete this personal info?", confirm_delete)
 
     def _build_info_list_tile(self, info: dict) -> ft.Card:
         actions_row = ft.Row(
@@ -287,28 +283,12 @@ class PersonViewComponent:
         )
 
     def update_view(self):
-        self.info_list.controls.clear()
-        all_info = self.manager.load_info()
-
-        if not all_info:
-            self.info_list.controls.append(
-                ft.Container(
-                    content=ft.Text(
-                        "No personal info saved yet. Add info with the (+) button.",
-                        size=16,
-                        italic=True,
-                        text_align=ft.TextAlign.CENTER,
-                        color=ft.Colors.OUTLINE
-                    ),
-                    padding=20,
-                    alignment=ft.alignment.center,
-                    expand=True
-                )
-            )
-        else:
-            sorted_info = sorted(all_info, key=lambda x: x["timestamp"], reverse=False)
-            for info in sorted_info:
-                self.info_list.controls.append(self._build_info_list_tile(info))
+        version = self.manager.data_version()
+        if self._tiles.is_current(version):
+            return
 
-        if self.page:
-            self.page.update()
\ No newline at end of file
+        all_info = self.manager.load_info()
+        leading = [self._empty_placeholder] if not all_info else []
+        sorted_info = sorted(all_info, key=lambda x: x["timestamp"], reverse=False)
+        self._tiles.sync(sorted_info, version=version, leading=leading)
+        self.updates.mark(self.info_list)
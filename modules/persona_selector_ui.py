@@ -1,87 +1,191 @@
+import hashlib
 import os
+import re
 import shutil
-import json
+import threading
 import uuid
+from collections import Counter
 import flet as ft
+from modules.dialogs import get_dialogs
+from modules.repository import get_repository
+from modules.keyed_list import KeyedList
+from modules.thumbnails import THUMBS_DIR, delete_thumbnails, generate_thumbnails, thumbnail_path
+from modules.ui_updates import get_updater, user_action
 
 
 class PersonaManager:
-    """Handles data and file operations for personas. (No changes needed here)"""
+    """Handles data and file operations for personas."""
+
+    IMAGES_DIR = "images"
+    IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+    # Files written by the old `name_<uuid6>.ext` naming, still eligible for garbage collection
+    LEGACY_IMAGE_RE = re.compile(r".+_[0-9a-f]{6}\.[A-Za-z]+$")
+    # Held while images are written and referenced, so garbage collection never sees
+    # a freshly copied image before the persona that uses it is saved
+    _lock = threading.RLock()
 
     def __init__(self, file_path="personas.json", assets_dir="assets"):
         self.assets_dir = assets_dir
         self.file_path = f"{self.assets_dir}/{file_path}"
-        os.makedirs(self.assets_dir, exist_ok=True)
+        self.images_dir = os.path.join(self.assets_dir, self.IMAGES_DIR)
+        self.repository = get_repository()
+        os.makedirs(self.images_dir, exist_ok=True)
         if not os.path.isfile(self.file_path):
             self._save_personas_to_disk([])
 
     def _save_personas_to_disk(self, personas_list):
-        with open(self.file_path, "w", encoding="utf8") as f:
-            json.dump(personas_list, f, ensure_ascii=False, indent=2)
+        self.repository.write(self.file_path, personas_list)
 
     def _copy_image_to_assets(self, temp_image_path: str) -> str:
+        """Stores an image under its content hash, so the same picture is kept only once."""
         if not temp_image_path or not os.path.exists(temp_image_path):
             return ""
 
-        filename = os.path.basename(temp_image_path)
-        name, ext = os.path.splitext(filename)
-        unique_filename = f"{name}_{uuid.uuid4().hex[:6]}{ext}"
-        dest_path = os.path.join(self.assets_dir, unique_filename)
-        shutil.copy(temp_image_path, dest_path)
+        digest = hashlib.sha256()
+        with open(temp_image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+
+        ext = os.path.splitext(temp_image_path)[1].lower()
+        dest_path = os.path.join(self.images_dir, f"{digest.hexdigest()[:32]}{ext}")
+        if not os.path.isfile(dest_path):
+            shutil.copy(temp_image_path, dest_path)
+            generate_thumbnails(dest_path)
         return dest_path
 
+    def _image_refcounts(self, personas) -> Counter:
+        return Counter(os.path.normpath(p["image_path"]) for p in personas if p.get("image_path"))
+
+    def _release_image(self, image_path: str, remaining_personas):
+        """Deletes an image once no remaining persona references it."""
+        if not image_path or self._image_refcounts(remaining_personas)[os.path.normpath(image_path)] > 0:
+            return
+        self._delete_asset_image(image_path)
+
     def _delete_asset_image(self, image_path: str):
         if image_path and os.path.exists(image_path):
+            delete_thumbnails(image_path)
             try:
                 os.remove(image_path)
             except OSError as e:
                 print(f"Error deleting image {image_path}: {e}")
 
+    def collect_garbage(self) -> dict:
+        """
+        Deletes persona images and thumbnails that no persona references.
+        Only the content-addressed store, the thumbnail cache and legacy
+        `name_<uuid6>.ext` uploads are scanned, so other assets are left alone.
+        """
+        with self._lock:
+            referenced = set(self._image_refcounts(self.load_personas()))
+            referenced_stems = {os.path.splitext(os.path.basename(p))[0] for p in referenced}
+
+            candidates = []
+            for name in os.listdir(self.images_dir):
+                candidates.append(os.path.join(self.images_dir, name))
+            for name in os.listdir(self.assets_dir):
+                path = os.path.join(self.assets_dir, name)
+                if os.path.isfile(path) and self.LEGACY_IMAGE_RE.match(name) \
+                        and os.path.splitext(name)[1].lower() in self.IMAGE_EXTENSIONS:
+                    candidates.append(path)
+
+            removed_files = 0
+            reclaimed_bytes = 0
+            for path in candidates:
+                if os.path.normpath(path) in referenced or not os.path.isfile(path):
+                    continue
+                size = os.path.getsize(path)
+                self._delete_asset_image(path)
+                if not os.path.exists(path):
+                    removed_files += 1
+                    reclaimed_bytes += size
+
+            if os.path.isdir(THUMBS_DIR):
+                for name in os.listdir(THUMBS_DIR):
+                    source_stem = name.rsplit("_", 1)[0]
+                    path = os.path.join(THUMBS_DIR, name)
+                    if source_stem not in referenced_stems and os.path.isfile(path):
+                        reclaimed_bytes += os.path.getsize(path)
+                        os.remove(path)
+                        removed_files += 1
+
+            print(f"Asset garbage collection removed {removed_files} files ({reclaimed_bytes} bytes).")
+            return {"removed_files": removed_files, "reclaimed_bytes": reclaimed_bytes}
+
     def load_personas(self) -> list:
-        return json.load(open(self.file_path, encoding="utf8"))
+        """Returns the cached, read-only persona list."""
+        return self.repository.read(self.file_path)
 
-    def add_persona(self, name: str, prompt: str, temp_image_path: str):
-        personas = self.load_personas()
-        final_image_path = self._copy_image_to_assets(temp_image_path)
-        personas.append(
-            {
-                "id": uuid.uuid4().hex,
-                "name": name,
-                "prompt": prompt,
-                "image_path": final_image_path,
-            }
-        )
-        self._save_personas_to_disk(personas)
+    def data_version(self) -> int:
+        return self.repository.version(self.file_path)
 
-    def update_persona(
-        self, persona_id: str, name: str, prompt: str, temp_image_path: str | None
-    ):
-        personas = self.load_personas()
-        for i, p in enumerate(personas):
-            if p["id"] == persona_id:
-                final_image_path = p.get("image_path")
-                if temp_image_path:
-                    self._delete_asset_image(p.get("image_path"))
-                    final_image_path = self._copy_image_to_assets(temp_image_path)
-
-                personas[i] = {
-                    "id": persona_id,
+    def add_persona(self, name: str, prompt: str, temp_image_path: str):
+        with self._lock:
+            personas = list(self.load_personas())
+            final_image_path = self._copy_image_to_assets(temp_image_path)
+            personas.append(
+                {
+                    "id": uuid.uuid4().hex,
                     "name": name,
                     "prompt": prompt,
                     "image_path": final_image_path,
                 }
-                break
+            )
+            self._save_personas_to_disk(personas)
+
+    def import_personas(self, personas: list) -> int:
+        """Bulk-inserts (persona, image_path) pairs, skipping IDs that already exist."""
+        with self._lock:
+            existing = list(self.load_personas())
+            known_ids = {p["id"] for p in existing}
+            new_personas = []
+            for persona, image_path in personas:
+                if not persona.get("id") or persona["id"] in known_ids:
+                    continue
+                known_ids.add(persona["id"])
+                new_personas.append({
+                    "id": persona["id"],
+                    "name": persona.get("name", ""),
+                    "prompt": persona.get("prompt", ""),
+                    "image_path": self._copy_image_to_assets(image_path),
+                })
+            if new_personas:
+                self._save_personas_to_disk(existing + new_personas)
+            return len(new_personas)
 
-        self._save_personas_to_disk(personas)
+    def update_persona(
+        self, persona_id: str, name: str, prompt: str, temp_image_path: str | None
+    ):
+        with self._lock:
+            personas = list(self.load_personas())
+            old_image_path = None
+            for i, p in enumerate(personas):
+                if p["id"] == persona_id:
+                    final_image_path = p.get("image_path")
+                    if temp_image_path:
+                        old_image_path = p.get("image_path")
+                        final_image_path = self._copy_image_to_assets(temp_image_path)
+
+                    personas[i] = {
+                        "id": persona_id,
+                        "name": name,
+                        "prompt": prompt,
+                        "image_path": final_image_path,
+                    }
+                    break
+
+            self._save_personas_to_disk(personas)
+            self._release_image(old_image_path, personas)
 
     def delete_persona(self, persona_id: str):
-        personas = self.load_personas()
-        personas_to_keep = [p for p in personas if p["id"] != persona_id]
-        for p in personas:
-            if p["id"] == persona_id:
-                self._delete_asset_image(p.get("image_path"))
-                break
-        self._save_personas_to_disk(personas_to_keep)
+        with self._lock:
+            personas = self.load_personas()
+            personas_to_keep = [p for p in personas if p["id"] != persona_id]
+            self._save_personas_to_disk(personas_to_keep)
+            for p in personas:
+                if p["id"] == persona_id:
+                    self._release_image(p.get("image_path"), personas_to_keep)
+                    break
 
 
 class PersonaSelectorComponent:
@@ -89,10 +193,11 @@ class PersonaSelectorComponent:
 
     def __init__(self, page: ft.Page, on_select: callable = None):
         self.page = page
+        self.updates = get_updater(page)
+        self.dialogs = get_dialogs(page)
         self.on_select = on_select
         self.manager = PersonaManager()
 
-        self._add_temp_image_path = None
 
         self.grid = ft.GridView(
             runs_count=5, 
@@ -103,20 +208,18 @@ class PersonaSelectorComponent:
             padding=10,
         )
 
-        self.add_file_picker = ft.FilePicker(on_result=self._on_add_file_chosen)
-        self.page.overlay.append(self.add_file_picker)
-
-        self.add_name_field = ft.TextField(label="Persona Name")
-        self.add_prompt_field = ft.TextField(
-            label="System Prompt", multiline=True, min_lines=2, max_lines=7
-        )
-        self.add_image_preview = ft.Container(
-            content=ft.Text("No image selected."),
-            alignment=ft.alignment.center,
-            height=150,
+        self._add_card = ft.Card(
+            content=ft.Container(
+                content=ft.Icon(name=ft.Icons.PERSON_ADD, size=58),
+                alignment=ft.alignment.center,
+                aspect_ratio=1,
+                on_click=self._show_add_dialog,
+                border=ft.border.all(0.3, ft.Colors.OUTLINE),
+                bgcolor=ft.Colors.with_opacity(0.03, ft.Colors.ON_SURFACE),
+                border_radius=10,
+            )
         )
-        self.add_dialog = self._create_add_dialog()
-        self.page.overlay.append(self.add_dialog)
+        self._cards = KeyedList(self.grid, "id", self._create_persona_card)
 
         self._root = ft.Column(
             [
@@ -132,26 +235,11 @@ class PersonaSelectorComponent:
         return self._root
 
     def update_grid(self):
-        self.grid.controls.clear()
-
-        for persona in self.manager.load_personas():
-            self.grid.controls.append(self._create_persona_card(persona))
-
-        add_card = ft.Card(
-            content=ft.Container(
-                content=ft.Icon(name=ft.Icons.PERSON_ADD, size=58),
-                alignment=ft.alignment.center,
-                aspect_ratio=1,
-                on_click=self._show_add_dialog,
-                border=ft.border.all(0.3, ft.Colors.OUTLINE),
-                bgcolor=ft.Colors.with_opacity(0.03, ft.Colors.ON_SURFACE),
-                border_radius=10,
-            )
-        )
-
-        self.grid.controls.append(add_card)
-        if self._root.page:
-            self._root.page.update()
+        version = self.manager.data_version()
+        if self._cards.is_current(version):
+            return
+        self._cards.sync(self.manager.load_personas(), version=version, trailing=[self._add_card])
+        self.updates.mark(self.grid)
 
     def _handle_card_click(self, persona: dict):
         print(f"Card clicked. Persona ID: {persona['id']}")
@@ -204,7 +292,7 @@ class PersonaSelectorComponent:
                             text_align=ft.TextAlign.CENTER,
                         ),
                         ft.Image(
-                            src=persona.get("image_path"),
+                            src=thumbnail_path(persona.get("image_path"), "card"),
                             fit=ft.ImageFit.CONTAIN,
                             expand=True,
                             error_content=ft.Icon(ft.Icons.BROKEN_IMAGE),
@@ -224,27 +312,37 @@ class PersonaSelectorComponent:
             )
         )
 
-    def _on_add_file_chosen(self, e: ft.FilePickerResultEvent):
-        if e.files:
-            self._add_temp_image_path = e.files[0].path
-            self.add_image_preview.content = ft.Image(
-                src=self._add_temp_image_path, fit=ft.ImageFit.CONTAIN
-            )
-            self.add_dialog.content.update()
+    def _show_persona_form(
+        self,
+        title: str,
+        name_field: ft.TextField,
+        prompt_field: ft.TextField,
+        image_preview: ft.Container,
+        image_path: list,
+        image_button_text: str,
+        on_save: callable,
+    ) -> ft.AlertDialog:
+        """Opens a pooled add/edit dialog; the chosen image is stored in image_path[0]."""
+        def on_file_chosen(e: ft.FilePickerResultEvent):
+            if e.files:
+                image_path[0] = e.files[0].path
+                image_preview.content = ft.Image(
+                    src=image_path[0], fit=ft.ImageFit.CONTAIN
+                )
+                self.updates.mark(image_preview)
 
-    def _create_add_dialog(self) -> ft.AlertDialog:
-        return ft.AlertDialog(
-            modal=True,
-            title=ft.Text("Add New Persona"),
-            content=ft.Column(
+        dialog = self.dialogs.show(
+            title,
+            ft.Column(
                 [
-                    self.add_name_field,
-                    self.add_prompt_field,
-                    self.add_image_preview,
+                    name_field,
+                    prompt_field,
+                    image_preview,
                     ft.ElevatedButton(
-                        "Select Image",
+                        image_button_text,
                         icon=ft.Icons.UPLOAD_FILE,
-                        on_click=lambda _: self.add_file_picker.pick_files(
+                        on_click=lambda _: self.dialogs.pick_files(
+                            on_file_chosen,
                             allow_multiple=False,
                             allowed_extensions=["png", "jpg", "jpeg"],
                         ),
@@ -257,43 +355,54 @@ class PersonaSelectorComponent:
             ),
             actions=[
                 ft.TextButton(
-                    "Save", on_click=self._save_new_persona,
+                    "Save", on_click=on_save,
                     style=ft.ButtonStyle(
                         padding=15,
                         text_style=ft.TextStyle(size=17, weight=ft.FontWeight.W_500)
                     )
                 ),
                 ft.TextButton(
-                    "Cancel", on_click=lambda e: self._close_dialog(self.add_dialog),
+                    "Cancel", on_click=lambda e: self._close_dialog(dialog),
                     style=ft.ButtonStyle(
                         padding=15,
                         text_style=ft.TextStyle(size=17, weight=ft.FontWeight.W_500)
                     )
                 ),
             ],
-            actions_alignment=ft.MainAxisAlignment.END,
         )
+        return dialog
 
+    @user_action("add_persona")
     def _show_add_dialog(self, e):
-        self.add_name_field.value = ""
-        self.add_prompt_field.value = ""
-        self.add_image_preview.content = ft.Text("No image selected.")
-        self._add_temp_image_path = None
-        self.add_dialog.open = True
-        self.page.update()
-
-    def _save_new_persona(self, e):
-        name = self.add_name_field.value.strip()
-        prompt = self.add_prompt_field.value.strip()
-        if not name or not prompt or not self._add_temp_image_path:
-            print("Validation failed: Please fill all fields and select an image.")
-            self.page.update()
-            return
+        add_temp_image_path = [None]
+        name_field = ft.TextField(label="Persona Name")
+        prompt_field = ft.TextField(
+            label="System Prompt", multiline=True, min_lines=2, max_lines=7
+        )
+        image_preview = ft.Container(
+            content=ft.Text("No image selected."),
+            alignment=ft.alignment.center,
+            height=150,
+        )
 
-        self.manager.add_persona(name, prompt, self._add_temp_image_path)
-        self._close_dialog(self.add_dialog)
-        self.update_grid()
+        @user_action("add_persona")
+        def save_new_persona(e):
+            name = name_field.value.strip()
+            prompt = prompt_field.value.strip()
+            if not name or not prompt or not add_temp_image_path[0]:
+                print("Validation failed: Please fill all fields and select an image.")
+                return
+
+            self.manager.add_persona(name, prompt, add_temp_image_path[0])
+            self._close_dialog(add_dialog)
+            self.update_grid()
 
+        add_dialog = self._show_persona_form(
+            "Add New Persona", name_field, prompt_field, image_preview,
+            add_temp_image_path, "Select Image", save_new_persona,
+        )
+
+    @user_action("edit_persona")
     def _show_edit_dialog(self, persona: dict):
         edit_temp_image_path = [None]
 
@@ -306,24 +415,14 @@ class PersonaSelectorComponent:
             max_lines=7
         )
         image_preview = ft.Container(
-            content=ft.Image(src=persona.get("image_path"), fit=ft.ImageFit.CONTAIN)
+            content=ft.Image(src=thumbnail_path(persona.get("image_path"), "card"), fit=ft.ImageFit.CONTAIN)
             if persona.get("image_path")
             else ft.Text("No image."),
             height=150,
             alignment=ft.alignment.center,
         )
 
-        def on_edit_file_chosen(e: ft.FilePickerResultEvent):
-            if e.files:
-                edit_temp_image_path[0] = e.files[0].path
-                image_preview.content = ft.Image(
-                    src=edit_temp_image_path[0], fit=ft.ImageFit.CONTAIN
-                )
-                edit_dialog.content.update()
-
-        edit_file_picker = ft.FilePicker(on_result=on_edit_file_chosen)
-        self.page.overlay.append(edit_file_picker)
-
+        @user_action("edit_persona")
         def save_changes(e):
             self.manager.update_persona(
                 persona_id=persona["id"],
@@ -332,62 +431,24 @@ class PersonaSelectorComponent:
                 temp_image_path=edit_temp_image_path[0],
             )
             self._close_dialog(edit_dialog)
-            self.page.overlay.remove(edit_file_picker)
             self.update_grid()
 
-        edit_dialog = ft.AlertDialog(
-            modal=True,
-            title=ft.Text(f"Edit {persona.get('name')}"),
-            content=ft.Column(
-                [
-                    name_field,
-                    prompt_field,
-                    image_preview,
-                    ft.ElevatedButton(
-                        "Change Image",
-                        icon=ft.Icons.UPLOAD_FILE,
-                        on_click=lambda _: edit_file_picker.pick_files(
-                            allow_multiple=False,
-                            allowed_extensions=["png", "jpg", "jpeg"],
-                        ),
-                    ),
-                ],
-                tight=True,
-                width=500,
-                scroll=ft.ScrollMode.ADAPTIVE,
-                horizontal_alignment=ft.CrossAxisAlignment.CENTER
-            ),
-            actions=[
-                ft.TextButton(
-                    "Save", on_click=save_changes,
-                    style=ft.ButtonStyle(
-                        padding=15,
-                        text_style=ft.TextStyle(size=17, weight=ft.FontWeight.W_500)
-                    )
-                ),
-                ft.TextButton(
-                    "Cancel", on_click=lambda e: self._close_dialog(edit_dialog),
-                    style=ft.ButtonStyle(
-                        padding=15,
-                        text_style=ft.TextStyle(size=17, weight=ft.FontWeight.W_500)
-                    )
-                ),
-            ],
+        edit_dialog = self._show_persona_form(
+            f"Edit {persona.get('name')}", name_field, prompt_field, image_preview,
+            edit_temp_image_path, "Change Image", save_changes,
         )
-        self.page.overlay.append(edit_dialog)
-        edit_dialog.open = True
-        self.page.update()
 
+    @user_action("delete_persona")
     def _show_delete_dialog(self, persona: dict):
+        @user_action("delete_persona")
         def confirm_delete(e):
             self.manager.delete_persona(persona["id"])
             self._close_dialog(delete_dialog)
             self.update_grid()
 
-        delete_dialog = ft.AlertDialog(
-            modal=True,
-            title=ft.Text("Confirm Deletion"),
-            content=ft.Markdown(
+        delete_dialog = self.dialogs.show(
+            "Confirm Deletion",
+            ft.Markdown(
                 f"Are you sure you want to delete '**{persona.get('name')}**'?"
             ),
             actions=[
@@ -408,10 +469,6 @@ class PersonaSelectorComponent:
                 ),
             ],
         )
-        self.page.overlay.append(delete_dialog)
-        delete_dialog.open = True
-        self.page.update()
 
     def _close_dialog(self, dialog: ft.AlertDialog):
-        dialog.open = False
-        self.page.update()
+        self.dialogs.close(dialog)
@@ -0,0 +1,185 @@
+import atexit
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+
+
+class Profiler:
+    """
+    Opt-in profiler for UI handlers, storage and inference calls. While enabled, every
+    span records its wall time, one cProfile session covers all threads (on Python
+    3.12+ cProfile hooks into sys.monitoring, which is process-wide; timings of code
+    running on several threads at once are approximate), and tracemalloc tracks
+    allocations. stop() writes the session report to disk.
+    Functions wrapped with @profiled cost one attribute check while profiling is off.
+    """
+
+    REPORT_DIR = "assets/profiles"
+    TOP_N = 30
+    TRACEMALLOC_FRAMES = 10
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._spans = {}  # name -> [calls, total seconds, max seconds]
+        self._profile = None  # cProfile.Profile of the session, None if another tool holds the profiler
+        self._baseline = None
+        self._started_at = None
+        self._owns_tracemalloc = False
+
+    def start(self):
+        with self._lock:
+            if self.enabled:
+                return
+            self._reset()
+            self._started_at = datetime.now()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.TRACEMALLOC_FRAMES)
+                self._owns_tracemalloc = True
+            self._baseline = tracemalloc.take_snapshot()
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                # A debugger or an outer cProfile run already holds the interpreter's profiler
+                print("Profiling without cProfile stats: another profiler is active.")
+                self._profile = None
+            self.enabled = True
+        print("Profiling started.")
+
+    def stop(self) -> str | None:
+        """Ends the session and returns the path of the written report."""
+        with self._lock:
+            if not self.enabled:
+                return None
+            self.enabled = False
+            if self._profile is not None:
+                self._profile.disable()
+        path = self.dump()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()  # tracing someone else started keeps running
+            self._owns_tracemalloc = False
+        print(f"Profiling stopped; report written to {path}")
+        return path
+
+    @contextmanager
+    def span(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - started
+            with self._lock:
+                entry = self._spans.setdefault(name, [0, 0.0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2] = max(entry[2], elapsed)
+
+    def report(self) -> str:
+        with self._lock:
+            spans = {name: list(entry) for name, entry in self._spans.items()}
+            stats = self._session_stats()
+            started_at = self._started_at
+
+        lines = [f"Profiling session started {started_at:%Y-%m-%d %H:%M:%S}" if started_at else "Profiling session", ""]
+        lines.append("Spans (wall time, nested spans are included in their parents):")
+        for name, (calls, total, longest) in sorted(spans.items(), key=lambda x: x[1][1], reverse=True):
+            lines.append(
+                f"  {name:32} {calls:6} calls  total {total * 1000:10.1f} ms  "
+                f"avg {total / calls * 1000:8.2f} ms  max {longest * 1000:8.1f} ms"
+            )
+
+        lines += ["", f"Top {self.TOP_N} functions by cumulative time (all threads):"]
+        if stats is not None:
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.TOP_N)
+            lines.append(out.getvalue().strip())
+        else:
+            lines.append("  (no cProfile stats)")
+
+        lines += ["", f"Top {self.TOP_N} allocation sites since the session started:"]
+        if tracemalloc.is_tracing() and self._baseline is not None:
+            diff = tracemalloc.take_snapshot().compare_to(self._baseline, "lineno")
+            for stat in diff[:self.TOP_N]:
+                lines.append(f"  {stat}")
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f"  traced now {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB")
+        else:
+            lines.append("  (tracemalloc not running)")
+        return "\n".join(lines)
+
+    def dump(self) -> str:
+        """Writes profile_<time>.txt (readable report) and .prof (pstats, for snakeviz etc.)."""
+        os.makedirs(self.REPORT_DIR, exist_ok=True)
+        stem = os.path.join(self.REPORT_DIR, f"profile_{datetime.now():%Y%m%d_%H%M%S}")
+        with open(stem + ".txt", "w", encoding="utf8") as f:
+            f.write(self.report())
+        with self._lock:
+            stats = self._session_stats()
+        if stats is not None:
+            stats.dump_stats(stem + ".prof")
+        return stem + ".txt"
+
+    def _session_stats(self) -> pstats.Stats | None:
+        if self._profile is None:
+            return None
+        try:
+            return pstats.Stats(self._profile)
+        except TypeError:  # nothing was recorded
+            return None
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> Profiler:
+    """Process-wide profiler; PERSONA_CHAT_PROFILE=1 profiles the whole run."""
+    global _profiler
+    if _profiler is not None:
+        return _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = Profiler()
+            atexit.register(_profiler.stop)
+            if os.environ.get("PERSONA_CHAT_PROFILE", "0") == "1":
+                _profiler.start()
+        return _profiler
+
+
+def report_at_exit(report: callable):
+    """
+    Prints a diagnostics report (cache hits, client patches, stalls) when the process
+    exits, but only with PERSONA_CHAT_STATS=1 or while the whole run is profiled.
+    """
+    if os.environ.get("PERSONA_CHAT_STATS", "0") == "1" or os.environ.get("PERSONA_CHAT_PROFILE", "0") == "1":
+        atexit.register(lambda: print(report()))
+
+
+def profiled(name: str):
+    """Decorator that runs a function inside a profiler span."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = get_profiler()
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            with profiler.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
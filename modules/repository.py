@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+from types import MappingProxyType
+from modules.profiling import profiled, report_at_exit
+
+
+def freeze(data):
+    """Converts parsed JSON into read-only views (dicts -> MappingProxyType, lists -> tuples)."""
+    if isinstance(data, (MappingProxyType, tuple)):
+        return data
+    if isinstance(data, dict):
+        return MappingProxyType({k: freeze(v) for k, v in data.items()})
+    if isinstance(data, list):
+        return tuple(freeze(v) for v in data)
+    return data
+
+
+def thaw(data):
+    """Returns a mutable deep copy of a frozen structure."""
+    if isinstance(data, (MappingProxyType, dict)):
+        return {k: thaw(v) for k, v in data.items()}
+    if isinstance(data, (tuple, list)):
+        return [thaw(v) for v in data]
+    return data
+
+
+def file_versions(paths) -> dict:
+    """[size, mtime_ns] of each file (None when missing), stored with derived files to notice stale ones."""
+    versions = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            versions[path] = None
+            continue
+        versions[path] = [st.st_size, st.st_mtime_ns]
+    return versions
+
+
+def json_default(obj):
+    """json.dump hook, so frozen records can be written back without copying them first."""
+    if isinstance(obj, MappingProxyType):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JsonRepository:
+    """
+    Process-wide cache of parsed JSON files. A cached entry stays valid while the
+    file's mtime and size are unchanged; our own writes refresh it directly.
+    Callers get read-only views and must build new records to change data.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}   # path -> ((mtime_ns, size), frozen data)
+        self._versions = {}  # path -> change counter
+        self._hits = {}
+        self._misses = {}
+
+    def _stat_key(self, path: str):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def exists(self, path: str) -> bool:
+        return os.path.isfile(path)
+
+    @profiled("storage:read")
+    def read(self, path: str, default=None):
+        path = os.path.normpath(path)
+        with self._lock:
+            key = self._stat_key(path)
+            if key is None:
+                if default is not None:
+                    return freeze(default)
+                raise FileNotFoundError(path)
+
+            entry = self._entries.get(path)
+            if entry and entry[0] == key:
+                self._hits[path] = self._hits.get(path, 0) + 1
+                return entry[1]
+
+            self._misses[path] = self._misses.get(path, 0) + 1
+            with open(path, "r", encoding="utf8") as f:
+                data = freeze(json.load(f))
+            self._entries[path] = (key, data)
+            self._versions[path] = self._versions.get(path, 0) + 1
+            return data
+
+    def read_mutable(self, path: str, default=None):
+        return thaw(self.read(path, default))
+
+    @profiled("storage:write")
+    def write(self, path: str, data):
+        path = os.path.normpath(path)
+        with self._lock:
+            with open(path, "w", encoding="utf8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2, default=json_default)
+            self._entries[path] = (self._stat_key(path), freeze(data))
+            self._versions[path] = self._versions.get(path, 0) + 1
+
+    def invalidate(self, path: str | None = None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.normpath(path), None)
+
+    def version(self, path: str) -> int:
+        """Change counter for a file; refreshes the cache first so external edits count."""
+        path = os.path.normpath(path)
+        with self._lock:
+            if self._stat_key(path) is not None:
+                self.read(path)
+            return self._versions.get(path, 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            per_file = {}
+            for path in set(self._hits) | set(self._misses):
+                hits = self._hits.get(path, 0)
+                misses = self._misses.get(path, 0)
+                per_file[path] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+            hits = sum(self._hits.values())
+            misses = sum(self._misses.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "files": per_file,
+            }
+
+    def report(self) -> str:
+        stats = self.stats()
+        lines = [f"Repository cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%})"]
+        for path, s in sorted(stats["files"].items()):
+            lines.append(f"  {path}: {s['hits']}/{s['hits'] + s['misses']} ({s['hit_rate']:.0%})")
+        return "\n".join(lines)
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_repository() -> JsonRepository:
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = JsonRepository()
+            report_at_exit(_repository.report)
+        return _repository
@@ -0,0 +1,194 @@
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class SchedulerRejected(Exception):
+    """Raised instead of queueing a request the scheduler cannot take; the message is shown to the user."""
+
+
+class _Ticket:
+    """One queued request; compared by identity, so equal-looking tickets stay distinct in a deque."""
+
+    __slots__ = ("session", "cancelled")
+
+    def __init__(self, session):
+        self.session = session
+        self.cancelled = False
+
+
+class FairScheduler:
+    """
+    Hands out turns on the shared chat model, one reply at a time, round-robin
+    across sessions: a session that queues several requests waits for every
+    other waiting session to get a turn in between. Requests beyond the
+    per-session limit or the total queue limit are rejected right away rather
+    than left waiting behind an overloaded model. Background work (idle-time
+    titles and summaries) only starts while nothing is running or waiting, and
+    is cancelled as soon as any session asks for a turn.
+    """
+
+    def __init__(self, max_queue: int = 8, per_session: int = 1):
+        self.max_queue = max_queue
+        self.per_session = per_session
+        self._cond = threading.Condition()
+        self._queues = {}       # session id -> deque of tickets waiting for a turn
+        self._order = deque()   # sessions with waiting tickets, next turn first
+        self._running = None    # ticket of the reply being generated
+        self._background = None  # cancel event of the background work holding the model
+        self.stats = {"served": 0, "rejected": 0, "max_waiting": 0}
+
+    def _waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _position(self, ticket) -> int:
+        """Turns that run before this ticket, following the round-robin order."""
+        queue = self._queues[ticket.session]
+        depth = queue.index(ticket)
+        session_index = self._order.index(ticket.session)
+        ahead = 1 if self._running is not None else 0
+        for i, session in enumerate(self._order):
+            if session != ticket.session:
+                ahead += min(len(self._queues[session]), depth + 1 if i < session_index else depth)
+        return ahead + depth
+
+    def _discard(self, ticket):
+        queue = self._queues.get(ticket.session)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[ticket.session]
+            self._order.remove(ticket.session)
+        self._cond.notify_all()
+
+    def _take(self, ticket):
+        session = ticket.session
+        queue = self._queues[session]
+        queue.popleft()
+        self._order.popleft()
+        if queue:
+            self._order.append(session)
+        else:
+            del self._queues[session]
+        self._running = ticket
+
+    @contextmanager
+    def slot(self, session_id, on_wait=None):
+        """
+        Blocks until it is this session's turn and holds it for the body. on_wait(position)
+        is called, without the scheduler's lock held, whenever the number of turns ahead
+        changes, and with 0 once a request that had to wait starts.
+        """
+        ticket = _Ticket(session_id)
+        with self._cond:
+            own = len(self._queues.get(session_id, ())) + (
+                self._running is not None and self._running.session == session_id
+            )
+            if own >= self.per_session:
+                self.stats["rejected"] += 1
+                raise SchedulerRejected("A reply is already being generated for you; wait for it to finish.")
+            if self._waiting() >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise SchedulerRejected(
+                    f"The model is busy with {self.max_queue} queued replies. Please try again in a moment."
+                )
+            if session_id not in self._queues:
+                self._queues[session_id] = deque()
+                self._order.append(session_id)
+            self._queues[session_id].append(ticket)
+            self.stats["max_waiting"] = max(self.stats["max_waiting"], self._waiting())
+            if self._background is not None:
+                self._background.set()  # it stops at its next token and hands the model over
+
+            reported = None
+            try:
+                while True:
+                    if ticket.cancelled:
+                        raise SchedulerRejected("The session was closed.")
+                    if (self._running is None and self._background is None
+                            and self._order[0] == session_id and self._queues[session_id][0] is ticket):
+                        self._take(ticket)
+                        break
+                    position = self._position(ticket)
+                    if position != reported and on_wait is not None:
+                        reported = position
+                        self._cond.release()
+                        try:
+                            on_wait(position)
+                        finally:
+                            self._cond.acquire()
+                        continue  # the queue may have moved while the callback ran
+                    self._cond.wait()
+            except BaseException:
+                self._discard(ticket)
+                raise
+
+        try:
+            if reported is not None and on_wait is not None:
+                on_wait(0)
+            yield
+        finally:
+            with self._cond:
+                self._running = None
+                self.stats["served"] += 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def background(self, cancel: threading.Event):
+        """
+        Holds the model for low-priority work if it is idle and nobody is waiting,
+        yielding whether it got it. `cancel` is set when a request arrives meanwhile;
+        the body must then stop promptly.
+        """
+        with self._cond:
+            granted = self._running is None and self._background is None and not self._order
+            if granted:
+                self._background = cancel
+        try:
+            yield granted
+        finally:
+            if granted:
+                with self._cond:
+                    self._background = None
+                    self._cond.notify_all()
+
+    def drop_session(self, session_id):
+        """Cancels the waiting requests of a closed session."""
+        with self._cond:
+            queue = self._queues.pop(session_id, None)
+            if not queue:
+                return
+            for ticket in queue:
+                ticket.cancelled = True
+            self._order.remove(session_id)
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "running": self._running.session if self._running else None,
+                "waiting": {session: len(q) for session, q in self._queues.items()},
+                **self.stats,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> FairScheduler:
+    """
+    Process-wide scheduler of the chat model. PERSONA_CHAT_MAX_QUEUE (default 8) caps
+    the replies waiting across all sessions, PERSONA_CHAT_SESSION_LIMIT (default 1)
+    the replies one session may have queued or running.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler(
+                max_queue=int(os.environ.get("PERSONA_CHAT_MAX_QUEUE", "8")),
+                per_session=int(os.environ.get("PERSONA_CHAT_SESSION_LIMIT", "1")),
+            )
+        return _scheduler
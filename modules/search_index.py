@@ -0,0 +1,400 @@
+import atexit
+import bisect
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+import uuid
+from modules.repository import file_versions
+
+
+BG_SUFFIXES = (
+    "ищата", "ището", "ията", "ите", "ата", "ото", "ият", "ища", "ове", "еве",
+    "ия", "ът", "ят", "та", "то", "те", "и", "а", "я", "о", "е",
+)
+EN_SUFFIXES = ("ing", "ed", "es", "s")
+STRESS_MARKS = {"\u0300", "\u0301"}
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+QUERY_TOKEN_RE = re.compile(r"(\w+)(\*?)", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercases and strips stress marks, so 'Ѝ'/'ѝ' match 'и' and 'ё' matches 'е'."""
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join(ch for ch in text if ch not in STRESS_MARKS)
+    return unicodedata.normalize("NFC", text).replace("ё", "е")
+
+
+def stem(token: str) -> str:
+    """Very light suffix stripping for Bulgarian and English words."""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    suffixes = EN_SUFFIXES if token.isascii() else BG_SUFFIXES
+    for suffix in suffixes:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list:
+    return [stem(t) for t in TOKEN_RE.findall(normalize_text(text or "")) if len(t) > 1 or t.isdigit()]
+
+
+class SearchIndex:
+    """
+    Incremental inverted index over chat messages, chat titles, memory summaries
+    and person-info facts. Every document keeps its own term frequencies, so a
+    save or delete only touches the postings of the documents that changed.
+
+    On disk the index is a snapshot plus a journal: a save appends only the
+    groups changed since the previous one, and the snapshot is rewritten once
+    the journal outgrows a fraction of it. Both carry the versions of the files
+    the documents come from, so an index left behind by a crash is rebuilt
+    instead of silently missing saves.
+    """
+
+    INDEX_FILE = "assets/search_index.json"
+    JOURNAL_FILE = "assets/search_index.journal.jsonl"
+    SNIPPET_LENGTH = 160
+    SAVE_DELAY = 2.0
+    COMPACT_RATIO = 0.5  # rewrite the snapshot once the journal reaches this fraction of it
+    COMPACT_MIN_BYTES = 1 << 20
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._docs = {}      # doc_id -> {"kind", "group", "ref", "hash", "terms", "length", "snippet"}
+        self._groups = {}    # group -> set(doc_id)
+        self._postings = {}  # term -> {doc_id: tf}
+        self._total_length = 0
+        self._sorted_terms = None
+        self._save_timer = None
+        self._dirty_groups = set()  # changed since the last save
+        self._generation = None     # snapshot the journal lines belong to; None until one is on disk
+        self._saved_sources = None
+        self._snapshot_bytes = 0
+        self._journal_bytes = 0
+
+    # --- persistence ---
+
+    @staticmethod
+    def source_versions() -> dict:
+        from modules.chat_archive import ChatArchive
+        from modules.history_manager import HistoryManager
+        from modules.person_view_ui import PersonInfoManager
+
+        return file_versions([
+            HistoryManager.CHATS_FILE,
+            HistoryManager.MEMORIES_FILE,
+            PersonInfoManager.INFO_FILE,
+            *ChatArchive().manifest_paths(),
+        ])
+
+    def load(self) -> bool:
+        if not os.path.isfile(self.INDEX_FILE):
+            return False
+        try:
+            with open(self.INDEX_FILE, "r", encoding="utf8") as f:
+                data = json.load(f)
+            docs, sources = data["docs"], data["sources"]
+            journal_bytes = 0
+            if os.path.isfile(self.JOURNAL_FILE):
+                groups = {}
+                for doc_id, doc in docs.items():
+                    groups.setdefault(doc["group"], set()).add(doc_id)
+                with open(self.JOURNAL_FILE, "r", encoding="utf8") as f:
+                    for line in f:
+                        journal_bytes += len(line.encode("utf8"))
+                        entry = json.loads(line)
+                        if entry["generation"] != data["generation"]:
+                            continue  # written before the snapshot was
+                        for group, group_docs in entry["groups"].items():
+                            for doc_id in groups.pop(group, ()):
+                                docs.pop(doc_id, None)
+                            docs.update(group_docs)
+                            if group_docs:
+                                groups[group] = set(group_docs)
+                        sources = entry["sources"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Search index unreadable, rebuilding: {e}")
+            return False
+
+        if sources != self.source_versions():
+            print("Search index is older than the chat and memory files, rebuilding.")
+            return False
+
+        with self._lock:
+            for doc_id, doc in docs.items():
+                self._add_doc(doc_id, doc)
+            self._generation = data["generation"]
+            self._saved_sources = sources
+            self._snapshot_bytes = os.path.getsize(self.INDEX_FILE)
+            self._journal_bytes = journal_bytes
+        return True
+
+    def save(self):
+        with self._save_lock:
+            # Only references are taken under the index lock; documents are never changed in place
+            with self._lock:
+                self._save_timer = None
+                sources = self.source_versions()
+                compact = self._generation is None or self._journal_bytes > max(
+                    self.COMPACT_MIN_BYTES, self._snapshot_bytes * self.COMPACT_RATIO
+                )
+                if not compact and not self._dirty_groups and sources == self._saved_sources:
+                    return
+                if compact:
+                    docs = dict(self._docs)
+                else:
+                    groups = {
+                        group: {doc_id: self._docs[doc_id] for doc_id in self._groups.get(group, ())}
+                        for group in self._dirty_groups
+                    }
+                self._dirty_groups = set()
+                self._saved_sources = sources
+            if compact:
+                self._write_snapshot(docs, sources)
+            else:
+                self._append_journal(groups, sources)
+
+    def _write_snapshot(self, docs: dict, sources: dict):
+        generation = uuid.uuid4().hex
+        data = json.dumps({"generation": generation, "sources": sources, "docs": docs}, ensure_ascii=False)
+        tmp_path = self.INDEX_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.INDEX_FILE)
+        # Lines left from the old generation are skipped on load, so a crash here is harmless
+        open(self.JOURNAL_FILE, "w").close()
+        self._generation = generation
+        self._snapshot_bytes = os.path.getsize(self.INDEX_FILE)
+        self._journal_bytes = 0
+
+    def _append_journal(self, groups: dict, sources: dict):
+        line = json.dumps({"generation": self._generation, "sources": sources, "groups": groups}, ensure_ascii=False) + "\n"
+        data = line.encode("utf8")
+        with open(self.JOURNAL_FILE, "ab") as f:
+            f.write(data)
+        self._journal_bytes += len(data)
+
+    def sources_changed(self):
+        """Source files were rewritten without changing any indexed text; save their new versions."""
+        with self._lock:
+            self._schedule_save()
+
+    def _schedule_save(self):
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.SAVE_DELAY, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+        self.save()
+
+    # --- low level document handling ---
+
+    def _add_doc(self, doc_id: str, doc: dict):
+        self._docs[doc_id] = doc
+        self._groups.setdefault(doc["group"], set()).add(doc_id)
+        for term, tf in doc["terms"].items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._sorted_terms = None
+            postings[doc_id] = tf
+        self._total_length += doc["length"]
+
+    def _remove_doc(self, doc_id: str):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        group = self._groups.get(doc["group"])
+        if group is not None:
+            group.discard(doc_id)
+            if not group:
+                del self._groups[doc["group"]]
+        for term in doc["terms"]:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                self._sorted_terms = None
+        self._total_length -= doc["length"]
+
+    def _put(self, doc_id: str, kind: str, group: str, ref: dict, text: str):
+        text = text or ""
+        content_hash = hashlib.sha1(text.encode("utf8")).hexdigest()
+        existing = self._docs.get(doc_id)
+        if existing and existing["hash"] == content_hash and existing["ref"] == ref:
+            return
+
+        terms = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            terms[token] = terms.get(token, 0) + 1
+
+        self._remove_doc(doc_id)
+        self._add_doc(doc_id, {
+            "kind": kind,
+            "group": group,
+            "ref": ref,
+            "hash": content_hash,
+            "terms": terms,
+            "length": len(tokens),
+            "snippet": text[: self.SNIPPET_LENGTH],
+        })
+
+    def _replace_group(self, group: str, docs: list):
+        """docs: list of (doc_id, kind, ref, text). Only changed documents are re-tokenized."""
+        with self._lock:
+            new_ids = {d[0] for d in docs}
+            for doc_id in list(self._groups.get(group, ())):
+                if doc_id not in new_ids:
+                    self._remove_doc(doc_id)
+            for doc_id, kind, ref, text in docs:
+                self._put(doc_id, kind, group, ref, text)
+            self._dirty_groups.add(group)
+            self._schedule_save()
+
+    def _drop_group(self, group: str):
+        with self._lock:
+            for doc_id in list(self._groups.get(group, ())):
+                self._remove_doc(doc_id)
+            self._dirty_groups.add(group)
+            self._schedule_save()
+
+    # --- public update API ---
+
+    def index_chat(self, chat: dict):
+        chat_id = chat.get("chat_id")
+        if not chat_id:
+            return
+        docs = [(f"chat:{chat_id}", "chat", {"chat_id": chat_id}, chat.get("title", ""))]
+        for msg in chat.get("messages", []):
+            docs.append((
+                f"msg:{chat_id}:{msg.get('id')}",
+                "message",
+                {"chat_id": chat_id, "message_id": msg.get("id"), "role": msg.get("role")},
+                msg.get("content", ""),
+            ))
+        self._replace_group(f"chat:{chat_id}", docs)
+
+    def remove_chat(self, chat_id: str):
+        self._drop_group(f"chat:{chat_id}")
+
+    def index_memory(self, memory: dict):
+        memory_id = memory.get("memory_id")
+        ref = {"memory_id": memory_id, "chat_id": memory.get("chat_id"), "persona_id": memory.get("persona_id")}
+        self._replace_group(f"memory:{memory_id}", [(f"memory:{memory_id}", "memory", ref, memory.get("summary", ""))])
+
+    def remove_memory(self, memory_id: str):
+        self._drop_group(f"memory:{memory_id}")
+
+    def index_info(self, info: dict):
+        info_id = info.get("info_id")
+        self._replace_group(f"info:{info_id}", [(f"info:{info_id}", "info", {"info_id": info_id}, info.get("content", ""))])
+
+    def remove_info(self, info_id: str):
+        self._drop_group(f"info:{info_id}")
+
+    # --- querying ---
+
+    def _expand_prefix(self, prefix: str) -> list:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        terms = self._sorted_terms
+        start = bisect.bisect_left(terms, prefix)
+        end = bisect.bisect_left(terms, prefix + "\uffff")
+        return terms[start:end]
+
+    def search(self, query: str, limit: int = 20, kinds: tuple | None = None) -> list:
+        """
+        Ranked (BM25) search. The last word of the query and words ending
+        with '*' are treated as prefixes, so results update while typing.
+        """
+        query = query or ""
+        parts = QUERY_TOKEN_RE.findall(normalize_text(query))
+        if not parts:
+            return []
+        words = [word for word, _ in parts]
+        prefix_flags = [bool(star) for _, star in parts]
+        if not query.endswith(" "):
+            prefix_flags[-1] = True
+
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs or 1
+            scores = {}
+            for word, is_prefix in zip(words, prefix_flags):
+                terms = {stem(word)}
+                if is_prefix:
+                    terms.update(self._expand_prefix(word))
+                for term in terms:
+                    postings = self._postings.get(term)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, tf in postings.items():
+                        length = self._docs[doc_id]["length"]
+                        norm = tf * (self.BM25_K1 + 1) / (
+                            tf + self.BM25_K1 * (1 - self.BM25_B + self.BM25_B * length / avg_length)
+                        )
+                        scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+
+            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+            results = []
+            for doc_id, score in ranked:
+                doc = self._docs[doc_id]
+                if kinds and doc["kind"] not in kinds:
+                    continue
+                results.append({"kind": doc["kind"], "score": score, "snippet": doc["snippet"], **doc["ref"]})
+                if len(results) >= limit:
+                    break
+            return results
+
+    def __len__(self):
+        return len(self._docs)
+
+
+_search_index = None
+_search_index_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    """Returns the process-wide search index, building it from disk data on first use."""
+    global _search_index
+    with _search_index_lock:
+        if _search_index is None:
+            index = SearchIndex()
+            if not index.load():
+                _build_index(index)
+            atexit.register(index.flush)
+            _search_index = index
+        return _search_index
+
+
+def _build_index(index: SearchIndex):
+    from modules.history_manager import HistoryManager
+    from modules.person_view_ui import PersonInfoManager
+
+    history_manager = HistoryManager()
+    for chat in history_manager.iter_all_chats():
+        index.index_chat(chat)
+    for memory in history_manager.load_memories():
+        index.index_memory(memory)
+    for info in PersonInfoManager().load_info():
+        index.index_info(info)
+    index.flush()
+    print(f"Search index built with {len(index)} documents.")
@@ -0,0 +1,358 @@
+import atexit
+import hashlib
+import json
+import os
+import queue
+import threading
+import numpy as np
+from modules.chatbot import get_embedding_engine
+from modules.profiling import profiled
+
+
+class SemanticIndex:
+    """
+    Embeddings of chat message windows for search by meaning. The vectors are
+    L2-normalized float16 rows appended to VECTORS_FILE and read through a
+    memory map, so neither loading nor searching copies the matrix into RAM.
+    IDS_FILE maps every row to its window; rows of changed or deleted windows
+    become tombstones until the file is compacted. Chats are embedded in batches
+    by a background worker, in the order HistoryManager saves and deletes them.
+    """
+
+    INDEX_DIR = "assets/embeddings"
+    VECTORS_FILE = os.path.join(INDEX_DIR, "vectors.f16")
+    IDS_FILE = os.path.join(INDEX_DIR, "ids.json")
+    DTYPE = np.float16
+    WINDOW = 3  # messages per embedded window
+    STRIDE = 2  # consecutive windows overlap by one message
+    EMBED_BATCH = 16
+    SEARCH_CHUNK_ROWS = 16384
+    SNIPPET_LENGTH = 160
+    SAVE_DELAY = 2.0
+    COMPACT_MIN_ROWS = 1024
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.model = engine.name
+        self.dim = None
+        self._lock = threading.RLock()
+        self._rows = []      # row -> [doc_id, chat_id, message_id, hash, snippet], None once dead
+        self._docs = {}      # doc_id -> row
+        self._chats = {}     # chat_id -> set(doc_id)
+        self._alive = np.zeros(0, dtype=bool)
+        self._matrix = None  # read-only np.memmap over VECTORS_FILE, opened on demand
+        self._save_timer = None
+        self.lost_vectors = False  # load() dropped rows the ID map did not know about yet
+        self._queue = queue.Queue()
+        os.makedirs(self.INDEX_DIR, exist_ok=True)
+        threading.Thread(target=self._work, name="semantic-index", daemon=True).start()
+
+    # --- persistence ---
+
+    def load(self) -> bool:
+        """Restores the ID map; False (start over) if it is missing, unreadable or from another model."""
+        if not os.path.isfile(self.IDS_FILE) or not os.path.isfile(self.VECTORS_FILE):
+            return False
+        try:
+            with open(self.IDS_FILE, "r", encoding="utf8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Semantic index unreadable, rebuilding: {e}")
+            return False
+        if data.get("model") != self.model or not data.get("dim"):
+            print("Embedding model changed, rebuilding the semantic index.")
+            return False
+
+        row_bytes = data["dim"] * np.dtype(self.DTYPE).itemsize
+        expected = len(data["rows"]) * row_bytes
+        size = os.path.getsize(self.VECTORS_FILE)
+        if size < expected:
+            print("Semantic index vectors are incomplete, rebuilding.")
+            return False
+        if size > expected:
+            # Vectors appended after the last ID map save; get_semantic_index() re-queues their chats
+            os.truncate(self.VECTORS_FILE, expected)
+            self.lost_vectors = True
+
+        with self._lock:
+            self.dim = data["dim"]
+            self._rows = data["rows"]
+            for row, entry in enumerate(self._rows):
+                if entry is not None:
+                    self._add_doc(entry, row)
+            self._alive = np.array([entry is not None for entry in self._rows], dtype=bool)
+        return True
+
+    def save(self):
+        with self._lock:
+            self._save_timer = None
+            data = json.dumps({"model": self.model, "dim": self.dim, "rows": self._rows}, ensure_ascii=False)
+        tmp_path = self.IDS_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.IDS_FILE)
+
+    def _schedule_save(self):
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.SAVE_DELAY, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+        self.save()
+
+    def _reset_files(self):
+        with self._lock:
+            self._matrix = None
+            open(self.VECTORS_FILE, "wb").close()
+            self._rows, self._docs, self._chats = [], {}, {}
+            self._alive = np.zeros(0, dtype=bool)
+        self.save()
+
+    def _vectors(self):
+        """The matrix of all rows (dead ones included), mapped read-only."""
+        if self._matrix is None and self._rows:
+            self._matrix = np.memmap(self.VECTORS_FILE, dtype=self.DTYPE, mode="r", shape=(len(self._rows), self.dim))
+        return self._matrix
+
+    # --- rows ---
+
+    def _add_doc(self, entry: list, row: int):
+        self._docs[entry[0]] = row
+        self._chats.setdefault(entry[1], set()).add(entry[0])
+
+    def _kill_doc(self, doc_id: str):
+        row = self._docs.pop(doc_id, None)
+        if row is None:
+            return
+        chat_id = self._rows[row][1]
+        docs = self._chats.get(chat_id)
+        if docs is not None:
+            docs.discard(doc_id)
+            if not docs:
+                del self._chats[chat_id]
+        self._rows[row] = None
+        self._alive[row] = False
+
+    def _append(self, entries: list, vectors: np.ndarray):
+        with self._lock:
+            # The map is dropped before the file grows; Windows does not allow resizing a mapped file
+            self._matrix = None
+            with open(self.VECTORS_FILE, "ab") as f:
+                f.write(vectors.astype(self.DTYPE).tobytes())
+            first_row = len(self._rows)
+            for i, entry in enumerate(entries):
+                self._kill_doc(entry[0])
+                self._rows.append(entry)
+                self._add_doc(entry, first_row + i)
+            self._alive = np.concatenate([self._alive, np.ones(len(entries), dtype=bool)])
+
+    def _compact_if_sparse(self):
+        """Rewrites the vectors without dead rows once they make up half the file."""
+        with self._lock:
+            dead = len(self._rows) - len(self._docs)
+            if len(self._rows) < self.COMPACT_MIN_ROWS or dead * 2 < len(self._rows):
+                return
+            live_rows = np.flatnonzero(self._alive)
+            tmp_path = self.VECTORS_FILE + ".tmp"
+            vectors = self._vectors()
+            with open(tmp_path, "wb") as f:
+                for start in range(0, len(live_rows), self.SEARCH_CHUNK_ROWS):
+                    f.write(np.asarray(vectors[live_rows[start:start + self.SEARCH_CHUNK_ROWS]]).tobytes())
+            self._matrix = vectors = None
+            os.replace(tmp_path, self.VECTORS_FILE)
+
+            self._rows = [self._rows[row] for row in live_rows]
+            self._docs, self._chats = {}, {}
+            for row, entry in enumerate(self._rows):
+                self._add_doc(entry, row)
+            self._alive = np.ones(len(self._rows), dtype=bool)
+            self.flush()
+        print(f"Semantic index compacted: dropped {dead} dead rows.")
+
+    # --- embedding ---
+
+    def _embed(self, texts: list) -> np.ndarray:
+        with self.engine.lock:
+            vectors = np.asarray(self.engine.llm.embed(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _windows(self, chat) -> list:
+        """[(doc_id, chat_id, first message_id, hash, snippet, text)] of a chat's message windows."""
+        chat_id = chat.get("chat_id")
+        messages = [m for m in chat.get("messages", ()) if (m.get("content") or "").strip()]
+        windows = []
+        # The last window starts at the second to last message, so every message is covered
+        for start in range(0, max(len(messages) - 1, 1) if messages else 0, self.STRIDE):
+            window = messages[start:start + self.WINDOW]
+            text = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in window)
+            first_id = window[0].get("id")
+            windows.append((
+                f"{chat_id}:{first_id if first_id is not None else start}",
+                chat_id,
+                first_id,
+                hashlib.sha1(text.encode("utf8")).hexdigest(),
+                window[0]["content"][:self.SNIPPET_LENGTH],
+                text,
+            ))
+        return windows
+
+    @profiled("semantic:index_chat")
+    def _index_chat(self, chat):
+        chat_id = chat.get("chat_id")
+        windows = self._windows(chat)
+        with self._lock:
+            wanted = {w[0] for w in windows}
+            for doc_id in list(self._chats.get(chat_id, ())):
+                if doc_id not in wanted:
+                    self._kill_doc(doc_id)
+            changed = [
+                w for w in windows
+                if w[0] not in self._docs or self._rows[self._docs[w[0]]][3] != w[3]
+            ]
+        for start in range(0, len(changed), self.EMBED_BATCH):
+            batch = changed[start:start + self.EMBED_BATCH]
+            vectors = self._embed([w[5] for w in batch])
+            with self._lock:
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                self._append([list(w[:5]) for w in batch], vectors)
+
+    def _work(self):
+        while True:
+            action, arg = self._queue.get()
+            try:
+                if action == "index":
+                    self._index_chat(arg)
+                elif action == "remove":
+                    with self._lock:
+                        for doc_id in list(self._chats.get(arg, ())):
+                            self._kill_doc(doc_id)
+                elif action == "refresh":
+                    for chat in arg():
+                        self._index_chat(chat)
+                elif action == "rebuild":
+                    self._reset_files()
+                    for chat in arg():
+                        self._index_chat(chat)
+                    print(f"Semantic index built with {len(self)} windows.")
+                self._compact_if_sparse()
+                with self._lock:
+                    self._schedule_save()
+            except Exception as e:
+                print(f"Semantic index could not {action}: {e}")
+            finally:
+                self._queue.task_done()
+
+    # --- public update API ---
+
+    def index_chat(self, chat):
+        """Queues a saved chat; only windows whose text changed are embedded again."""
+        if chat.get("chat_id"):
+            self._queue.put(("index", chat))
+
+    def remove_chat(self, chat_id: str):
+        self._queue.put(("remove", chat_id))
+
+    def rebuild(self, iter_chats):
+        self._queue.put(("rebuild", iter_chats))
+
+    def refresh(self, iter_chats):
+        """Queues every chat `iter_chats()` yields; windows whose text is unchanged are skipped."""
+        self._queue.put(("refresh", iter_chats))
+
+    def missing_chats(self, history_manager):
+        """Yields saved chats with messages but no embedded windows, e.g. still queued when the process died."""
+        with self._lock:
+            known = set(self._chats)
+        for entry in history_manager.load_chat_index():
+            if entry.get("message_count") and entry["chat_id"] not in known:
+                chat = history_manager.load_chat(entry["chat_id"])
+                if chat:
+                    yield chat
+
+    def wait(self):
+        """Blocks until every queued update has been applied."""
+        self._queue.join()
+
+    # --- querying ---
+
+    @profiled("semantic:search")
+    def search(self, query: str, limit: int = 20) -> list:
+        """
+        Cosine-similarity top-k over all live windows, best window per chat. Results
+        have the same shape as SearchIndex.search() message hits.
+        """
+        query = (query or "").strip()
+        if not query:
+            return []
+        query_vector = self._embed([query])[0]
+
+        with self._lock:
+            vectors = self._vectors()
+            if vectors is None or self.dim != len(query_vector):
+                return []
+            scores = np.empty(len(self._rows), dtype=np.float32)
+            for start in range(0, len(scores), self.SEARCH_CHUNK_ROWS):
+                chunk = np.asarray(vectors[start:start + self.SEARCH_CHUNK_ROWS], dtype=np.float32)
+                scores[start:start + len(chunk)] = chunk @ query_vector
+            scores[~self._alive] = -np.inf
+
+            # Several windows of one chat can rank high, so take extra candidates before keeping one per chat
+            candidates = min(len(scores), limit * 4)
+            top = np.argpartition(-scores, candidates - 1)[:candidates]
+            top = top[np.argsort(-scores[top])]
+            results, seen_chats = [], set()
+            for row in top:
+                entry = self._rows[row]
+                if entry is None or entry[1] in seen_chats:
+                    continue
+                seen_chats.add(entry[1])
+                results.append({
+                    "kind": "message",
+                    "score": float(scores[row]),
+                    "snippet": entry[4],
+                    "chat_id": entry[1],
+                    "message_id": entry[2],
+                })
+                if len(results) >= limit:
+                    break
+            return results
+
+    def __len__(self):
+        return len(self._docs)
+
+
+_semantic_index = None
+_semantic_index_lock = threading.Lock()
+
+
+def get_semantic_index() -> SemanticIndex | None:
+    """
+    Returns the process-wide semantic index, or None when no embedding model is
+    configured. A missing or outdated index is rebuilt from all chats in the background,
+    and chats whose embeddings a crash lost are queued again.
+    """
+    global _semantic_index
+    with _semantic_index_lock:
+        if _semantic_index is None:
+            engine = get_embedding_engine()
+            if engine is None:
+                return None
+            from modules.history_manager import HistoryManager
+            history_manager = HistoryManager()
+            index = SemanticIndex(engine)
+            if not index.load():
+                index.rebuild(history_manager.iter_all_chats)
+            elif index.lost_vectors:
+                # Any chat may have had windows among the dropped rows
+                index.refresh(history_manager.iter_all_chats)
+            else:
+                index.refresh(lambda: index.missing_chats(history_manager))
+            atexit.register(index.flush)
+            _semantic_index = index
+        return _semantic_index
@@ -0,0 +1,204 @@
+import threading
+import flet as ft
+from modules.dialogs import get_dialogs
+from modules.history_manager import HistoryManager
+from modules.inference_metrics import METRICS, aggregate_reply_metrics
+from modules.persona_selector_ui import PersonaManager
+from modules.profiling import Profiler, get_profiler
+from modules.scheduler import get_scheduler
+from modules.ui_updates import get_updater, user_action
+from modules.watchdog import StallWatchdog, get_watchdog
+
+# Columns of the per-persona and per-model tables
+BREAKDOWN_METRICS = ("ttft_ms", "decode_tps", "prompt_tokens", "total_ms")
+
+
+def _format(value, unit: str) -> str:
+    if value is None:
+        return "–"
+    if unit == "ms":
+        return f"{value / 1000:.2f} s" if value >= 1000 else f"{value:.0f} ms"
+    if unit == "tok/s":
+        return f"{value:.1f} tok/s"
+    return f"{value:.0f}"
+
+
+class SettingsViewComponent:
+    def __init__(self, page: ft.Page):
+        self.page = page
+        self.updates = get_updater(page)
+        self.dialogs = get_dialogs(page)
+        self.history_manager = HistoryManager()
+        self.persona_manager = PersonaManager()
+        self._version = None
+        self._loading = False
+
+        self.summary_text = ft.Text(color=ft.Colors.OUTLINE)
+        self.progress = ft.ProgressRing(width=16, height=16, stroke_width=2, visible=False)
+        self.performance_column = ft.Column(spacing=20)
+        self.watchdog_text = ft.Text()
+        self.queue_text = ft.Text()
+        self.profiling_switch = ft.Switch(
+            label="Profile UI handlers, storage and inference",
+            value=get_profiler().enabled,
+            on_change=self._toggle_profiling,
+        )
+
+        self._root = ft.Column(
+            [
+                ft.Container(
+                    content=ft.Row(
+                        [
+                            ft.Icon(ft.Icons.SETTINGS, size=28),
+                            ft.Text("Settings", theme_style=ft.TextThemeStyle.HEADLINE_SMALL),
+                        ],
+                        spacing=10,
+                        vertical_alignment=ft.CrossAxisAlignment.CENTER,
+                    ),
+                    alignment=ft.alignment.center_left,
+                    padding=ft.padding.only(left=10, right=10, top=15, bottom=10),
+                ),
+                ft.Divider(height=1),
+                ft.Container(
+                    content=ft.Column(
+                        [
+                            ft.Row(
+                                [
+                                    ft.Text("Performance", theme_style=ft.TextThemeStyle.TITLE_MEDIUM),
+                                    self.progress,
+                                    ft.IconButton(
+                                        ft.Icons.REFRESH,
+                                        tooltip="Recalculate",
+                                        on_click=self._refresh_click,
+                                    ),
+                                ],
+                                vertical_alignment=ft.CrossAxisAlignment.CENTER,
+                            ),
+                            self.summary_text,
+                            self.performance_column,
+                            ft.Divider(height=1),
+                            ft.Text("Diagnostics", theme_style=ft.TextThemeStyle.TITLE_MEDIUM),
+                            self.watchdog_text,
+                            self.queue_text,
+                            self.profiling_switch,
+                            ft.Text(
+                                "Records cProfile stats and allocation sites until switched off, then writes "
+                                f"a report to {Profiler.REPORT_DIR}. Set PERSONA_CHAT_PROFILE=1 to profile a whole run.",
+                                color=ft.Colors.OUTLINE,
+                            ),
+                        ],
+                        scroll=ft.ScrollMode.ADAPTIVE,
+                        expand=True,
+                    ),
+                    padding=ft.padding.only(left=20, right=20, top=10, bottom=10),
+                    expand=True,
+                ),
+            ],
+            expand=True,
+        )
+
+    @property
+    def view(self) -> ft.Control:
+        return self._root
+
+    @user_action("toggle_profiling")
+    def _toggle_profiling(self, e):
+        profiler = get_profiler()
+        if self.profiling_switch.value:
+            profiler.start()
+            return
+        path = profiler.stop()
+        if path:
+            self.dialogs.info("Profiling Report", f"Report written to {path}")
+
+    @user_action("refresh_settings")
+    def _refresh_click(self, e):
+        self._version = None
+        self.update_view()
+
+    def update_view(self):
+        """Aggregates the stored reply metrics in the background; skipped if no chat changed."""
+        watchdog = get_watchdog()
+        self.watchdog_text.value = (
+            f"{watchdog.report()}. Stack traces of stalls are saved to {StallWatchdog.STALL_LOG}."
+            if watchdog else "Stall watchdog is off (PERSONA_CHAT_WATCHDOG=0)."
+        )
+        queue = get_scheduler().snapshot()
+        self.queue_text.value = (
+            f"Model queue: {sum(queue['waiting'].values())} waiting across {len(queue['waiting'])} sessions "
+            f"(most at once {queue['max_waiting']}); {queue['served']} replies served, {queue['rejected']} rejected."
+        )
+        self.updates.mark(self.watchdog_text, self.queue_text)
+
+        version = (self.history_manager.chat_index_version(), self.persona_manager.data_version())
+        if version == self._version or self._loading:
+            return
+        self._loading = True
+        self.progress.visible = True
+        self.updates.mark(self.progress)
+
+        def aggregate():
+            try:
+                stats = aggregate_reply_metrics(self.history_manager)
+                personas = {p["id"]: p.get("name", "Unknown") for p in self.persona_manager.load_personas()}
+                with self.updates.lock:
+                    self._show_stats(stats, personas)
+                self._version = version
+            except Exception as ex:
+                print(f"Could not aggregate reply metrics: {ex}")
+            finally:
+                self._loading = False
+                self.progress.visible = False
+                self.updates.mark(self.progress, self.summary_text, self.performance_column)
+
+        threading.Thread(target=aggregate, daemon=True).start()
+
+    def _show_stats(self, stats: dict, personas: dict):
+        if not stats["replies"]:
+            self.summary_text.value = "No reply metrics yet. They are recorded for every answer in a saved chat."
+            self.performance_column.controls = []
+            return
+
+        self.summary_text.value = f"Based on {stats['replies']} replies in saved chats."
+        overall = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("Metric")),
+                ft.DataColumn(ft.Text("p50"), numeric=True),
+                ft.DataColumn(ft.Text("p95"), numeric=True),
+                ft.DataColumn(ft.Text("Replies"), numeric=True),
+            ],
+            rows=[
+                ft.DataRow(cells=[
+                    ft.DataCell(ft.Text(label)),
+                    ft.DataCell(ft.Text(_format(stats["overall"][key]["p50"], unit))),
+                    ft.DataCell(ft.Text(_format(stats["overall"][key]["p95"], unit))),
+                    ft.DataCell(ft.Text(str(stats["overall"][key]["n"]))),
+                ])
+                for key, label, unit in METRICS
+            ],
+        )
+        self.performance_column.controls = [
+            overall,
+            ft.Text("Per persona", theme_style=ft.TextThemeStyle.TITLE_SMALL),
+            self._breakdown_table(
+                "Persona", stats["personas"], lambda pid: personas.get(pid) or f"Deleted persona ({str(pid)[:6]})"
+            ),
+            ft.Text("Per model", theme_style=ft.TextThemeStyle.TITLE_SMALL),
+            self._breakdown_table("Model", stats["models"]),
+        ]
+
+    def _breakdown_table(self, title: str, groups: dict, label: callable = str) -> ft.DataTable:
+        """One row per group, with p50 / p95 of the BREAKDOWN_METRICS; `label` names a group key."""
+        metrics = [m for m in METRICS if m[0] in BREAKDOWN_METRICS]
+        return ft.DataTable(
+            columns=[ft.DataColumn(ft.Text(title)), ft.DataColumn(ft.Text("Replies"), numeric=True)] + [
+                ft.DataColumn(ft.Text(f"{label} p50 / p95"), numeric=True) for _, label, _ in metrics
+            ],
+            rows=[
+                ft.DataRow(cells=[ft.DataCell(ft.Text(label(name))), ft.DataCell(ft.Text(str(count)))] + [
+                    ft.DataCell(ft.Text(f"{_format(summary[key]['p50'], unit)} / {_format(summary[key]['p95'], unit)}"))
+                    for key, _, unit in metrics
+                ])
+                for name, (count, summary) in sorted(groups.items(), key=lambda x: -x[1][0])
+            ],
+        )
@@ -0,0 +1,103 @@
+import os
+import threading
+from PIL import Image, ImageOps
+
+
+THUMBS_DIR = "assets/thumbs"
+# Pixel sizes; avatars are drawn at 40-45 px, so 2x keeps them sharp on HiDPI screens.
+SIZES = {
+    "avatar": 96,
+    "card": 320,
+}
+# Avatars are drawn as circles with ImageFit.COVER, so they are cropped square; cards keep the aspect ratio.
+CROPPED_SIZES = {"avatar"}
+
+_resolved = {}
+_lock = threading.Lock()
+
+
+def _thumb_file(image_path: str, size: int, has_alpha: bool) -> str:
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    ext = ".png" if has_alpha else ".jpg"
+    return os.path.join(THUMBS_DIR, f"{stem}_{size}{ext}")
+
+
+def _existing_thumb(image_path: str, size: int) -> str | None:
+    for has_alpha in (False, True):
+        path = _thumb_file(image_path, size, has_alpha)
+        if os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(image_path):
+            return path
+    return None
+
+
+def generate_thumbnails(image_path: str) -> dict:
+    """Writes every thumbnail size for an image; returns {size_name: path}."""
+    if not image_path or not os.path.isfile(image_path):
+        return {}
+    os.makedirs(THUMBS_DIR, exist_ok=True)
+
+    results = {}
+    try:
+        with Image.open(image_path) as img:
+            img = ImageOps.exif_transpose(img)
+            has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+            img = img.convert("RGBA" if has_alpha else "RGB")
+            for name, size in SIZES.items():
+                if name in CROPPED_SIZES:
+                    thumb = ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS)
+                else:
+                    thumb = img.copy()
+                    thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+                path = _thumb_file(image_path, size, has_alpha)
+                if has_alpha:
+                    thumb.save(path, optimize=True)
+                else:
+                    thumb.save(path, quality=85, optimize=True)
+                results[name] = path
+    except (OSError, ValueError) as e:
+        print(f"Could not create thumbnails for {image_path}: {e}")
+        return {}
+
+    with _lock:
+        for name, path in results.items():
+            _resolved[(image_path, name)] = path
+    return results
+
+
+def thumbnail_path(image_path: str | None, size_name: str = "avatar") -> str | None:
+    """
+    Returns the cached thumbnail for an image, creating it on first use.
+    Falls back to the original if a thumbnail cannot be made.
+    """
+    if not image_path:
+        return image_path
+    key = (image_path, size_name)
+    with _lock:
+        cached = _resolved.get(key)
+    if cached:
+        return cached
+
+    if not os.path.isfile(image_path):
+        return image_path
+    path = _existing_thumb(image_path, SIZES[size_name])
+    if path is None:
+        path = generate_thumbnails(image_path).get(size_name, image_path)
+    with _lock:
+        _resolved[key] = path
+    return path
+
+
+def delete_thumbnails(image_path: str | None):
+    if not image_path:
+        return
+    with _lock:
+        for name in SIZES:
+            _resolved.pop((image_path, name), None)
+    for size in SIZES.values():
+        for has_alpha in (False, True):
+            path = _thumb_file(image_path, size, has_alpha)
+            if os.path.isfile(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"Error deleting thumbnail {path}: {e}")
@@ -0,0 +1,257 @@
+"""
+Streaming export/import of personas, personal info, chats and memories.
+
+The archive is JSON Lines (optionally gzip-compressed), one record per line:
+    {"type": "chat", "data": {...}}
+Records are written and read one at a time, and imports are committed in
+small batches with a checkpoint file next to the archive, so an interrupted
+import resumes where it stopped. Imported chats old enough to be archived are
+written straight into the archive segments; recent chats, memories and info
+are spooled to files next to the archive and merged into their stores with one
+write each at the end, so a batch never rewrites a whole store.
+
+    python -m modules.transfer export history.jsonl.gz
+    python -m modules.transfer import history.jsonl.gz
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from modules.history_manager import HistoryManager
+from modules.person_view_ui import PersonInfoManager
+from modules.persona_selector_ui import PersonaManager
+from modules.repository import json_default
+from modules.search_index import get_search_index
+
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 200
+PROGRESS_EVERY = 500
+# Records merged into their store once at the end of an import, and their ID field
+SPOOLED_KINDS = {"chat": "chat_id", "memory": "memory_id", "info": "info_id"}
+
+
+def _open(path: str, mode: str, compress: bool | None = None):
+    if compress is None:
+        compress = path.endswith(".gz")
+    if compress:
+        return gzip.open(path, mode + "t", encoding="utf8")
+    return open(path, mode, encoding="utf8")
+
+
+def _print_progress(kind: str, count: int):
+    print(f"  {kind}: {count} records")
+
+
+def _persona_record(persona: dict) -> dict:
+    record = dict(persona)
+    image_path = persona.get("image_path")
+    if image_path and os.path.isfile(image_path):
+        with open(image_path, "rb") as f:
+            record["image_data"] = base64.b64encode(f.read()).decode("ascii")
+        record["image_name"] = os.path.basename(image_path)
+    return record
+
+
+def export_history(path: str, compress: bool | None = None, progress: callable = _print_progress) -> dict:
+    history_manager = HistoryManager()
+    counts = {"persona": 0, "info": 0, "chat": 0, "memory": 0}
+
+    def sources():
+        for persona in PersonaManager().load_personas():
+            yield "persona", _persona_record(persona)
+        for info in PersonInfoManager().load_info():
+            yield "info", info
+        for chat in history_manager.iter_all_chats():
+            yield "chat", chat
+        for memory in history_manager.load_memories():
+            yield "memory", memory
+
+    with _open(path, "w", compress) as f:
+        f.write(json.dumps({"type": "header", "version": FORMAT_VERSION}) + "\n")
+        for kind, data in sources():
+            f.write(json.dumps({"type": kind, "data": data}, ensure_ascii=False, default=json_default) + "\n")
+            counts[kind] += 1
+            if progress and counts[kind] % PROGRESS_EVERY == 0:
+                progress(kind, counts[kind])
+
+    print(f"Exported {counts} to {path}")
+    return counts
+
+
+class _Importer:
+    def __init__(self, progress: callable, spool_paths: dict):
+        self.history_manager = HistoryManager()
+        self.persona_manager = PersonaManager()
+        self.info_manager = PersonInfoManager()
+        self.progress = progress
+        self.spool_paths = spool_paths  # kind -> file of new records waiting for their store
+        self.pending = {"persona": [], "info": [], "chat": [], "memory": []}
+        self.seen = {kind: 0 for kind in self.pending}
+        self.imported = {kind: 0 for kind in self.pending}
+        self.archive_cutoff = self.history_manager.archive_cutoff()
+        self.known_ids = {
+            "chat": self.history_manager.known_chat_ids(),
+            "memory": {m.get("memory_id") for m in self.history_manager.load_memories()},
+            "info": {i.get("info_id") for i in self.info_manager.load_info()},
+        }
+        for kind, id_field in SPOOLED_KINDS.items():
+            self.known_ids[kind].update(record[id_field] for record in self._iter_spool(kind))
+        get_search_index()  # checked against the data files before the import rewrites them
+
+    def add(self, kind: str, data: dict):
+        if kind not in self.pending:
+            return
+        self.pending[kind].append(data)
+        self.seen[kind] += 1
+        if self.progress and self.seen[kind] % PROGRESS_EVERY == 0:
+            self.progress(kind, self.seen[kind])
+
+    def pending_count(self) -> int:
+        return sum(len(v) for v in self.pending.values())
+
+    def commit(self):
+        if self.pending["persona"]:
+            personas = [self._restore_persona_image(p) for p in self.pending["persona"]]
+            self.imported["persona"] += self.persona_manager.import_personas(personas)
+            for _, temp_path in personas:
+                if temp_path:
+                    shutil.rmtree(os.path.dirname(temp_path), ignore_errors=True)
+        if self.pending["info"]:
+            self._spool("info", self._new_records("info", self.pending["info"]))
+        if self.pending["chat"]:
+            self._commit_chats(self.pending["chat"])
+        if self.pending["memory"]:
+            self._spool("memory", self._new_records("memory", self.pending["memory"]))
+        for batch in self.pending.values():
+            batch.clear()
+
+    def _new_records(self, kind: str, records: list) -> list:
+        """Records whose IDs are neither in the store nor spooled yet."""
+        id_field = SPOOLED_KINDS[kind]
+        known_ids = self.known_ids[kind]
+        new_records = []
+        for record in records:
+            if not record.get(id_field) or record[id_field] in known_ids:
+                continue
+            known_ids.add(record[id_field])
+            new_records.append(record)
+        self.imported[kind] += len(new_records)
+        return new_records
+
+    def _commit_chats(self, chats: list):
+        new_chats = self._new_records("chat", chats)
+        old_chats = [c for c in new_chats if self.history_manager.is_archivable(c, self.archive_cutoff)]
+        if old_chats:
+            self.history_manager.archive_imported_chats(old_chats)
+        self._spool("chat", [c for c in new_chats if not self.history_manager.is_archivable(c, self.archive_cutoff)])
+
+    def _spool(self, kind: str, records: list):
+        if not records:
+            return
+        with open(self.spool_paths[kind], "a", encoding="utf8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, default=json_default) + "\n")
+
+    def _iter_spool(self, kind: str):
+        if not os.path.isfile(self.spool_paths[kind]):
+            return
+        with open(self.spool_paths[kind], "r", encoding="utf8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def finish(self):
+        """Merges the spooled records into their stores and rebuilds the chat index, once for the whole import."""
+        self.commit()
+        self.info_manager.import_info(self._iter_spool("info"))
+        self.history_manager.merge_imported_chats(self._iter_spool("chat"))
+        self.history_manager.import_memories(self._iter_spool("memory"))
+        for spool_path in self.spool_paths.values():
+            if os.path.isfile(spool_path):
+                os.remove(spool_path)
+
+    def _restore_persona_image(self, record: dict) -> tuple:
+        image_data = record.pop("image_data", None)
+        image_name = record.pop("image_name", None)
+        if not image_data:
+            return record, None
+        temp_dir = tempfile.mkdtemp()
+        temp_path = os.path.join(temp_dir, image_name or "persona.png")
+        with open(temp_path, "wb") as f:
+            f.write(base64.b64decode(image_data))
+        return record, temp_path
+
+
+def import_history(path: str, progress: callable = _print_progress, resume: bool = True) -> dict:
+    """Imports an archive; records whose IDs already exist are skipped."""
+    checkpoint_path = f"{path}.progress"
+    spool_paths = {kind: f"{path}.{kind}.jsonl" for kind in SPOOLED_KINDS}
+    stat = os.stat(path)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    start_line = 0
+    if resume and os.path.isfile(checkpoint_path):
+        with open(checkpoint_path, "r", encoding="utf8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("archive") == fingerprint:
+            start_line = checkpoint.get("line", 0)
+            print(f"Resuming import of {path} at record {start_line}.")
+    if start_line == 0:
+        for spool_path in spool_paths.values():
+            if os.path.isfile(spool_path):
+                os.remove(spool_path)  # left by an import that is not resumed
+
+    def save_checkpoint(line_no: int):
+        with open(checkpoint_path, "w", encoding="utf8") as f:
+            json.dump({"archive": fingerprint, "line": line_no}, f)
+
+    importer = _Importer(progress, spool_paths)
+    line_no = 0
+    with _open(path, "r") as f:
+        for line_no, line in enumerate(f, start=1):
+            if line_no <= start_line or not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("type") == "header":
+                if record.get("version", FORMAT_VERSION) > FORMAT_VERSION:
+                    raise ValueError(f"Unsupported archive version {record['version']}")
+                continue
+            importer.add(record.get("type"), record.get("data", {}))
+            if importer.pending_count() >= BATCH_SIZE:
+                importer.commit()
+                save_checkpoint(line_no)
+
+    importer.finish()
+    if os.path.isfile(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    importer.history_manager.archive_old_chats()
+    print(f"Imported {importer.imported} (read {importer.seen}) from {path}")
+    return importer.imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import chat history as streaming JSONL.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write personas, info, chats and memories to a file")
+    export_parser.add_argument("path", help="Target file; a .gz suffix enables compression")
+    export_parser.add_argument("--gzip", action="store_true", default=None, help="Force gzip compression")
+
+    import_parser = subparsers.add_parser("import", help="Import an exported file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--restart", action="store_true", help="Ignore a previous checkpoint")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_history(args.path, compress=args.gzip)
+    else:
+        import_history(args.path, resume=not args.restart)
+
+
+if __name__ == "__main__":
+    main()
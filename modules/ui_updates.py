@@ -0,0 +1,217 @@
+import functools
+import json
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+from flet.core.protocol import CommandEncoder
+from modules.profiling import get_profiler, report_at_exit
+from modules.watchdog import track_handler
+
+
+class PatchStats:
+    """
+    Counts the commands (patches) and encoded bytes sent to the Flet client,
+    grouped by the user action that caused them. Work done outside a tracked
+    action is reported as "background".
+    """
+
+    def __init__(self, measure_bytes: bool = True):
+        self.measure_bytes = measure_bytes
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._actions = {}  # name -> {"calls", "batches", "patches", "bytes"}
+
+    def _entry(self, name: str) -> dict:
+        return self._actions.setdefault(name, {"calls": 0, "batches": 0, "patches": 0, "bytes": 0})
+
+    def current_action(self) -> str | None:
+        return getattr(self._local, "action", None)
+
+    @contextmanager
+    def action(self, name: str, count_call: bool = True):
+        previous = self.current_action()
+        self._local.action = name
+        if count_call:
+            with self._lock:
+                self._entry(name)["calls"] += 1
+        try:
+            yield
+        finally:
+            self._local.action = previous
+            if previous is None:
+                # Outermost action on this thread is done; send what it marked
+                pending = getattr(self._local, "pending", None)
+                self._local.pending = None
+                for batcher in pending or ():
+                    batcher.schedule()
+
+    def defer(self, batcher) -> bool:
+        """Holds a batcher's flush until the running action returns; False outside actions."""
+        if self.current_action() is None:
+            return False
+        if getattr(self._local, "pending", None) is None:
+            self._local.pending = set()
+        self._local.pending.add(batcher)
+        return True
+
+    def record(self, commands: list):
+        size = 0
+        if self.measure_bytes:
+            size = len(json.dumps(commands, cls=CommandEncoder, separators=(",", ":")).encode("utf8"))
+        with self._lock:
+            entry = self._entry(self.current_action() or "background")
+            entry["batches"] += 1
+            entry["patches"] += len(commands)
+            entry["bytes"] += size
+
+    def instrument(self, connection):
+        """Wraps a connection's send methods; safe to call once per page on a shared connection."""
+        if connection is None or getattr(connection, "_patch_stats", None) is self:
+            return
+        send_commands = connection.send_commands
+        send_command = connection.send_command
+
+        def counted_send_commands(session_id, commands):
+            self.record(commands)
+            return send_commands(session_id, commands)
+
+        def counted_send_command(session_id, command):
+            self.record([command])
+            return send_command(session_id, command)
+
+        connection.send_commands = counted_send_commands
+        connection.send_command = counted_send_command
+        connection._patch_stats = self
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._actions.items()}
+
+    def reset(self):
+        with self._lock:
+            self._actions.clear()
+
+    def report(self) -> str:
+        lines = ["Client patches per action (calls, batches, patches, KiB):"]
+        for name, s in sorted(self.stats().items(), key=lambda x: x[1]["bytes"], reverse=True):
+            per_call = s["patches"] / s["calls"] if s["calls"] else 0
+            lines.append(
+                f"  {name}: {s['calls']} calls, {s['batches']} batches, {s['patches']} patches "
+                f"({per_call:.1f}/call), {s['bytes'] / 1024:.1f} KiB"
+            )
+        return "\n".join(lines)
+
+
+_patch_stats = None
+_patch_stats_lock = threading.Lock()
+
+
+def get_patch_stats() -> PatchStats:
+    global _patch_stats
+    with _patch_stats_lock:
+        if _patch_stats is None:
+            _patch_stats = PatchStats(measure_bytes=os.environ.get("PERSONA_CHAT_PATCH_BYTES", "1") != "0")
+            report_at_exit(_patch_stats.report)
+        return _patch_stats
+
+
+def user_action(name: str, watch: bool = True):
+    """
+    Decorator for UI handlers; patches sent while it runs are attributed to `name`.
+    watch=False exempts intentionally long work (e.g. waiting for the model) from stall reports.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not watch:
+                with get_patch_stats().action(name), get_profiler().span(f"ui:{name}"):
+                    return fn(*args, **kwargs)
+            with get_patch_stats().action(name), get_profiler().span(f"ui:{name}"), track_handler(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class UpdateBatcher:
+    """
+    Collects dirty controls and sends them with one scoped page.update(*controls)
+    on the next event-loop tick, instead of diffing the whole page per change.
+    Marks made inside a user action are held until the action returns.
+    Controls that are not mounted yet are skipped; they go out with their parent.
+    Background threads that change controls while a flush may run should hold `lock`.
+    """
+
+    def __init__(self, page):
+        self._page = weakref.ref(page)  # the registry below is keyed weakly by page
+        self._lock = threading.Lock()
+        self.lock = threading.RLock()  # held while a flush diffs the control tree
+        self._dirty = {}  # id(control) -> control, in marking order
+        self._actions = set()
+        self._callbacks = []
+        self._scheduled = False
+        get_patch_stats().instrument(page.connection)
+
+    @property
+    def page(self):
+        return self._page()
+
+    def mark(self, *controls, then: callable = None):
+        """Queues controls for the next flush; `then` runs after they were sent (e.g. scroll_to)."""
+        stats = get_patch_stats()
+        with self._lock:
+            for control in controls:
+                self._dirty.setdefault(id(control), control)
+            if then is not None:
+                self._callbacks.append(then)
+            self._actions.add(stats.current_action() or "background")
+        # Handlers run in worker threads, so their flush waits until they stop changing controls
+        if not stats.defer(self):
+            self.schedule()
+
+    def schedule(self):
+        with self._lock:
+            if self._scheduled or not (self._dirty or self._callbacks):
+                return
+            self._scheduled = True
+        if self.page is None:
+            return
+        try:
+            self.page.loop.call_soon_threadsafe(self.flush)
+        except RuntimeError:
+            # The loop is closed (app shutting down); send right away instead
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        page = self.page
+        with self._lock:
+            controls = [c for c in self._dirty.values() if c.page is not None]
+            actions = self._actions
+            callbacks = self._callbacks
+            self._dirty = {}
+            self._actions = set()
+            self._callbacks = []
+            self._scheduled = False
+        with get_patch_stats().action("+".join(sorted(actions)), count_call=False), get_profiler().span("ui:flush"):
+            if controls and page is not None:
+                page.update(*controls)
+            for callback in callbacks:
+                callback()
+
+
+_batchers = weakref.WeakKeyDictionary()
+_batchers_lock = threading.Lock()
+
+
+def get_updater(page) -> UpdateBatcher:
+    """One batcher per page (session)."""
+    with _batchers_lock:
+        batcher = _batchers.get(page)
+        if batcher is None:
+            batcher = UpdateBatcher(page)
+            _batchers[page] = batcher
+        return batcher
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter, sleep
+from modules.profiling import report_at_exit
+
+
+class StallWatchdog:
+    """
+    Measures event-loop lag with a heartbeat coroutine and watches running UI handlers
+    from a separate thread. When the loop misses its heartbeat, or a handler runs,
+    for longer than the threshold, the stack of the blocking thread is captured
+    while it is still stuck and written to STALL_LOG with the stall's duration.
+    """
+
+    INTERVAL = 0.05  # seconds between heartbeats
+    STALL_LOG = "assets/stalls.jsonl"
+    STACK_LIMIT = 25
+    LAG_WINDOW = 2000  # heartbeats kept for the lag percentiles
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold_ms: float = 250):
+        self.loop = loop
+        self.threshold = threshold_ms / 1000
+        self._lock = threading.Lock()
+        self._lags = deque(maxlen=self.LAG_WINDOW)
+        self._last_beat = perf_counter()
+        self._loop_thread = None
+        self._loop_stall = None  # (started, stack) of the stall in progress
+        self._handlers = {}  # token -> [name, thread id, started, stack or None]
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        asyncio.run_coroutine_threadsafe(self._heartbeat(), self.loop)
+        threading.Thread(target=self._monitor, name="stall-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+    async def _heartbeat(self):
+        self._loop_thread = threading.get_ident()
+        while self._running:
+            expected = perf_counter() + self.INTERVAL
+            await asyncio.sleep(self.INTERVAL)
+            now = perf_counter()
+            lag = max(0.0, now - expected)
+            with self._lock:
+                self._lags.append(lag)
+                self.max_lag = max(self.max_lag, lag)
+                self._last_beat = now
+                stall = self._loop_stall
+                self._loop_stall = None
+            if stall is not None:
+                self._record("event_loop", None, now - stall[0], stall[1])
+
+    def _monitor(self):
+        while self._running:
+            sleep(self.INTERVAL)
+            now = perf_counter()
+            frames = None
+            with self._lock:
+                if self._loop_stall is None and self._loop_thread and now - self._last_beat > self.threshold:
+                    frames = frames or sys._current_frames()
+                    self._loop_stall = (self._last_beat, self._stack(frames.get(self._loop_thread)))
+                for entry in self._handlers.values():
+                    if entry[3] is None and now - entry[2] > self.threshold:
+                        frames = frames or sys._current_frames()
+                        entry[3] = self._stack(frames.get(entry[1]))
+
+    def _stack(self, frame) -> list:
+        if frame is None:
+            return []
+        return [line.rstrip() for line in traceback.format_stack(frame, limit=self.STACK_LIMIT)]
+
+    @contextmanager
+    def track(self, name: str):
+        """Wraps a UI handler; if it outlives the threshold its stack is recorded."""
+        token = object()
+        with self._lock:
+            self._handlers[token] = [name, threading.get_ident(), perf_counter(), None]
+        try:
+            yield
+        finally:
+            with self._lock:
+                entry = self._handlers.pop(token)
+            if entry[3] is not None:
+                self._record("handler", name, perf_counter() - entry[2], entry[3])
+
+    def _record(self, kind: str, action: str | None, duration: float, stack: list):
+        with self._lock:
+            self.stall_count += 1
+        record = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "kind": kind,
+            "action": action,
+            "duration_ms": round(duration * 1000, 1),
+            "stack": stack,
+        }
+        print(f"Stall: {kind} {action or ''} blocked for {record['duration_ms']:.0f} ms; stack saved to {self.STALL_LOG}")
+        try:
+            os.makedirs(os.path.dirname(self.STALL_LOG), exist_ok=True)
+            with open(self.STALL_LOG, "a", encoding="utf8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Could not write stall record: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lags = sorted(self._lags)
+            max_lag = self.max_lag
+            stalls = self.stall_count
+        if not lags:
+            return {"lag_p50_ms": None, "lag_p99_ms": None, "max_lag_ms": max_lag * 1000, "stalls": stalls}
+        return {
+            "lag_p50_ms": lags[len(lags) // 2] * 1000,
+            "lag_p99_ms": lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000,
+            "max_lag_ms": max_lag * 1000,
+            "stalls": stalls,
+        }
+
+    def report(self) -> str:
+        s = self.stats()
+        if s["lag_p50_ms"] is None:
+            return "Event loop: no heartbeats recorded"
+        return (
+            f"Event loop lag: p50 {s['lag_p50_ms']:.1f} ms, p99 {s['lag_p99_ms']:.1f} ms, "
+            f"max {s['max_lag_ms']:.0f} ms; {s['stalls']} stalls over {self.threshold * 1000:.0f} ms"
+        )
+
+
+_watchdog = None
+_watchdog_lock = threading.Lock()
+
+
+def start_watchdog(loop: asyncio.AbstractEventLoop) -> StallWatchdog | None:
+    """
+    Starts the process-wide watchdog on the app's event loop (once).
+    PERSONA_CHAT_STALL_MS sets the threshold; PERSONA_CHAT_WATCHDOG=0 turns it off.
+    """
+    global _watchdog
+    if os.environ.get("PERSONA_CHAT_WATCHDOG", "1") == "0":
+        return None
+    with _watchdog_lock:
+        if _watchdog is None:
+            _watchdog = StallWatchdog(loop, float(os.environ.get("PERSONA_CHAT_STALL_MS", "250")))
+            _watchdog.start()
+            report_at_exit(_watchdog.report)
+        return _watchdog
+
+
+def get_watchdog() -> StallWatchdog | None:
+    return _watchdog
+
+
+@contextmanager
+def track_handler(name: str):
+    """No-op until start_watchdog() ran."""
+    watchdog = _watchdog
+    if watchdog is None:
+        yield
+        return
+    with watchdog.track(name):
+        yield
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import flet as ft
+from flet.core.local_connection import LocalConnection
+from flet.core.protocol import PageCommandResponsePayload, PageCommandsBatchResponsePayload
+from modules.dialogs import DialogPool
+
+
+class OfflineConnection(LocalConnection):
+    """Applies commands to the server-side control tree without a client, as in benchmarks/startup.py."""
+
+    def send_command(self, session_id, command):
+        result, _ = self._process_command(command)
+        return PageCommandResponsePayload(result=result, error="")
+
+    def send_commands(self, session_id, commands):
+        results = []
+        for command in commands:
+            result, _ = self._process_command(command)
+            if command.name in ("add", "get"):
+                results.append(result)
+        return PageCommandsBatchResponsePayload(results=results, error="")
+
+
+def fake_page() -> ft.Page:
+    return ft.Page(OfflineConnection(), "test-dialogs", asyncio.new_event_loop(), ThreadPoolExecutor(1))
+
+
+class DialogPoolTest(unittest.TestCase):
+    CYCLES = 1000
+
+    def setUp(self):
+        self.page = fake_page()
+        self.pool = DialogPool(self.page)
+        self.page.update()  # mounts the overlay, as the first frame of main() does
+
+    def test_overlay_size_is_constant_over_many_dialogs(self):
+        self.pool.close(self.pool.info("Warm up", "first use mounts the dialog"))
+        expected = len(self.page.overlay)
+
+        for i in range(self.CYCLES):
+            dialog = self.pool.confirm(f"Delete {i}?", "Really?", on_confirm=lambda e: None)
+            self.pool.close(dialog)
+            self.assertEqual(len(self.page.overlay), expected, f"after cycle {i}")
+
+    def test_nested_dialogs_shrink_back_to_idle_limit(self):
+        self.pool.close(self.pool.info("Warm up", "first use mounts the dialog"))
+        for i in range(self.CYCLES):
+            loading = self.pool.loading("Working", "Please wait...")
+            error = self.pool.info("Error", f"failed {i}")
+            notice = self.pool.info("Notice", "nested")
+            for dialog in (notice, error, loading):
+                self.pool.close(dialog)
+            # The shared FilePicker plus the idle dialogs kept for reuse
+            self.assertEqual(len(self.page.overlay), 1 + DialogPool.MAX_IDLE)
+            self.assertEqual(self.pool.size, DialogPool.MAX_IDLE)
+
+    def test_late_dismiss_does_not_free_a_reused_dialog(self):
+        dialog = self.pool.info("First", "shown")
+        stale_dismiss = dialog.on_dismiss
+        self.pool.close(dialog)
+        again = self.pool.info("Second", "shown")
+        self.assertIs(again, dialog)
+        stale_dismiss(None)
+        self.assertIsNot(self.pool.info("Third", "shown"), dialog)
+
+
+if __name__ == "__main__":
+    unittest.main()